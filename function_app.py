@@ -1,5 +1,6 @@
 import azure.functions as func
 import logging
+import json
 import sys
 import os
 from pathlib import Path
@@ -7,10 +8,22 @@ from pathlib import Path
 # srcディレクトリをパスに追加
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
-from fetch_and_save_to_blob import main as fetch_and_save_main
+from fetch_and_save_to_blob import get_blob_service_client, main as fetch_and_save_main, process_queue_batch
+from fetch_queue import FETCH_QUEUE_NAME, MAX_DEQUEUE_COUNT, decode_batch
+from search_index import SearchService
 
 app = func.FunctionApp()
 
+# タイマー実行時の時間制限（秒）のデフォルト値
+# Functionsの実行タイムアウト（従量課金プランの既定値は5分）より短くし、
+# 時間内に処理しきれなかった補助金は次回の実行に持ち越す
+DEFAULT_TIMER_TIME_BUDGET_SECONDS = 240
+
+# 検索APIの索引（インスタンスが起動している間は再利用する）
+search_service = SearchService(
+    lambda: get_blob_service_client().get_container_client(os.environ.get("BLOB_CONTAINER_NAME", "subsidies"))
+)
+
 @app.timer_trigger(schedule="0 0 2 * * *", arg_name="myTimer", run_on_startup=False,
                    use_monitor=False) 
 def fetch_subsidy_timer(myTimer: func.TimerRequest) -> None:
@@ -25,8 +38,10 @@ def fetch_subsidy_timer(myTimer: func.TimerRequest) -> None:
     logging.info('補助金データ取得処理を開始します')
     
     try:
-        # 全件処理を実行
-        fetch_and_save_main()
+        # 全件処理を実行（時間制限を超える分は次回に持ち越す）
+        fetch_and_save_main(
+            time_budget_seconds=os.environ.get("SYNC_TIME_BUDGET_SECONDS", DEFAULT_TIMER_TIME_BUDGET_SECONDS)
+        )
         logging.info('補助金データ取得処理が正常に完了しました')
     except Exception as e:
         logging.error(f'補助金データ取得処理でエラーが発生しました: {e}')
@@ -56,3 +71,72 @@ def fetch_subsidy_manual(req: func.HttpRequest) -> func.HttpResponse:
             f"エラーが発生しました: {str(e)}",
             status_code=500
         )
+
+
+@app.queue_trigger(arg_name="msg", queue_name=FETCH_QUEUE_NAME,
+                   connection="AZURE_STORAGE_CONNECTION_STRING")
+def fetch_subsidy_queue(msg: func.QueueMessage) -> None:
+    """
+    キュートリガーで補助金の詳細を取得してBlobに保存（SYNC_MODE=queue の場合）
+    タイマートリガーが追加した1メッセージ分（複数件）の補助金を処理する
+
+    失敗した補助金がある場合は例外を送出してメッセージを再試行させる。
+    最大処理回数（host.json の maxDequeueCount）に達した場合も例外を送出し、Functions がメッセージを
+    subsidy-fetch-poison に移動する（正常に終了するとメッセージが削除され、失敗した補助金IDが失われるため）。
+    """
+    try:
+        subsidies = decode_batch(msg.get_body())
+    except ValueError as e:
+        # 再試行しても処理できないため、エラーを記録して破棄する
+        logging.error(f'形式が不正なメッセージを破棄します（{msg.id}）: {e}')
+        return
+
+    logging.info(f'詳細取得キューのメッセージを処理します: {len(subsidies)}件（{msg.dequeue_count}回目）')
+    result = process_queue_batch(subsidies)
+    # APIの障害を検知して処理しなかった補助金も、メッセージの再試行で取得し直す
+    failed_ids = result["failed_ids"] + result["deferred_ids"]
+    logging.info(
+        f'保存成功: {result["saved"]}件 / 変更なし: {result["unchanged"]}件 / '
+        f'取得済み: {result["skipped"]}件 / 失敗: {len(failed_ids)}件'
+    )
+    if not failed_ids:
+        return
+    if msg.dequeue_count >= MAX_DEQUEUE_COUNT:
+        logging.error(
+            f'最大処理回数に達したため、メッセージを {FETCH_QUEUE_NAME}-poison に移動します: {", ".join(failed_ids)}'
+        )
+    raise RuntimeError(f'{len(failed_ids)}件の処理に失敗しました: {", ".join(failed_ids)}')
+
+
+@app.route(route="subsidies/search", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def search_subsidies(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    HTTP トリガーで保存済みの補助金を検索
+    URL: https://<your-function-app>.azurewebsites.net/api/subsidies/search?area=東京都&open_now=1&code=<function-key>
+
+    J-Grants APIにはアクセスせず、最新のスナップショットから作成したメモリ上の索引で検索する。
+    検索条件は search_index.parse_query を参照（q の全文検索には text_index.TextIndex を使う）。
+    """
+    try:
+        result = search_service.search(dict(req.params))
+    except ValueError as e:
+        return _json_response({"error": str(e)}, status_code=400)
+    except Exception as e:
+        logging.error(f'補助金の検索でエラーが発生しました: {e}')
+        return _json_response({"error": "検索でエラーが発生しました"}, status_code=500)
+    if result is None:
+        return _json_response({"error": "検索用のスナップショットがまだ作成されていません"}, status_code=503)
+    return _json_response(
+        result,
+        headers={"Cache-Control": f"private, max-age={int(search_service.refresh_interval)}"},
+    )
+
+
+def _json_response(body, status_code=200, headers=None):
+    return func.HttpResponse(
+        json.dumps(body, ensure_ascii=False, separators=(',', ':')),
+        status_code=status_code,
+        mimetype="application/json",
+        charset="utf-8",
+        headers=headers,
+    )
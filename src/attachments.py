@@ -0,0 +1,177 @@
+import os
+import base64
+import hashlib
+import tempfile
+import threading
+import mimetypes
+from urllib.parse import quote
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from azure.storage.blob import BlobBlock, ContentSettings
+from metrics import get_metrics
+
+# 添付ファイル（公募要領などのPDF）のBlobの接頭辞。Blob名は内容のSHA-256
+ATTACHMENT_PREFIX = "_attachments/"
+
+# 詳細データに追加する、添付ファイルへの参照のフィールド名
+ATTACHMENT_REFS_FIELD = "application_guideline_refs"
+
+# 添付ファイルの元のファイル名を記録するメタデータのキー（URLエンコード）
+FILENAME_METADATA_KEY = "filename"
+
+# デコードした添付ファイルをメモリに置く上限（超えた分は一時ファイルに書き出す）
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# ステージングする1ブロックのサイズ（バイト）
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def is_attachments_enabled(enabled=None):
+    """
+    添付ファイルを保存するかどうか
+
+    Args:
+        enabled: 明示的な指定（Noneの場合は環境変数 ATTACHMENTS_ENABLED、未設定なら保存しない）
+    """
+    if enabled is None:
+        return os.environ.get("ATTACHMENTS_ENABLED", "0") == "1"
+    return bool(enabled)
+
+
+def attachment_blob_name(content_hash):
+    """添付ファイルのBlob名"""
+    return f"{ATTACHMENT_PREFIX}{content_hash}"
+
+
+class AttachmentStore:
+    """
+    添付ファイルを内容のハッシュをBlob名として保存するストア
+
+    同じ内容のPDF（補助金の公募回違いなどで共通のもの）は1つのBlobにまとめて保存する。
+    """
+
+    def __init__(self, container_client):
+        """
+        Args:
+            container_client: ContainerClient（同期版）
+        """
+        self.container_client = container_client
+        # 同じ内容の添付ファイルを複数のスレッドで同時にアップロードしないためのロック（ハッシュごと）
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock_for(self, content_hash):
+        with self._locks_lock:
+            return self._locks.setdefault(content_hash, threading.Lock())
+
+    def extractor(self):
+        """補助金1件分の添付ファイルを受け取る AttachmentExtractor を作成する"""
+        return AttachmentExtractor(self)
+
+    def exists(self, content_hash):
+        try:
+            self.container_client.get_blob_client(attachment_blob_name(content_hash)).get_blob_properties()
+        except ResourceNotFoundError:
+            return False
+        return True
+
+    def upload(self, content_hash, stream, name=None):
+        """
+        デコード済みの添付ファイルをブロック単位でステージングしてからコミットする（保存済みの場合は何もしない）
+
+        Args:
+            content_hash (str): 内容のSHA-256
+            stream: 先頭に位置づけた、デコード済みの内容のファイルオブジェクト
+            name (str, optional): 元のファイル名（Content-Type の判定とメタデータに使う）
+
+        Returns:
+            bool: アップロードした場合はTrue、保存済みだった場合はFalse
+        """
+        metrics = get_metrics()
+        with metrics.stage("attachment_upload"), self._lock_for(content_hash):
+            if self.exists(content_hash):
+                return False
+            blob_client = self.container_client.get_blob_client(attachment_blob_name(content_hash))
+            content_type = (mimetypes.guess_type(name)[0] if name else None) or "application/octet-stream"
+            try:
+                block_list = []
+                for index, block in enumerate(iter(lambda: stream.read(BLOCK_SIZE), b'')):
+                    block_id = base64.b64encode(f"{index:08d}".encode('ascii')).decode('ascii')
+                    blob_client.stage_block(block_id, block)
+                    block_list.append(BlobBlock(block_id=block_id))
+                    metrics.add_bytes(len(block))
+                blob_client.commit_block_list(
+                    block_list,
+                    content_settings=ContentSettings(content_type=content_type),
+                    metadata={FILENAME_METADATA_KEY: quote(name or "")},
+                )
+            except HttpResponseError:
+                # 別のインスタンスが同じ内容を先にコミットした場合（ステージング中のブロックは破棄される）
+                if self.exists(content_hash):
+                    return False
+                raise
+            return True
+
+
+class AttachmentExtractor:
+    """
+    DetailStreamFilter から添付ファイルを受け取り、Base64を逐次デコードして保存する
+
+    デコードした内容は SpooledTemporaryFile に書き出しながらハッシュを計算するため、
+    PDF全体（Base64・デコード後のいずれも）をメモリに保持しない。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.refs = []
+        self._name = None
+        self._file = None
+        self._hash = None
+        self._size = 0
+        self._pending = b''
+        self._has_data = False
+
+    def begin(self):
+        self._name = None
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._pending = b''
+        self._has_data = False
+
+    def name(self, value):
+        self._name = value
+
+    def data(self, chunk):
+        """Base64の一部を受け取り、4文字単位でデコードする（端数は次のチャンクと合わせる）"""
+        self._has_data = True
+        buf = self._pending + chunk
+        usable = len(buf) - len(buf) % 4
+        self._pending = buf[usable:]
+        if usable:
+            self._write(base64.b64decode(buf[:usable]))
+
+    def _write(self, decoded):
+        self._file.write(decoded)
+        self._hash.update(decoded)
+        self._size += len(decoded)
+
+    def end(self):
+        """1件の添付ファイルを保存し、参照を追加する"""
+        try:
+            if self._pending:
+                # 末尾のパディングが省略されている場合
+                self._write(base64.b64decode(self._pending + b'=' * (-len(self._pending) % 4)))
+            ref = {"name": self._name}
+            if self._has_data:
+                content_hash = self._hash.hexdigest()
+                self._file.seek(0)
+                self.store.upload(content_hash, self._file, self._name)
+                ref.update({
+                    "sha256": content_hash,
+                    "size": self._size,
+                    "blob": attachment_blob_name(content_hash),
+                })
+            self.refs.append(ref)
+        finally:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Azure SDK を経由した読み書きの確認
+
+J-Grants APIの代替サーバーと、Blob StorageのREST APIの代替サーバー（fake_blob_server.py）を起動し、
+azure-storage-blob のクライアントのままメイン処理を2回実行して、以下を確認する。
+SDKはダウンロード時に Content-Encoding: gzip を展開するため、local_blob.py では見つからない不整合を検出できる。
+
+- 前回のスナップショットを読み込んでスナップショットを作り直せること（2回目の実行）
+- 保存した補助金を load_subsidy_from_blob で読み込めること
+- スナップショットから全文検索の索引を作り直せること
+- 検索API（/api/subsidies/search）がスナップショットと全文検索の索引から検索できること
+- 以前の形式（Content-Encoding: gzip）のスナップショットを読み込めること
+
+使い方:
+    python src/bench/check_blob_sdk.py [1回あたりの件数（既定値: 20）]
+
+保存形式（BLOB_ENCODING）は json・gzip の両方を確認する。問題があれば終了コード1で終了する。
+"""
+import os
+import sys
+import io
+import gzip
+import json
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, os.path.dirname(SRC_DIR))
+
+from azure.storage.blob import BlobServiceClient, ContentSettings
+from fake_blob_server import FakeBlobServer
+from fake_jgrants_server import server_from_env
+
+# 1回の実行で処理する件数（省略時）
+DEFAULT_ITEMS_PER_RUN = 20
+
+
+def run_main(max_items):
+    """メイン処理を実行し、出力を返す（例外の場合は出力を表示してから送出する）"""
+    from fetch_and_save_to_blob import main
+
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            main(max_items=max_items, max_workers=4, time_budget_seconds=0)
+    except Exception:
+        print(output.getvalue())
+        raise
+    return output.getvalue()
+
+
+def check_encoding(connection_string, encoding, items_per_run):
+    """
+    保存形式ごとの確認
+
+    Returns:
+        list: (確認内容, 成否, 詳細) のリスト
+    """
+    import azure.functions as func
+    import function_app
+    from blob_codec import load_subsidy_from_blob
+    from manifest import SubsidyManifest
+    from search_index import SearchService
+    from snapshot import iter_snapshot_lines, line_subsidy_id, load_latest_pointer
+    from text_index import TEXT_INDEX_BLOB_NAME, update_text_index
+
+    container_name = f"check-{encoding}"
+    os.environ["BLOB_CONTAINER_NAME"] = container_name
+    os.environ["BLOB_ENCODING"] = encoding
+    container_client = BlobServiceClient.from_connection_string(connection_string).get_container_client(container_name)
+    results = []
+
+    # 1. 2回実行する（2回目は前回のスナップショットと全文検索の索引を読み込む）
+    run_main(items_per_run)
+    output = run_main(items_per_run)
+    manifest = SubsidyManifest.load(container_client)
+    pointer = load_latest_pointer(container_client)
+    count = len(manifest.ids())
+    results.append((
+        "前回のスナップショットを再利用して作成",
+        pointer is not None and pointer["count"] == count == items_per_run * 2 and f"再利用: {items_per_run}件" in output,
+        f"マニフェスト {count}件 / スナップショット {pointer and pointer['count']}件",
+    ))
+
+    # 2. 個別のBlobとスナップショットの行が一致する
+    lines = {line_subsidy_id(line): json.loads(line) for line in iter_snapshot_lines(container_client, pointer["blob"])}
+    subsidy_id = sorted(lines)[0]
+    stored = load_subsidy_from_blob(container_client.get_blob_client(f"{subsidy_id}.json"))
+    results.append(("load_subsidy_from_blob", stored == lines[subsidy_id], subsidy_id))
+
+    # 3. 全文検索の索引をスナップショットから作り直す
+    container_client.get_blob_client(TEXT_INDEX_BLOB_NAME).delete_blob()
+    with contextlib.redirect_stdout(io.StringIO()):
+        index = update_text_index(container_client, manifest, {})
+    results.append(("全文検索の索引をスナップショットから作成", len(index) == count, f"{len(index)}件"))
+
+    # 4. 検索API
+    function_app.search_service = SearchService(lambda: container_client, refresh_interval=0)
+    # デコレーターを適用した関数から、登録された関数本体を取り出す
+    search_subsidies = function_app.search_subsidies
+    if hasattr(search_subsidies, "_function"):
+        search_subsidies = search_subsidies._function.get_user_function()
+    title = lines[subsidy_id]["result"][0]["title"]
+    statuses = []
+    for params in ({}, {"q": title[:6]}):
+        request = func.HttpRequest(method="GET", url="/api/subsidies/search", params=params, body=b"")
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = search_subsidies(request)
+        body = json.loads(response.get_body())
+        statuses.append((response.status_code, body.get("total"), body.get("error")))
+    results.append((
+        "検索API",
+        statuses[0][:2] == (200, count) and statuses[1][0] == 200 and statuses[1][1] >= 1,
+        f"全件: {statuses[0]} / q: {statuses[1]}",
+    ))
+
+    # 5. 以前の形式（Content-Encoding: gzip）のスナップショット
+    legacy_name = "_snapshots/legacy.ndjson.gz"
+    payload = b"".join(json.dumps(lines[k], ensure_ascii=False).encode('utf-8') + b"\n" for k in sorted(lines))
+    container_client.get_blob_client(legacy_name).upload_blob(
+        gzip.compress(payload),
+        overwrite=True,
+        content_settings=ContentSettings(content_type="application/x-ndjson; charset=utf-8", content_encoding="gzip"),
+    )
+    legacy_count = sum(1 for _ in iter_snapshot_lines(container_client, legacy_name))
+    results.append(("以前の形式のスナップショット", legacy_count == count, f"{legacy_count}件"))
+    return results
+
+
+def main():
+    items_per_run = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ITEMS_PER_RUN
+    os.environ.pop("JGRANTS_CACHE_DIR", None)
+    os.environ.setdefault("SNAPSHOT_ENABLED", "1")
+    os.environ.setdefault("TEXT_INDEX_ENABLED", "1")
+
+    failed = 0
+    with server_from_env() as api_server, FakeBlobServer() as blob_server:
+        os.environ["JGRANTS_BASE_URL"] = api_server.base_url
+        os.environ["AZURE_STORAGE_CONNECTION_STRING"] = blob_server.connection_string
+        for encoding in ("json", "gzip"):
+            print(f"\n保存形式: {encoding}")
+            for name, ok, detail in check_encoding(blob_server.connection_string, encoding, items_per_run):
+                print(f"   {'✅' if ok else '❌'} {name}（{detail}）")
+                failed += 0 if ok else 1
+
+    print()
+    if failed:
+        print(f"❌ {failed}件の確認に失敗しました")
+        sys.exit(1)
+    print("✅ すべての確認に成功しました")
+
+
+if __name__ == "__main__":
+    main()
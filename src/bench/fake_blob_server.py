@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Blob Storage の REST API の代替サーバー（SDK を経由した読み書きの確認用）
+
+local_blob.py はSDKを置き換えるため、SDK（azure-core）がダウンロード時に行う処理
+（Content-Encoding の展開・範囲ダウンロードなど）を通らない。
+このサーバーは azure-storage-blob のクライアントからそのまま接続でき、SDKと同じ経路で読み書きを確認できる。
+保存した内容はメモリ上にのみ保持する。
+
+対応する操作: コンテナの作成・プロパティ取得、Blobのアップロード（1回のPUT）・ダウンロード（範囲指定を含む）・
+プロパティ取得・削除・一覧取得。条件付き書き込み（If-Match・If-None-Match）に対応し、認証は検証しない。
+"""
+import uuid
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+# 接続文字列に含めるアカウント（Azurite と同じ開発用のアカウント名とキー）
+ACCOUNT_NAME = "devstoreaccount1"
+ACCOUNT_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+
+# 応答に含めるAPIのバージョン
+API_VERSION = "2021-12-02"
+
+
+def _http_date(value):
+    return format_datetime(value, usegmt=True)
+
+
+class FakeBlobServer:
+    """
+    別スレッドで動くBlob StorageのREST APIの代替サーバー
+
+    with文で使うと、開始時に起動し終了時に停止する。
+    connection_string を BlobServiceClient.from_connection_string に渡して接続する。
+    """
+
+    def __init__(self, port=0):
+        """
+        Args:
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+        """
+        # (コンテナ名, Blob名) をキーとするBlob、コンテナ名をキーとするコンテナの作成日時
+        self.blobs = {}
+        self.containers = {}
+        self.stats = {"requests": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", int(port)), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def connection_string(self):
+        host, port = self._server.server_address[:2]
+        return (
+            f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT_NAME};AccountKey={ACCOUNT_KEY};"
+            f"BlobEndpoint=http://{host}:{port}/{ACCOUNT_NAME};"
+        )
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_HEAD(self):
+                server._handle(self, "HEAD")
+
+            def do_PUT(self):
+                server._handle(self, "PUT")
+
+            def do_DELETE(self):
+                server._handle(self, "DELETE")
+
+        return Handler
+
+    def _handle(self, handler, method):
+        url = urlparse(handler.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = unquote(url.path).lstrip("/").split("/", 2)
+        container = parts[1] if len(parts) > 1 else ""
+        blob_name = parts[2] if len(parts) > 2 else ""
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        with self._lock:
+            self.stats["requests"] += 1
+            if query.get("restype") == "container" and not blob_name:
+                if query.get("comp") == "list":
+                    response = self._list_blobs(container, query)
+                else:
+                    response = self._container(method, container)
+            else:
+                response = self._blob(method, container, blob_name, handler.headers, body)
+        status, headers, payload = response
+        handler.send_response(status)
+        headers = dict(headers, **{"x-ms-request-id": str(uuid.uuid4()), "x-ms-version": API_VERSION})
+        headers.setdefault("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        if method != "HEAD":
+            handler.wfile.write(payload)
+
+    def _error(self, status, code):
+        payload = (
+            f'<?xml version="1.0" encoding="utf-8"?><Error><Code>{code}</Code>'
+            f'<Message>{code}</Message></Error>'
+        ).encode('utf-8')
+        return status, {"x-ms-error-code": code, "Content-Type": "application/xml"}, payload
+
+    def _container(self, method, container):
+        if method == "PUT":
+            if container in self.containers:
+                return self._error(409, "ContainerAlreadyExists")
+            self.containers[container] = datetime.now(timezone.utc)
+            return 201, {"ETag": f'"0x{uuid.uuid4().hex[:16].upper()}"',
+                         "Last-Modified": _http_date(self.containers[container])}, b""
+        if container not in self.containers:
+            return self._error(404, "ContainerNotFound")
+        return 200, {"ETag": '"0x0"', "Last-Modified": _http_date(self.containers[container])}, b""
+
+    def _blob_headers(self, blob):
+        headers = {
+            "ETag": blob["etag"],
+            "Last-Modified": _http_date(blob["last_modified"]),
+            "x-ms-blob-type": "BlockBlob",
+            "x-ms-creation-time": _http_date(blob["last_modified"]),
+        }
+        if blob["content_type"]:
+            headers["Content-Type"] = blob["content_type"]
+        if blob["content_encoding"]:
+            headers["Content-Encoding"] = blob["content_encoding"]
+        for name, value in blob["metadata"].items():
+            headers[f"x-ms-meta-{name}"] = value
+        return headers
+
+    def _blob(self, method, container, blob_name, request_headers, body):
+        if container not in self.containers:
+            return self._error(404, "ContainerNotFound")
+        key = (container, blob_name)
+        blob = self.blobs.get(key)
+
+        if method == "PUT":
+            if_none_match = request_headers.get("If-None-Match")
+            if_match = request_headers.get("If-Match")
+            if if_none_match == "*" and blob is not None:
+                return self._error(409, "BlobAlreadyExists")
+            if if_match and (blob is None or (if_match != "*" and if_match != blob["etag"])):
+                return self._error(412, "ConditionNotMet")
+            blob = {
+                "data": body,
+                "etag": f'"0x{uuid.uuid4().hex[:16].upper()}"',
+                "last_modified": datetime.now(timezone.utc),
+                "content_type": request_headers.get("x-ms-blob-content-type"),
+                "content_encoding": request_headers.get("x-ms-blob-content-encoding"),
+                "metadata": {
+                    name[len("x-ms-meta-"):]: value
+                    for name, value in request_headers.items()
+                    if name.lower().startswith("x-ms-meta-")
+                },
+            }
+            self.blobs[key] = blob
+            return 201, {"ETag": blob["etag"], "Last-Modified": _http_date(blob["last_modified"]),
+                         "x-ms-request-server-encrypted": "true"}, b""
+
+        if blob is None:
+            return self._error(404, "BlobNotFound")
+        if method == "DELETE":
+            del self.blobs[key]
+            return 202, {}, b""
+
+        headers = self._blob_headers(blob)
+        data = blob["data"]
+        if method == "HEAD":
+            headers["Content-Length"] = str(len(data))
+            return 200, headers, b""
+
+        # 範囲指定のダウンロード（SDKは最初の要求で x-ms-range を指定する）
+        range_header = request_headers.get("x-ms-range") or request_headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            start, _, end = range_header[len("bytes="):].partition("-")
+            start = int(start)
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            if start >= len(data):
+                headers["Content-Range"] = f"bytes */{len(data)}"
+                status, error_headers, payload = self._error(416, "InvalidRange")
+                return status, dict(headers, **error_headers), payload
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return 206, headers, data[start:end + 1]
+        return 200, headers, data
+
+    def _list_blobs(self, container, query):
+        if container not in self.containers:
+            return self._error(404, "ContainerNotFound")
+        prefix = query.get("prefix") or ""
+        include_metadata = "metadata" in (query.get("include") or "")
+        items = []
+        for (blob_container, name), blob in sorted(self.blobs.items()):
+            if blob_container != container or not name.startswith(prefix):
+                continue
+            metadata = ""
+            if include_metadata:
+                metadata = "<Metadata>" + "".join(
+                    f"<{k}>{escape(v)}</{k}>" for k, v in blob["metadata"].items()
+                ) + "</Metadata>"
+            items.append(
+                f"<Blob><Name>{escape(name)}</Name><Properties>"
+                f"<Last-Modified>{_http_date(blob['last_modified'])}</Last-Modified>"
+                f"<Etag>{escape(blob['etag'])}</Etag>"
+                f"<Content-Length>{len(blob['data'])}</Content-Length>"
+                f"<Content-Type>{escape(blob['content_type'] or '')}</Content-Type>"
+                f"<Content-Encoding>{escape(blob['content_encoding'] or '')}</Content-Encoding>"
+                f"<BlobType>BlockBlob</BlobType></Properties>{metadata}</Blob>"
+            )
+        payload = (
+            f'<?xml version="1.0" encoding="utf-8"?>'
+            f'<EnumerationResults ServiceEndpoint="http://127.0.0.1/{ACCOUNT_NAME}" ContainerName="{escape(container)}">'
+            f'<Prefix>{escape(prefix)}</Prefix><Blobs>{"".join(items)}</Blobs><NextMarker /></EnumerationResults>'
+        ).encode('utf-8')
+        return 200, {"Content-Type": "application/xml"}, payload
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-blob", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+J-Grants APIの代替サーバー（ベンチマーク・オフライン確認用）
+
+fixtures.Catalog のデータを一覧API（/subsidies）・詳細API（/subsidies/id/{id}）として返す。
+レスポンスの遅延とエラー（500・429など）を指定した割合で発生させられる。
+
+単体で起動する場合（Ctrl+Cで終了）:
+    python src/bench/fake_jgrants_server.py [ポート番号]
+
+    環境変数 BENCH_SCALE・BENCH_LATENCY_MS・BENCH_JITTER_MS・BENCH_ERROR_RATE・BENCH_ERROR_STATUS で設定する
+"""
+import os
+import sys
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import Catalog
+
+# 本番のAPIと同じパス（JGRANTS_BASE_URL には http://127.0.0.1:{port} を指定する）
+LIST_PATH = "/subsidies"
+DETAIL_PATH_PREFIX = "/subsidies/id/"
+
+
+class FakeJGrantsServer:
+    """
+    別スレッドで動くJ-Grants APIの代替サーバー
+
+    with文で使うと、開始時に起動し終了時に停止する。
+    """
+
+    def __init__(self, catalog, port=0, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=500, seed=None):
+        """
+        Args:
+            catalog (Catalog): 返すデータ
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            latency_ms (float): すべてのレスポンスに加える遅延（ミリ秒）
+            jitter_ms (float): 遅延に加えるランダムな揺らぎの最大値（ミリ秒）
+            error_rate (float): エラーを返す割合（0〜1）
+            error_status (int): エラー時のステータスコード
+            seed (int, optional): 揺らぎ・エラーの乱数のシード
+        """
+        self.catalog = catalog
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.error_status = int(error_status)
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "bytes_sent": 0}
+        self._stats_lock = threading.Lock()
+        self._list_body = catalog.list_body()
+        self._server = ThreadingHTTPServer(("127.0.0.1", int(port)), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self)
+
+        return Handler
+
+    def _draw(self):
+        """遅延（秒）とエラーにするかどうかを決める"""
+        with self._random_lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+            is_error = self.error_rate > 0 and self._random.random() < self.error_rate
+        return (self.latency_ms + jitter) / 1000, is_error
+
+    def _handle(self, handler):
+        delay, is_error = self._draw()
+        if delay:
+            time.sleep(delay)
+
+        path = urlparse(handler.path).path.rstrip("/")
+        if is_error:
+            status, body = self.error_status, b'{"message":"injected error"}'
+        elif path == LIST_PATH:
+            status, body = 200, self._list_body
+        elif path.startswith(DETAIL_PATH_PREFIX):
+            body = self.catalog.detail_body(path[len(DETAIL_PATH_PREFIX):])
+            status, body = (200, body) if body is not None else (404, b'{"message":"not found"}')
+        else:
+            status, body = 404, b'{"message":"not found"}'
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            handler.send_header("Retry-After", "1")
+        handler.end_headers()
+        handler.wfile.write(body)
+
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_sent"] += len(body)
+            if is_error:
+                self.stats["errors"] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-jgrants", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def server_from_env(port=0, catalog=None):
+    """環境変数（BENCH_*）の設定で代替サーバーを作成する"""
+    return FakeJGrantsServer(
+        catalog or Catalog(scale=os.environ.get("BENCH_SCALE", 1)),
+        port=port,
+        latency_ms=os.environ.get("BENCH_LATENCY_MS", 0),
+        jitter_ms=os.environ.get("BENCH_JITTER_MS", 0),
+        error_rate=os.environ.get("BENCH_ERROR_RATE", 0),
+        error_status=os.environ.get("BENCH_ERROR_STATUS", 500),
+        seed=os.environ.get("BENCH_SEED"),
+    )
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = server_from_env(port)
+    print(f"J-Grants API 代替サーバー: {server.base_url}（{len(server.catalog.subsidies)}件）")
+    print(f"JGRANTS_BASE_URL={server.base_url} を指定して実行してください")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
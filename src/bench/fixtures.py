@@ -0,0 +1,108 @@
+"""
+ベンチマーク用の補助金データ（一覧・詳細）を output/ の取得済みデータから作成する
+
+- 一覧: output/subsidies_20251216_111354.json
+- 詳細: output/top10/*_detail.json（2.4 MBのPDFを含むものを含む）
+
+倍率（scale）を指定すると、一覧の各補助金をIDを変えて複製し、件数を scale 倍にする。
+上位10件以外の補助金の詳細は、top10 の詳細をテンプレートとしてIDとタイトルを置き換えて作成する。
+"""
+import os
+import glob
+import json
+import zlib
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+# 再生する一覧・詳細のファイル
+DEFAULT_LIST_PATH = os.path.join(PROJECT_ROOT, "output", "subsidies_20251216_111354.json")
+DEFAULT_DETAIL_DIR = os.path.join(PROJECT_ROOT, "output", "top10")
+
+API_METADATA = {"type": "https://developers.digital.go.jp/documents/jgrants/api/"}
+
+
+def synthetic_id(subsidy_id, copy):
+    """複製した補助金のID（1つ目は元のIDのまま）"""
+    return subsidy_id if copy == 0 else f"{subsidy_id}x{copy:03d}"
+
+
+class Catalog:
+    """
+    ベンチマーク用の補助金データ
+
+    詳細は補助金ごとに保持せず、テンプレートのバイト列のIDとタイトルを
+    リクエストのたびに置き換えて返すため、100倍に複製してもメモリはほとんど増えない。
+    """
+
+    def __init__(self, list_path=None, detail_dir=None, scale=1):
+        """
+        Args:
+            list_path (str, optional): 一覧のJSONファイル
+            detail_dir (str, optional): 詳細のJSONファイル（*_detail.json）のディレクトリ
+            scale (int): 一覧の件数の倍率（1〜100程度）
+        """
+        list_path = list_path or DEFAULT_LIST_PATH
+        detail_dir = detail_dir or DEFAULT_DETAIL_DIR
+        self.scale = max(1, int(scale))
+
+        with open(list_path, 'r', encoding='utf-8') as f:
+            original = json.load(f).get("result", [])
+
+        # 詳細のテンプレート（元の補助金ID → (JSONのバイト列, 元のID, 元のタイトル)）
+        self.templates = {}
+        for path in sorted(glob.glob(os.path.join(detail_dir, "*_detail.json"))):
+            with open(path, 'r', encoding='utf-8') as f:
+                detail = json.load(f)
+            body = json.dumps(detail, ensure_ascii=False).encode('utf-8')
+            self.templates[detail["id"]] = (body, detail["id"], detail.get("title") or "")
+        if not self.templates:
+            raise ValueError(f"詳細のファイルが見つかりません: {detail_dir}")
+        self._template_ids = sorted(self.templates)
+
+        # 一覧（複製分を含む）と、補助金IDごとのテンプレート
+        self.subsidies = []
+        self._detail_sources = {}
+        for copy in range(self.scale):
+            for subsidy in original:
+                new_id = synthetic_id(subsidy["id"], copy)
+                item = dict(subsidy, id=new_id)
+                if copy:
+                    item["title"] = f"{subsidy.get('title') or ''}（複製{copy}）"
+                self.subsidies.append(item)
+                self._detail_sources[new_id] = (self._template_for(subsidy["id"]), item["title"])
+
+    def _template_for(self, subsidy_id):
+        """詳細のテンプレートを選ぶ（取得済みの補助金はその詳細、それ以外はIDから決まるもの）"""
+        if subsidy_id in self.templates:
+            return subsidy_id
+        return self._template_ids[zlib.crc32(subsidy_id.encode('utf-8')) % len(self._template_ids)]
+
+    def list_body(self):
+        """一覧APIのレスポンス本文"""
+        data = {
+            "metadata": dict(API_METADATA, resultset={"count": len(self.subsidies)}),
+            "result": self.subsidies,
+        }
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def detail_body(self, subsidy_id):
+        """
+        詳細APIのレスポンス本文
+
+        Returns:
+            bytes: レスポンス本文（存在しない補助金IDの場合はNone）
+        """
+        source = self._detail_sources.get(subsidy_id)
+        if source is None:
+            return None
+        template_id, title = source
+        body, original_id, original_title = self.templates[template_id]
+        body = body.replace(json.dumps(original_id).encode('utf-8'), json.dumps(subsidy_id).encode('utf-8'), 1)
+        if original_title and title != original_title:
+            body = body.replace(
+                json.dumps(original_title, ensure_ascii=False).encode('utf-8'),
+                json.dumps(title, ensure_ascii=False).encode('utf-8'),
+                1,
+            )
+        metadata = json.dumps(dict(API_METADATA, resultset={"count": 1})).encode('utf-8')
+        return b'{"metadata":' + metadata + b',"result":[' + body + b']}'
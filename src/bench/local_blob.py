@@ -0,0 +1,258 @@
+"""
+ローカルのファイルシステムに保存するBlob Storageの代替（ベンチマーク用）
+
+fetch_and_save_to_blob.py が使う範囲のAPI（条件付き書き込み・メタデータ・一覧取得など）だけを実装する。
+ダウンロードはSDKと同じく Content-Encoding: gzip の内容を展開して返す。
+Azuriteを用意できない環境でも、ストレージへの書き込みを含めた処理全体を計測できる。
+
+  {root}/{コンテナ名}/{Blob名}                  Blobの内容
+  {root}/{コンテナ名}/.blobmeta/{Blob名}.json   ETag・メタデータ・Content-Type など
+  {root}/{コンテナ名}/.blobblocks/{Blob名}/     ステージング中のブロック（コミット時に削除）
+"""
+import os
+import io
+import gzip
+import json
+import uuid
+import shutil
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+_META_DIR = ".blobmeta"
+_BLOCK_DIR = ".blobblocks"
+
+# 条件付き書き込みの判定と書き込みを不可分にするためのロック
+_write_lock = threading.Lock()
+
+
+def _read_data(data, length=None):
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    return data.read() if length is None else data.read(length)
+
+
+class LocalBlobClient:
+    """1つのBlobのクライアント（azure.storage.blob.BlobClient の代替）"""
+
+    def __init__(self, container_dir, blob_name):
+        self.container_dir = container_dir
+        self.blob_name = blob_name
+        self.path = os.path.join(container_dir, blob_name)
+        self.meta_path = os.path.join(container_dir, _META_DIR, blob_name + ".json")
+        self.block_dir = os.path.join(container_dir, _BLOCK_DIR, blob_name)
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ResourceNotFoundError(f"The specified blob does not exist: {self.blob_name}")
+
+    def _properties(self, meta):
+        return SimpleNamespace(
+            name=self.blob_name,
+            etag=meta["etag"],
+            size=meta["size"],
+            metadata=dict(meta.get("metadata") or {}),
+            last_modified=datetime.fromisoformat(meta["last_modified"]),
+            content_settings=SimpleNamespace(
+                content_type=meta.get("content_type"),
+                content_encoding=meta.get("content_encoding"),
+            ),
+        )
+
+    def get_blob_properties(self):
+        return self._properties(self._load_meta())
+
+    def upload_blob(self, data, overwrite=False, metadata=None, content_settings=None,
+                    etag=None, match_condition=None, length=None, **kwargs):
+        payload = _read_data(data, length)
+        with _write_lock:
+            try:
+                current = self._load_meta()
+            except ResourceNotFoundError:
+                current = None
+            if current is not None and not overwrite:
+                raise ResourceExistsError(f"The specified blob already exists: {self.blob_name}")
+            if match_condition == MatchConditions.IfNotModified and (current is None or current["etag"] != etag):
+                raise ResourceModifiedError(f"The condition specified using HTTP conditional header(s) is not met: {self.blob_name}")
+
+            meta = {
+                "etag": f'"0x{uuid.uuid4().hex[:16].upper()}"',
+                "size": len(payload),
+                "metadata": metadata or {},
+                "last_modified": datetime.now(timezone.utc).isoformat(),
+                "content_type": getattr(content_settings, "content_type", None),
+                "content_encoding": getattr(content_settings, "content_encoding", None),
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+            with open(self.meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        return {"etag": meta["etag"], "last_modified": meta["last_modified"]}
+
+    def _block_path(self, block_id):
+        # ブロックIDはBase64のため、ファイル名に使えない文字を置き換える
+        return os.path.join(self.block_dir, block_id.replace("/", "_").replace("+", "-"))
+
+    def stage_block(self, block_id, data, length=None, **kwargs):
+        payload = _read_data(data, length)
+        os.makedirs(self.block_dir, exist_ok=True)
+        with open(self._block_path(block_id), 'wb') as f:
+            f.write(payload)
+
+    def commit_block_list(self, block_list, metadata=None, content_settings=None, **kwargs):
+        block_ids = [getattr(block, "id", block) for block in block_list]
+        buf = io.BytesIO()
+        for block_id in block_ids:
+            with open(self._block_path(block_id), 'rb') as f:
+                buf.write(f.read())
+        buf.seek(0)
+        result = self.upload_blob(buf, overwrite=True, metadata=metadata, content_settings=content_settings)
+        shutil.rmtree(self.block_dir, ignore_errors=True)
+        return result
+
+    def download_blob(self):
+        with _write_lock:
+            meta = self._load_meta()
+            with open(self.path, 'rb') as f:
+                payload = f.read()
+        # SDK（azure-core）と同様に、Content-Encoding: gzip の内容は展開して返す
+        if meta.get("content_encoding") == "gzip":
+            payload = gzip.decompress(payload)
+        return LocalDownloader(payload, self._properties(meta))
+
+    def delete_blob(self):
+        with _write_lock:
+            self._load_meta()
+            os.remove(self.meta_path)
+            os.remove(self.path)
+
+
+class LocalDownloader:
+    """ダウンロード結果（azure.storage.blob.StorageStreamDownloader の代替）"""
+
+    def __init__(self, payload, properties):
+        self._payload = payload
+        self.properties = properties
+        self.size = len(payload)
+
+    def readall(self):
+        return self._payload
+
+    def readinto(self, stream):
+        stream.write(self._payload)
+        return len(self._payload)
+
+    def chunks(self):
+        stream = io.BytesIO(self._payload)
+        return iter(lambda: stream.read(4 * 1024 * 1024), b'')
+
+
+class LocalContainerClient:
+    """コンテナのクライアント（azure.storage.blob.ContainerClient の代替）"""
+
+    def __init__(self, root, container_name):
+        self.container_name = container_name
+        self.container_dir = os.path.join(root, container_name)
+
+    def get_container_properties(self):
+        if not os.path.isdir(self.container_dir):
+            raise ResourceNotFoundError(f"The specified container does not exist: {self.container_name}")
+        return SimpleNamespace(name=self.container_name)
+
+    def create_container(self):
+        if os.path.isdir(self.container_dir):
+            raise ResourceExistsError(f"The specified container already exists: {self.container_name}")
+        os.makedirs(os.path.join(self.container_dir, _META_DIR))
+        return self
+
+    def get_blob_client(self, blob):
+        return LocalBlobClient(self.container_dir, blob)
+
+    def list_blobs(self, name_starts_with=None, include=None):
+        meta_root = os.path.join(self.container_dir, _META_DIR)
+        names = []
+        for dirpath, _, filenames in os.walk(meta_root):
+            for filename in filenames:
+                if filename.endswith(".json"):
+                    path = os.path.join(dirpath, filename)
+                    names.append(os.path.relpath(path, meta_root)[:-len(".json")].replace(os.sep, "/"))
+        for name in sorted(names):
+            if name_starts_with and not name.startswith(name_starts_with):
+                continue
+            try:
+                yield self.get_blob_client(name).get_blob_properties()
+            except ResourceNotFoundError:
+                continue
+
+
+class LocalBlobServiceClient:
+    """ストレージアカウントのクライアント（azure.storage.blob.BlobServiceClient の代替）"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def get_container_client(self, container):
+        return LocalContainerClient(self.root, container)
+
+    def get_blob_client(self, container, blob):
+        return LocalBlobClient(os.path.join(self.root, container), blob)
+
+
+class AsyncLocalBlobClient:
+    """aio版 BlobClient の代替（同期版をそのまま呼び出す）"""
+
+    def __init__(self, blob_client):
+        self._blob_client = blob_client
+
+    async def get_blob_properties(self):
+        return self._blob_client.get_blob_properties()
+
+    async def upload_blob(self, data, **kwargs):
+        return self._blob_client.upload_blob(data, **kwargs)
+
+
+class AsyncLocalContainerClient:
+    """aio版 ContainerClient の代替（blob_sink.AsyncBlobSink から使う）"""
+
+    def __init__(self, root, container_name):
+        self._container_client = LocalContainerClient(root, container_name)
+
+    @classmethod
+    def from_connection_string(cls, connection_string, container_name):
+        """接続文字列の代わりに保存先のディレクトリを受け取る"""
+        return cls(connection_string, container_name)
+
+    def get_blob_client(self, blob):
+        return AsyncLocalBlobClient(self._container_client.get_blob_client(blob))
+
+    async def close(self):
+        pass
+
+
+def install(root):
+    """
+    fetch_and_save_to_blob のBlob Storageへのアクセスを、root 以下のファイルシステムに切り替える
+
+    接続文字列（AZURE_STORAGE_CONNECTION_STRING）には保存先のディレクトリを設定する。
+
+    Args:
+        root (str): 保存先のディレクトリ
+    """
+    import blob_sink
+    import fetch_and_save_to_blob
+
+    os.environ["AZURE_STORAGE_CONNECTION_STRING"] = root
+    fetch_and_save_to_blob.get_blob_service_client = lambda: LocalBlobServiceClient(root)
+    blob_sink.ContainerClient = AsyncLocalContainerClient
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+補助金データ取得・保存処理（fetch_and_save_to_blob.main）のベンチマーク
+
+J-Grants APIの代わりに fake_jgrants_server を別プロセスで起動し、
+ローカルのファイルシステム（既定）またはAzuriteに保存して、次の値を計測する。
+
+- 処理件数/秒（詳細取得〜アップロード待ちに追加するまで、を1件とする）
+- 1件あたりの処理時間の p50 / p99
+- ピークのメモリ使用量（RSS、このプロセスのみ。代替サーバーは含まない）
+
+実行方法:
+    python src/bench/run_benchmark.py
+
+設定（環境変数）:
+    BENCH_SCALE         一覧の件数の倍率（既定値: 1。10〜100倍で大規模な状態を再現）
+    BENCH_LATENCY_MS    APIのレスポンスに加える遅延（ミリ秒）
+    BENCH_JITTER_MS     遅延の揺らぎの最大値（ミリ秒）
+    BENCH_ERROR_RATE    APIがエラーを返す割合（0〜1）
+    BENCH_ERROR_STATUS  エラー時のステータスコード（既定値: 500）
+    BENCH_SEED          遅延の揺らぎ・エラーの乱数のシード
+    BENCH_SINK          保存先（local: ファイルシステム / azurite: Azurite、既定値: local）
+    BENCH_MAX_ITEMS     処理する最大件数
+    BENCH_BASELINE      比較する前回の結果（JSON）。性能が BENCH_TOLERANCE（既定値: 0.2）を超えて
+                        悪化した場合は終了コード1で終了する
+    FETCH_MAX_WORKERS などメイン処理の設定はそのまま使われる
+
+結果は output/bench/bench_YYYYMMDD_HHMMSS.json に保存する。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from metrics import percentile
+
+PROJECT_ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..', '..'))
+RESULT_DIR = os.path.join(PROJECT_ROOT, "output", "bench")
+
+# Azuriteの接続文字列
+AZURITE_CONNECTION_STRING = "UseDevelopmentStorage=true"
+
+# 前回の結果と比較する際の許容範囲（割合）
+DEFAULT_TOLERANCE = 0.2
+
+
+def _serve(conn):
+    """代替サーバーのプロセス: 起動してURLを返し、停止の指示を待ってから統計を返す"""
+    from fake_jgrants_server import server_from_env
+
+    server = server_from_env()
+    server.start()
+    conn.send({"base_url": server.base_url, "count": len(server.catalog.subsidies)})
+    conn.recv()
+    server.stop()
+    conn.send(server.stats)
+
+
+def peak_rss_bytes():
+    """このプロセスのピークのRSS（バイト）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト単位、Linuxはキロバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def setup_sink(sink):
+    """
+    保存先を準備する
+
+    Returns:
+        str: 後片付けが必要なディレクトリ（Azuriteの場合はNone）
+    """
+    import local_blob
+
+    # 毎回空のコンテナに保存する
+    os.environ["BLOB_CONTAINER_NAME"] = f"bench-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    if sink == "azurite":
+        os.environ["AZURE_STORAGE_CONNECTION_STRING"] = AZURITE_CONNECTION_STRING
+        return None
+    if sink != "local":
+        raise ValueError(f"保存先が不正です: {sink}（local・azurite のいずれか）")
+    root = tempfile.mkdtemp(prefix="jgrants-bench-")
+    local_blob.install(root)
+    return root
+
+
+def instrument(fetch_and_save_to_blob):
+    """
+    1件ごとの処理時間と結果を記録するように process_subsidy を置き換える
+
+    Returns:
+        dict: 記録先（durations: 処理時間のリスト、statuses: 結果ごとの件数）
+    """
+    records = {"durations": [], "statuses": {}}
+    lock = threading.Lock()
+    process_subsidy = fetch_and_save_to_blob.process_subsidy
+
+    def timed_process_subsidy(*args, **kwargs):
+        started = time.perf_counter()
+        status = "failed"
+        try:
+            status = process_subsidy(*args, **kwargs)
+            return status
+        finally:
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status != "deferred":
+                    records["durations"].append(elapsed)
+                records["statuses"][status] = records["statuses"].get(status, 0) + 1
+
+    fetch_and_save_to_blob.process_subsidy = timed_process_subsidy
+    return records
+
+
+def compare_with_baseline(result, baseline_path, tolerance):
+    """
+    前回の結果と比較する
+
+    Returns:
+        list: 悪化した項目の説明（問題がなければ空）
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    if baseline.get("items_per_sec") and result["items_per_sec"] < baseline["items_per_sec"] * (1 - tolerance):
+        regressions.append(f"処理件数/秒: {baseline['items_per_sec']:.1f} → {result['items_per_sec']:.1f}")
+    if baseline.get("p99_ms") and result["p99_ms"] and result["p99_ms"] > baseline["p99_ms"] * (1 + tolerance):
+        regressions.append(f"p99: {baseline['p99_ms']:.1f} ms → {result['p99_ms']:.1f} ms")
+    if baseline.get("peak_rss_bytes") and result["peak_rss_bytes"] > baseline["peak_rss_bytes"] * (1 + tolerance):
+        regressions.append(
+            f"ピークRSS: {baseline['peak_rss_bytes'] / 1024 / 1024:.1f} MB → {result['peak_rss_bytes'] / 1024 / 1024:.1f} MB"
+        )
+    return regressions
+
+
+def main():
+    sink = os.environ.get("BENCH_SINK", "local")
+    max_items = int(os.environ["BENCH_MAX_ITEMS"]) if os.environ.get("BENCH_MAX_ITEMS") else None
+
+    # 代替サーバーを別プロセスで起動（一覧・詳細のデータがこのプロセスのメモリに乗らないようにする）
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    server_process = context.Process(target=_serve, args=(child_conn,), daemon=True)
+    server_process.start()
+    server_info = parent_conn.recv()
+
+    import fetch_and_save_to_blob
+
+    # local.env の設定よりも代替サーバーを優先し、レスポンスのキャッシュは使わない
+    os.environ["JGRANTS_BASE_URL"] = server_info["base_url"]
+    os.environ.pop("JGRANTS_CACHE_DIR", None)
+    local_root = setup_sink(sink)
+    records = instrument(fetch_and_save_to_blob)
+
+    print("=" * 60)
+    print("ベンチマーク")
+    print(f"   一覧の件数: {server_info['count']}件（倍率: {os.environ.get('BENCH_SCALE', 1)}）")
+    print(f"   遅延: {os.environ.get('BENCH_LATENCY_MS', 0)} ms（揺らぎ: {os.environ.get('BENCH_JITTER_MS', 0)} ms）")
+    print(f"   エラー率: {os.environ.get('BENCH_ERROR_RATE', 0)}")
+    print(f"   保存先: {sink}")
+    print("=" * 60)
+
+    rss_before = peak_rss_bytes()
+    started = time.perf_counter()
+    try:
+        fetch_and_save_to_blob.main(max_items=max_items)
+    finally:
+        elapsed = time.perf_counter() - started
+        parent_conn.send("stop")
+        server_stats = parent_conn.recv()
+        server_process.join()
+        if local_root:
+            shutil.rmtree(local_root, ignore_errors=True)
+
+    durations = sorted(records["durations"])
+    result = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "scale": int(os.environ.get("BENCH_SCALE", 1)),
+        "latency_ms": float(os.environ.get("BENCH_LATENCY_MS", 0)),
+        "jitter_ms": float(os.environ.get("BENCH_JITTER_MS", 0)),
+        "error_rate": float(os.environ.get("BENCH_ERROR_RATE", 0)),
+        "sink": sink,
+        "list_count": server_info["count"],
+        "items": len(durations),
+        "statuses": records["statuses"],
+        "elapsed_sec": round(elapsed, 3),
+        "items_per_sec": round(len(durations) / elapsed, 2) if elapsed > 0 else 0,
+        "p50_ms": round(percentile(durations, 50) * 1000, 2) if durations else None,
+        "p99_ms": round(percentile(durations, 99) * 1000, 2) if durations else None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "start_rss_bytes": rss_before,
+        "server": server_stats,
+    }
+
+    print(f"\n{'='*60}")
+    print("ベンチマーク結果")
+    print(f"   処理件数: {result['items']}件（{result['elapsed_sec']:.1f}秒）")
+    print(f"   処理件数/秒: {result['items_per_sec']:.1f}")
+    if durations:
+        print(f"   1件あたり: p50 {result['p50_ms']:.1f} ms / p99 {result['p99_ms']:.1f} ms")
+    print(f"   ピークRSS: {result['peak_rss_bytes'] / 1024 / 1024:.1f} MB（開始時: {rss_before / 1024 / 1024:.1f} MB）")
+    print(f"   APIリクエスト: {server_stats['requests']}件（エラー注入: {server_stats['errors']}件 / "
+          f"送信: {server_stats['bytes_sent'] / 1024 / 1024:.1f} MB）")
+
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    output_file = os.path.join(RESULT_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果を保存しました: {output_file}")
+
+    baseline_path = os.environ.get("BENCH_BASELINE")
+    if baseline_path:
+        tolerance = float(os.environ.get("BENCH_TOLERANCE", DEFAULT_TOLERANCE))
+        regressions = compare_with_baseline(result, baseline_path, tolerance)
+        if regressions:
+            print(f"❌ 前回の結果（{baseline_path}）から悪化しています:")
+            for line in regressions:
+                print(f"   - {line}")
+            return 1
+        print(f"✅ 前回の結果（{baseline_path}）からの悪化はありません")
+    print(f"{'='*60}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
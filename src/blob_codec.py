@@ -0,0 +1,110 @@
+import os
+import gzip
+import json
+import hashlib
+from azure.storage.blob import ContentSettings
+
+# 保存形式
+# - json: 空白なしのJSON
+# - gzip: 空白なしのJSONをgzip圧縮（Content-Encoding: gzip）
+ENCODING_JSON = "json"
+ENCODING_GZIP = "gzip"
+SUPPORTED_ENCODINGS = (ENCODING_JSON, ENCODING_GZIP)
+
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+
+# gzipのマジックナンバー（圧縮されたデータの先頭2バイト）
+GZIP_MAGIC = b'\x1f\x8b'
+
+# gzipの圧縮レベル（速度と圧縮率のバランス）
+GZIP_COMPRESS_LEVEL = 6
+
+
+def get_blob_encoding(encoding=None):
+    """
+    保存形式を決定する
+
+    Args:
+        encoding (str, optional): 明示的に指定された保存形式（Noneの場合は環境変数 BLOB_ENCODING を参照）
+
+    Returns:
+        str: 保存形式（"json" または "gzip"）
+    """
+    if encoding is None:
+        encoding = os.environ.get("BLOB_ENCODING", ENCODING_JSON)
+    encoding = encoding.lower()
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise ValueError(f"保存形式が不正です: {encoding}（{', '.join(SUPPORTED_ENCODINGS)} のいずれか）")
+    return encoding
+
+
+def dumps_compact(data):
+    """データを空白なしのJSON（UTF-8）にシリアライズする"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def encode_subsidy(detail_data, encoding=ENCODING_JSON):
+    """
+    補助金詳細データを保存形式にエンコードする
+
+    シリアライズは1回だけ行い、同じバイト列をサイズ表示・ハッシュ計算・アップロードに使う。
+    gzipのヘッダーには時刻を含めないため、同じ内容からは常に同じバイト列（ハッシュ）になる。
+
+    Args:
+        detail_data (dict): 補助金詳細データ（除外済み）
+        encoding (str): 保存形式
+
+    Returns:
+        dict: エンコード結果
+            - payload: 保存する内容のバイト列
+            - hash: payload のSHA-256（16進数）
+            - json: 圧縮前のJSON（スナップショットの1行としても使う）
+            - raw_size: 圧縮前のJSONのバイト数
+            - content_settings: Blobに設定する ContentSettings
+    """
+    json_data = dumps_compact(detail_data)
+    if encoding == ENCODING_GZIP:
+        payload = gzip.compress(json_data, compresslevel=GZIP_COMPRESS_LEVEL, mtime=0)
+        content_settings = ContentSettings(content_type=JSON_CONTENT_TYPE, content_encoding="gzip")
+    else:
+        payload = json_data
+        content_settings = ContentSettings(content_type=JSON_CONTENT_TYPE)
+    return {
+        "payload": payload,
+        "json": json_data,
+        "hash": hashlib.sha256(payload).hexdigest(),
+        "raw_size": len(json_data),
+        "content_settings": content_settings,
+    }
+
+
+def decode_subsidy(payload):
+    """
+    保存された補助金詳細データを読み込む
+
+    gzip圧縮されたBlob・圧縮されていないBlob（従来のインデント付きJSONを含む）のどちらも読み込める。
+    Content-Encoding: gzip のBlobはSDKがダウンロード時に展開するため、ヘッダーではなく
+    内容の先頭（gzipのマジックナンバー）で判定する。
+
+    Args:
+        payload (bytes): Blobの内容
+
+    Returns:
+        dict: 補助金詳細データ
+    """
+    if payload[:2] == GZIP_MAGIC:
+        payload = gzip.decompress(payload)
+    return json.loads(payload)
+
+
+def load_subsidy_from_blob(blob_client):
+    """
+    Blobから補助金詳細データを読み込む
+
+    Args:
+        blob_client: BlobClient
+
+    Returns:
+        dict: 補助金詳細データ
+    """
+    return decode_subsidy(blob_client.download_blob().readall())
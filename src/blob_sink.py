@@ -0,0 +1,168 @@
+import time
+import asyncio
+import threading
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob.aio import ContainerClient
+from manifest import CONTENT_HASH_METADATA_KEY
+from metrics import get_metrics
+
+# アップロードの同時実行数のデフォルト値
+DEFAULT_UPLOAD_CONCURRENCY = 8
+
+
+class AsyncBlobSink:
+    """
+    補助金データのBlobへのアップロードを非同期で実行するシンク
+
+    専用スレッドでイベントループを動かし、aio版のContainerClientを1つ共有して
+    キューに積まれたアップロードを並列実行する。
+    詳細取得のスレッドは submit() でキューに積むだけで次の取得に進めるため、
+    取得とアップロードが交互ではなく並行して進む。
+    キューが満杯の場合、submit() は空きができるまで待機する。
+    """
+
+    def __init__(self, connection_string, container_name, concurrency=None, queue_size=None):
+        """
+        Args:
+            connection_string (str): Azure Storageの接続文字列
+            container_name (str): コンテナ名
+            concurrency (int, optional): アップロードの同時実行数
+            queue_size (int, optional): アップロード待ちキューの上限（省略時は同時実行数の2倍）
+        """
+        self.connection_string = connection_string
+        self.container_name = container_name
+        self.concurrency = max(1, int(concurrency or DEFAULT_UPLOAD_CONCURRENCY))
+        self.queue_size = max(1, int(queue_size or self.concurrency * 2))
+        self._loop = None
+        self._thread = None
+        self._queue = None
+        self._workers = None
+        self._container_client = None
+        self._results = []
+
+    def start(self):
+        """イベントループのスレッドを起動し、アップロードのワーカーを開始する"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="blob-sink", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_workers(), self._loop).result()
+        return self
+
+    async def _start_workers(self):
+        self._container_client = ContainerClient.from_connection_string(
+            self.connection_string, self.container_name
+        )
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+
+    def submit(self, subsidy_id, payload, content_hash, previous=None, context=None, content_settings=None):
+        """
+        アップロードをキューに積む（キューが満杯の場合は待機する）
+
+        Args:
+            subsidy_id (str): 補助金ID
+            payload (bytes): 保存する内容
+            content_hash (str): 内容のSHA-256
+            previous (dict, optional): マニフェストの前回のエントリ（新規の場合はNone）
+            context (optional): 結果と一緒に返す任意の値
+            content_settings (ContentSettings, optional): Content-Type・Content-Encoding
+        """
+        item = (subsidy_id, payload, content_hash, previous, context, content_settings)
+        asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop).result()
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                subsidy_id, payload, content_hash, previous, context, content_settings = item
+                started = time.perf_counter()
+                try:
+                    result = await self._upload(subsidy_id, payload, content_hash, previous, content_settings)
+                except Exception as e:
+                    result = e
+                else:
+                    uploaded = len(payload) if result["status"] == "saved" else 0
+                    get_metrics().observe("upload", time.perf_counter() - started, uploaded)
+                self._results.append((subsidy_id, context, result))
+            finally:
+                self._queue.task_done()
+
+    async def _get_properties_or_none(self, blob_client):
+        try:
+            return await blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+
+    async def _upload(self, subsidy_id, payload, content_hash, previous, content_settings=None):
+        """
+        1件をアップロードする
+
+        内容のハッシュをBlobのメタデータに記録する。既存のBlobはETagが一致する場合のみ上書きし、
+        新規の場合は存在しない場合のみ作成する。他の処理が先に書き込んでいた場合は、
+        同じ内容であれば保存済みとして扱い、異なる内容であれば RuntimeError を送出する。
+
+        Returns:
+            dict: 保存結果（status・hash・etag）
+        """
+        blob_client = self._container_client.get_blob_client(f"{subsidy_id}.json")
+
+        etag = previous.get("etag") if previous else None
+        if previous and etag is None:
+            properties = await self._get_properties_or_none(blob_client)
+            if properties is not None:
+                if properties.metadata.get(CONTENT_HASH_METADATA_KEY) == content_hash:
+                    return {"status": "unchanged", "hash": content_hash, "etag": properties.etag}
+                etag = properties.etag
+
+        metadata = {CONTENT_HASH_METADATA_KEY: content_hash}
+        try:
+            if etag:
+                result = await blob_client.upload_blob(
+                    payload,
+                    overwrite=True,
+                    metadata=metadata,
+                    content_settings=content_settings,
+                    etag=etag,
+                    match_condition=MatchConditions.IfNotModified,
+                )
+            else:
+                result = await blob_client.upload_blob(
+                    payload,
+                    overwrite=False,
+                    metadata=metadata,
+                    content_settings=content_settings,
+                )
+        except (ResourceModifiedError, ResourceExistsError) as e:
+            properties = await self._get_properties_or_none(blob_client)
+            if properties is not None and properties.metadata.get(CONTENT_HASH_METADATA_KEY) == content_hash:
+                return {"status": "unchanged", "hash": content_hash, "etag": properties.etag}
+            raise RuntimeError("他の処理が先にBlobを更新したため保存を中止しました") from e
+
+        return {"status": "saved", "hash": content_hash, "etag": result.get("etag")}
+
+    async def _shutdown(self):
+        for _ in self._workers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._workers)
+        await self._container_client.close()
+
+    def close(self):
+        """
+        キューに残っているアップロードをすべて完了させ、シンクを停止する
+
+        Returns:
+            list: (補助金ID, context, 保存結果または例外) のリスト
+        """
+        if self._loop is None:
+            return []
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+        return self._results
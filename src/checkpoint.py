@@ -0,0 +1,65 @@
+import json
+from azure.core.exceptions import ResourceNotFoundError
+from manifest import utc_now_iso
+
+# 時間切れで中断した実行の続きを記録するBlob名
+CHECKPOINT_BLOB_NAME = "_checkpoint.json"
+
+COUNTER_KEYS = ("saved", "unchanged", "failed")
+
+
+def load_checkpoint(container_client):
+    """
+    前回の実行が残したチェックポイントを読み込む
+
+    Args:
+        container_client: ContainerClient
+
+    Returns:
+        dict: チェックポイント（remaining_ids・counters・runs・created_at）。存在しない場合はNone
+    """
+    try:
+        payload = container_client.get_blob_client(CHECKPOINT_BLOB_NAME).download_blob().readall()
+    except ResourceNotFoundError:
+        return None
+    return json.loads(payload)
+
+
+def save_checkpoint(container_client, remaining_ids, counters, previous=None):
+    """
+    未処理の補助金IDと件数をチェックポイントとして保存する
+
+    前回のチェックポイントがある場合は、件数を累計する。
+
+    Args:
+        container_client: ContainerClient
+        remaining_ids (list): 時間切れで処理できなかった補助金ID
+        counters (dict): この実行での件数（saved・unchanged・failed）
+        previous (dict, optional): 前回のチェックポイント
+
+    Returns:
+        dict: 保存したチェックポイント
+    """
+    previous_counters = (previous or {}).get("counters", {})
+    checkpoint = {
+        "created_at": utc_now_iso(),
+        "runs": (previous or {}).get("runs", 0) + 1,
+        "remaining_ids": list(remaining_ids),
+        "counters": {
+            key: previous_counters.get(key, 0) + counters.get(key, 0)
+            for key in COUNTER_KEYS
+        },
+    }
+    container_client.get_blob_client(CHECKPOINT_BLOB_NAME).upload_blob(
+        json.dumps(checkpoint, ensure_ascii=False).encode('utf-8'),
+        overwrite=True,
+    )
+    return checkpoint
+
+
+def clear_checkpoint(container_client):
+    """チェックポイントを削除する（存在しない場合は何もしない）"""
+    try:
+        container_client.get_blob_client(CHECKPOINT_BLOB_NAME).delete_blob()
+    except ResourceNotFoundError:
+        pass
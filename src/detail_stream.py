@@ -0,0 +1,267 @@
+import json
+import re
+
+# 文字列中で特別な扱いが必要な文字（終端の引用符とエスケープ）
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+# JSONの空白文字
+_WHITESPACE = b' \t\r\n'
+
+# 読み込み時のチャンクサイズ（バイト）
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# 添付ファイル（公募要領などのPDF）の配列のフィールド名
+ATTACHMENT_FIELD = b'application_guidelines'
+
+
+class DetailStreamFilter:
+    """
+    補助金詳細APIのレスポンスを逐次読み込み、指定フィールドを読み飛ばすフィルタ
+
+    `result` 配列の各要素（補助金詳細オブジェクト）の直下にある除外フィールドは、
+    値を保持せずにバイト列のまま読み飛ばす。
+    そのため、Base64のPDFデータを含むレスポンスでも、
+    メモリ上に残るのは除外後のフィールド分だけになる。
+
+    UTF-8ではマルチバイト文字の各バイトが0x80以上になり、
+    JSONの構造文字（{}[],:"\\）と衝突しないため、デコードせずにバイト単位で処理する。
+    出力は空白を除いたコンパクトなJSONとなる。
+
+    attachment_handler を指定した場合、application_guidelines の各要素について
+    name と data（Base64）を読み飛ばしながら逐次 attachment_handler に渡す（除外する場合も同様）。
+    attachment_handler は次のメソッドを持つオブジェクトとする。
+      - begin(): 要素の開始
+      - name(value): name の値（文字列）
+      - data(chunk): data の値の一部（Base64のバイト列、エスケープ解除済み）
+      - end(): 要素の終了
+    """
+
+    def __init__(self, exclude_fields, attachment_handler=None):
+        """
+        Args:
+            exclude_fields (list): 除外するフィールド名のリスト
+            attachment_handler (optional): 添付ファイル（application_guidelines）を受け取るオブジェクト
+        """
+        self._exclude = {field.encode('utf-8') for field in exclude_fields}
+        self._attachment_handler = attachment_handler
+        # 添付ファイルの値を受け取り中の場合、そのキー（b'name' または b'data'）
+        self._capture = None
+        self._capture_buf = None
+        self._out = bytearray()
+        # 開いているコンテナ（b'{' または b'['）
+        self._stack = []
+        # コンテナごとの現在のキー（配列の場合はNone）
+        self._keys = []
+        # オブジェクトごとにキーを待っている状態かどうか
+        self._expect_key = []
+        # オブジェクトごとに出力済みのメンバー数（カンマの出力判定に使う）
+        self._members = []
+        self._in_string = False
+        self._escape = False
+        self._key_buf = None
+        # 読み飛ばし中の場合、読み飛ばしを開始したオブジェクトの深さ
+        self._skip_depth = None
+        self.bytes_read = 0
+
+    def _is_target_object(self):
+        """現在のオブジェクトが result 配列の要素かどうか"""
+        return (
+            len(self._stack) == 3
+            and self._stack[0] == b'{'
+            and self._stack[1] == b'['
+            and self._stack[2] == b'{'
+            and self._keys[0] == b'result'
+        )
+
+    def _is_attachment_object(self):
+        """現在のオブジェクトが result[].application_guidelines 配列の要素かどうか"""
+        return (
+            len(self._stack) == 5
+            and self._stack[3] == b'['
+            and self._stack[4] == b'{'
+            and self._keys[0] == b'result'
+            and self._keys[2] == ATTACHMENT_FIELD
+        )
+
+    def _capture_text(self, data):
+        """添付ファイルの値の一部（エスケープを含まない部分）"""
+        if self._capture == b'data':
+            if data:
+                self._attachment_handler.data(bytes(data))
+        else:
+            self._capture_buf += data
+
+    def _capture_escape(self, char):
+        """添付ファイルの値の中のエスケープされた1文字"""
+        if self._capture == b'data':
+            # Base64で意味を持つのは \/ のみ（\n などの改行は読み捨てる）
+            if char == b'/':
+                self._attachment_handler.data(char)
+        else:
+            self._capture_buf += b'\\' + char
+
+    def _end_capture(self):
+        if self._capture == b'name':
+            self._attachment_handler.name(json.loads(b'"' + bytes(self._capture_buf) + b'"'))
+        self._capture = None
+        self._capture_buf = None
+
+    def _emit(self, data):
+        if self._key_buf is not None:
+            self._key_buf += data
+        elif self._skip_depth is None:
+            self._out += data
+
+    def _end_key(self):
+        key = bytes(self._key_buf)
+        self._key_buf = None
+        self._keys[-1] = key
+        if self._skip_depth is not None:
+            # 読み飛ばし中の添付ファイルのキー（出力しない）
+            return
+        if self._is_target_object() and key in self._exclude:
+            # キー・コロン・値をまとめて読み飛ばす
+            self._skip_depth = len(self._stack)
+            return
+        if self._members[-1] > 0:
+            self._out += b','
+        self._members[-1] += 1
+        self._out += b'"' + key + b'"'
+
+    def _end_value(self):
+        """現在の深さで値が1つ完了した"""
+        if self._skip_depth is not None and len(self._stack) == self._skip_depth:
+            self._skip_depth = None
+
+    def feed(self, chunk):
+        """
+        レスポンス本文のチャンクを処理する
+
+        Args:
+            chunk (bytes): 受信したバイト列
+        """
+        self.bytes_read += len(chunk)
+        i = 0
+        n = len(chunk)
+        while i < n:
+            if self._in_string:
+                if self._escape:
+                    self._emit(chunk[i:i + 1])
+                    if self._capture is not None:
+                        self._capture_escape(chunk[i:i + 1])
+                    self._escape = False
+                    i += 1
+                    continue
+                m = _STRING_SPECIAL.search(chunk, i)
+                if m is None:
+                    self._emit(chunk[i:])
+                    if self._capture is not None:
+                        self._capture_text(chunk[i:])
+                    break
+                j = m.start()
+                if chunk[j] == 0x5c:  # バックスラッシュ
+                    self._emit(chunk[i:j + 1])
+                    if self._capture is not None:
+                        self._capture_text(chunk[i:j])
+                    self._escape = True
+                    i = j + 1
+                    continue
+                # 文字列の終端
+                if self._key_buf is not None:
+                    self._key_buf += chunk[i:j]
+                    self._in_string = False
+                    self._end_key()
+                else:
+                    self._emit(chunk[i:j + 1])
+                    if self._capture is not None:
+                        self._capture_text(chunk[i:j])
+                        self._end_capture()
+                    self._in_string = False
+                    self._end_value()
+                i = j + 1
+                continue
+
+            c = chunk[i:i + 1]
+            i += 1
+            if c in _WHITESPACE:
+                continue
+            if not self._stack and c in b'}],:':
+                raise ValueError("不正なJSONです")
+            if c == b'"':
+                self._in_string = True
+                in_object = self._stack and self._stack[-1] == b'{'
+                in_attachment = self._attachment_handler is not None and self._is_attachment_object()
+                if in_object and self._expect_key[-1] and (self._skip_depth is None or in_attachment):
+                    self._key_buf = bytearray()
+                else:
+                    self._emit(c)
+                    if in_attachment and not self._expect_key[-1] and self._keys[-1] in (b'name', b'data'):
+                        self._capture = self._keys[-1]
+                        self._capture_buf = bytearray()
+            elif c == b'{' or c == b'[':
+                self._emit(c)
+                self._stack.append(c)
+                self._keys.append(None)
+                self._expect_key.append(c == b'{')
+                self._members.append(0)
+                if self._attachment_handler is not None and self._is_attachment_object():
+                    self._attachment_handler.begin()
+            elif c == b'}' or c == b']':
+                # スカラー値の読み飛ばし中にオブジェクトが閉じた場合
+                self._end_value()
+                self._emit(c)
+                if self._attachment_handler is not None and self._is_attachment_object():
+                    self._attachment_handler.end()
+                self._stack.pop()
+                self._keys.pop()
+                self._expect_key.pop()
+                self._members.pop()
+                self._end_value()
+            elif c == b',':
+                self._end_value()
+                if self._stack[-1] == b'{':
+                    # オブジェクト内のカンマは次のキーを出力する時に付ける
+                    self._expect_key[-1] = True
+                else:
+                    self._emit(c)
+            elif c == b':':
+                self._emit(c)
+                self._expect_key[-1] = False
+            else:
+                # 数値・true・false・null
+                self._emit(c)
+
+    def close(self):
+        """
+        読み込みを完了し、除外後のJSONを返す
+
+        Returns:
+            dict: 除外フィールドを除いたレスポンス
+
+        Raises:
+            ValueError: JSONが途中で途切れている・不正な場合
+        """
+        if self._in_string or self._stack:
+            raise ValueError("JSONの読み込みが途中で終了しました")
+        data = json.loads(bytes(self._out))
+        self._out = bytearray()
+        return data
+
+
+def parse_detail_stream(chunks, exclude_fields, attachment_handler=None):
+    """
+    チャンクのイテレータから補助金詳細を読み込み、除外フィールドを読み飛ばす
+
+    Args:
+        chunks: バイト列のイテレータ（例: response.iter_content()）
+        exclude_fields (list): 除外するフィールド名のリスト
+        attachment_handler (optional): 添付ファイルを受け取るオブジェクト（DetailStreamFilter を参照）
+
+    Returns:
+        dict: 除外フィールドを除いたレスポンス
+    """
+    stream_filter = DetailStreamFilter(exclude_fields, attachment_handler)
+    for chunk in chunks:
+        if chunk:
+            stream_filter.feed(chunk)
+    return stream_filter.close()
@@ -0,0 +1,283 @@
+import os
+import re
+import json
+from html.parser import HTMLParser
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+from blob_codec import encode_subsidy, get_blob_encoding, load_subsidy_from_blob
+from metrics import get_metrics
+
+# 詳細の本文（detail のHTML）から抽出したテキストのBlobの接頭辞。Blob名は {補助金ID}.json
+TEXT_PREFIX = "_text/"
+
+# 抽出元の詳細データの内容のハッシュを記録するメタデータのキー
+SOURCE_HASH_METADATA_KEY = "source_sha256"
+
+# 抽出処理のバージョンを記録するメタデータのキー（抽出方法を変えた場合はバージョンを上げて再作成する）
+EXTRACTOR_VERSION_METADATA_KEY = "extractor_version"
+EXTRACTOR_VERSION = "1"
+
+# 改行として扱うタグ
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "table", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+    "section", "article", "blockquote", "pre", "hr", "dt", "dd",
+}
+
+# 内容を読み飛ばすタグ
+SKIP_TAGS = {"script", "style"}
+
+# 見出しの行（■目的・概要、【問合せ先】など）
+HEADING_PATTERN = re.compile(r'^(?:[■◆◇●□]\s*(?P<mark>.+)|【(?P<bracket>[^】]+)】\s*)$')
+
+# 見出しの文言から決める節のキー（上から順に判定し、最初に一致したもの）
+SECTION_KEYWORDS = (
+    ("contact", ("問合せ", "問い合わせ", "問合わせ", "連絡先")),
+    ("purpose", ("目的", "概要")),
+    ("expenses", ("対象経費",)),
+    ("amount", ("上限額", "補助率", "補助額", "助成額")),
+    ("eligibility", ("対象者", "対象事業者", "応募資格", "要件", "対象となる")),
+    ("area", ("地理条件", "対象地域")),
+    ("legal_basis", ("根拠法令",)),
+    ("references", ("参照URL", "URL", "関連リンク")),
+    ("notes", ("備考", "注意")),
+)
+
+
+def is_detail_text_enabled(enabled=None):
+    """
+    詳細の本文からテキストを抽出して保存するかどうか
+
+    Args:
+        enabled: 明示的な指定（Noneの場合は環境変数 DETAIL_TEXT_ENABLED、未設定なら保存しない）
+    """
+    if enabled is None:
+        return os.environ.get("DETAIL_TEXT_ENABLED", "0") == "1"
+    return bool(enabled)
+
+
+def text_blob_name(subsidy_id):
+    """抽出したテキストのBlob名"""
+    return f"{TEXT_PREFIX}{subsidy_id}.json"
+
+
+def section_key(heading):
+    """見出しの文言から節のキーを決める（該当しない場合はNone）"""
+    for key, keywords in SECTION_KEYWORDS:
+        if any(keyword in heading for keyword in keywords):
+            return key
+    return None
+
+
+class DetailTextParser(HTMLParser):
+    """
+    detail のHTMLを行のリストに変換するパーサ
+
+    ブロック要素と <br> を改行とし、行内の連続する空白は1つにまとめる。
+    リンクは本文に加えて links に (テキスト, URL) として記録する。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.links = []
+        self._current = []
+        self._skip_depth = 0
+        self._link = None
+
+    def _flush(self):
+        line = re.sub(r'\s+', ' ', "".join(self._current)).strip()
+        self._current = []
+        if line:
+            self.lines.append(line)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        elif tag == "a":
+            self._link = {"href": dict(attrs).get("href") or "", "text": []}
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        elif tag == "a" and self._link is not None:
+            text = re.sub(r'\s+', ' ', "".join(self._link["text"])).strip()
+            if self._link["href"]:
+                self.links.append({"text": text, "url": self._link["href"]})
+            self._link = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._current.append(data)
+        if self._link is not None:
+            self._link["text"].append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_detail_text(html):
+    """
+    detail のHTMLから本文のテキストと節ごとのテキストを抽出する
+
+    「■目的・概要」「【問合せ先】」のような見出しの行で節に分け、
+    見出しの文言から purpose・eligibility・contact などのキーを付ける（該当しない節のキーはNone）。
+
+    Args:
+        html (str): detail のHTML
+
+    Returns:
+        dict: text（本文、行は改行区切り）・sections（heading・key・text のリスト）・links（text・url のリスト）
+    """
+    parser = DetailTextParser()
+    parser.feed(html or "")
+    parser.close()
+
+    sections = []
+    current = None
+    for line in parser.lines:
+        m = HEADING_PATTERN.match(line)
+        if m:
+            heading = (m.group("mark") or m.group("bracket")).strip()
+            current = {"heading": heading, "key": section_key(heading), "lines": []}
+            sections.append(current)
+            continue
+        if current is None:
+            # 最初の見出しより前の本文
+            current = {"heading": "", "key": None, "lines": []}
+            sections.append(current)
+        current["lines"].append(line)
+
+    return {
+        "text": "\n".join(parser.lines),
+        "sections": [
+            {"heading": s["heading"], "key": s["key"], "text": "\n".join(s["lines"])}
+            for s in sections
+        ],
+        "links": parser.links,
+    }
+
+
+class DetailTextStore:
+    """
+    詳細の本文から抽出したテキストを _text/{補助金ID}.json に保存するストア
+
+    詳細データの内容のハッシュをメタデータに記録し、内容が変わった場合にのみ作成し直す。
+    保存は呼び出したスレッドで同期的に行う（詳細データのアップロード（AsyncBlobSink）とは別）。
+    """
+
+    def __init__(self, container_client):
+        """
+        Args:
+            container_client: ContainerClient（同期版）
+        """
+        self.container_client = container_client
+
+    def build(self, subsidy_id, detail_data, content_hash):
+        """
+        詳細データから保存する内容を作成する
+
+        Returns:
+            dict: id・source_sha256・extractor_version と extract_detail_text() の結果
+        """
+        result = (detail_data.get("result") or [{}])[0]
+        with get_metrics().stage("text_extract"):
+            extracted = extract_detail_text(result.get("detail"))
+        return dict({"id": subsidy_id, "source_sha256": content_hash, "extractor_version": EXTRACTOR_VERSION}, **extracted)
+
+    def save(self, subsidy_id, detail_data, content_hash):
+        """
+        詳細データから抽出したテキストを保存する（上書き）
+
+        Args:
+            subsidy_id (str): 補助金ID
+            detail_data (dict): 補助金詳細データ（APIレスポンス全体）
+            content_hash (str): 詳細データの内容のハッシュ（Noneの場合は詳細データから計算する）
+
+        Returns:
+            dict: 保存した内容
+        """
+        if content_hash is None:
+            content_hash = encode_subsidy(detail_data, get_blob_encoding())["hash"]
+        document = self.build(subsidy_id, detail_data, content_hash)
+        payload = json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        with get_metrics().stage("text_upload"):
+            self.container_client.get_blob_client(text_blob_name(subsidy_id)).upload_blob(
+                payload,
+                overwrite=True,
+                metadata={SOURCE_HASH_METADATA_KEY: content_hash, EXTRACTOR_VERSION_METADATA_KEY: EXTRACTOR_VERSION},
+                content_settings=ContentSettings(content_type="application/json; charset=utf-8"),
+            )
+        return document
+
+    def load(self, subsidy_id):
+        """保存したテキストを読み込む（存在しない場合はNone）"""
+        try:
+            payload = self.container_client.get_blob_client(text_blob_name(subsidy_id)).download_blob().readall()
+        except ResourceNotFoundError:
+            return None
+        return json.loads(payload)
+
+    def is_current(self, subsidy_id, content_hash):
+        """保存したテキストが、指定したハッシュの詳細データから現在の抽出方法で作成したものかどうか"""
+        try:
+            properties = self.container_client.get_blob_client(text_blob_name(subsidy_id)).get_blob_properties()
+        except ResourceNotFoundError:
+            return False
+        metadata = properties.metadata or {}
+        return (
+            metadata.get(SOURCE_HASH_METADATA_KEY) == content_hash
+            and metadata.get(EXTRACTOR_VERSION_METADATA_KEY) == EXTRACTOR_VERSION
+        )
+
+    def backfill(self, manifest):
+        """
+        マニフェストの全件について、テキストがない・古いものを保存済みの詳細データから作成する
+
+        テキストの保存を有効にする前に保存した補助金や、抽出方法を変えた場合に使う。
+        マニフェストにハッシュがない補助金は、保存済みの詳細データから計算したハッシュで確認する。
+
+        Args:
+            manifest: SubsidyManifest
+
+        Returns:
+            dict: 作成した件数（created）・作成済みの件数（current）・詳細データがなかった件数（missing）
+        """
+        counts = {"created": 0, "current": 0, "missing": 0}
+        for subsidy_id in sorted(manifest.ids()):
+            content_hash = (manifest.get(subsidy_id) or {}).get("hash")
+            if content_hash and self.is_current(subsidy_id, content_hash):
+                counts["current"] += 1
+                continue
+            try:
+                detail_data = load_subsidy_from_blob(self.container_client.get_blob_client(f"{subsidy_id}.json"))
+            except ResourceNotFoundError:
+                counts["missing"] += 1
+                continue
+            if not content_hash:
+                content_hash = encode_subsidy(detail_data, get_blob_encoding())["hash"]
+                if self.is_current(subsidy_id, content_hash):
+                    counts["current"] += 1
+                    continue
+            self.save(subsidy_id, detail_data, content_hash)
+            counts["created"] += 1
+        return counts
+
+
+if __name__ == "__main__":
+    # 保存済みの補助金のテキストを作成する（DETAIL_TEXT_ENABLED を有効にする前のデータなど）
+    from fetch_and_save_to_blob import get_blob_service_client, load_manifest
+
+    container_name = os.environ.get("BLOB_CONTAINER_NAME", "subsidies")
+    container_client = get_blob_service_client().get_container_client(container_name)
+    counts = DetailTextStore(container_client).backfill(load_manifest(container_client))
+    print(f"✅ テキストを作成しました: {counts['created']}件（作成済み: {counts['current']}件 / 詳細データなし: {counts['missing']}件）")
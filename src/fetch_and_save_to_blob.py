@@ -1,9 +1,25 @@
 import os
-import json
+import time
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from azure.storage.blob import BlobServiceClient
-from fetch_jgrants import fetch_subsidies_list
+from blob_codec import ENCODING_GZIP, encode_subsidy, get_blob_encoding
+from blob_sink import DEFAULT_UPLOAD_CONCURRENCY, AsyncBlobSink
+from fetch_jgrants import fetch_catalog
 from fetch_subsidy_detail import fetch_subsidy_detail
+from jgrants_client import get_default_client
+from rate_limiter import CircuitOpenError, DeadlineExceededError
+from snapshot import build_snapshot, is_snapshot_stale, load_lines
+from fetch_queue import enqueue_subsidies, get_queue_client
+from checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from attachments import ATTACHMENT_PREFIX, AttachmentStore, is_attachments_enabled
+from detail_text import TEXT_PREFIX, DetailTextStore, is_detail_text_enabled
+from text_index import is_text_index_enabled, update_text_index
+from metrics import get_metrics, profile_current_thread, reset_metrics, start_profiling, stop_profiling
+from manifest import SubsidyManifest, is_subsidy_blob_name, list_fingerprint
+from refresh_scheduler import RefreshScheduler, is_refresh_enabled, is_refresh_pending
 
 # ローカル環境の場合、local.envから環境変数を読み込む
 try:
@@ -19,88 +35,639 @@ except ImportError:
     pass
 
 
-def get_blob_service_client():
-    """Azure Blob Storageのクライアントを取得"""
+def get_connection_string():
+    """Azure Storageの接続文字列を取得"""
     connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
     if not connection_string:
         raise ValueError("環境変数 AZURE_STORAGE_CONNECTION_STRING が設定されていません")
-    return BlobServiceClient.from_connection_string(connection_string)
+    return connection_string
 
 
-def get_existing_subsidy_ids(blob_service_client, container_name):
+def get_blob_service_client():
+    """Azure Blob Storageのクライアントを取得"""
+    return BlobServiceClient.from_connection_string(get_connection_string())
+
+
+def create_blob_sink(container_name):
     """
-    Blobに既に保存されている補助金IDのセットを取得
+    非同期アップロード用のシンクを作成する
+    
+    同時実行数は環境変数 BLOB_UPLOAD_CONCURRENCY（未設定なら8）、
+    アップロード待ちキューの上限は BLOB_UPLOAD_QUEUE_SIZE（未設定なら同時実行数の2倍）で指定する
+    
+    Args:
+        container_name: コンテナ名
+    
+    Returns:
+        AsyncBlobSink: 未開始のシンク
+    """
+    return AsyncBlobSink(
+        get_connection_string(),
+        container_name,
+        concurrency=os.environ.get("BLOB_UPLOAD_CONCURRENCY", DEFAULT_UPLOAD_CONCURRENCY),
+        queue_size=os.environ.get("BLOB_UPLOAD_QUEUE_SIZE"),
+    )
+
+
+def ensure_container(blob_service_client, container_name):
+    """
+    コンテナを取得する（存在しない場合は作成）
     
     Args:
         blob_service_client: BlobServiceClient
         container_name: コンテナ名
     
     Returns:
-        set: 既存の補助金IDのセット
+        tuple: (ContainerClient, 新規作成したかどうか)
     """
     container_client = blob_service_client.get_container_client(container_name)
     
-    # コンテナが存在しない場合は作成
     try:
         container_client.get_container_properties()
     except Exception:
         container_client.create_container()
+        return container_client, True
+    
+    return container_client, False
+
+
+def get_existing_subsidy_ids(blob_service_client, container_name):
+    """
+    Blobに既に保存されている補助金IDのセットを取得（コンテナ全体を一覧取得する）
+    
+    通常の実行ではマニフェストを利用するため、修復・再構築時のみ使用する
+    
+    Args:
+        blob_service_client: BlobServiceClient
+        container_name: コンテナ名
+    
+    Returns:
+        set: 既存の補助金IDのセット
+    """
+    container_client, created = ensure_container(blob_service_client, container_name)
+    if created:
         return set()
     
-    # Blob一覧から補助金IDを抽出（ファイル名がID.jsonの形式を想定）
+    # Blob一覧から補助金IDを抽出（ファイル名がID.jsonの形式を想定、管理用Blobは除く）
     existing_ids = set()
     for blob in container_client.list_blobs():
         blob_name = blob.name
-        if blob_name.endswith('.json'):
+        if is_subsidy_blob_name(blob_name):
             subsidy_id = blob_name[:-5]  # .jsonを除去
             existing_ids.add(subsidy_id)
     
     return existing_ids
 
 
-def save_subsidy_to_blob(blob_service_client, container_name, subsidy_id, detail_data):
+def load_manifest(container_client, rebuild=False):
     """
-    補助金詳細データをBlobに保存
-    ※不要フィールドはfetch_subsidy_detail関数側で既に除外済み
+    マニフェストを読み込む
+    
+    マニフェストが存在しない場合、またはrebuild=Trueの場合は
+    コンテナ全体の一覧からマニフェストを再構築する
+    
+    Args:
+        container_client: ContainerClient
+        rebuild: Trueの場合、一覧取得による再構築を強制する
+    
+    Returns:
+        SubsidyManifest: マニフェスト
+    """
+    manifest = SubsidyManifest.load(container_client)
+    if manifest is not None and not rebuild:
+        return manifest
+    
+    if manifest is None:
+        print("マニフェストが存在しないため、Blob一覧から作成します")
+    else:
+        print("Blob一覧からマニフェストを再構築します")
+    return SubsidyManifest.rebuild_from_listing(container_client, previous=manifest)
+
+
+def get_updated_date(subsidy, detail_data=None):
+    """
+    取得元の updated_date を取得する（一覧・詳細のどちらにもない場合はNone）
+    
+    Args:
+        subsidy: 補助金一覧の1件分のデータ
+        detail_data: 補助金詳細データ
+    
+    Returns:
+        str: updated_date
+    """
+    if subsidy.get("updated_date"):
+        return subsidy["updated_date"]
+    if detail_data and detail_data.get("result"):
+        return detail_data["result"][0].get("updated_date")
+    return None
+
+
+# 詳細取得・保存の同時実行数のデフォルト値
+DEFAULT_MAX_WORKERS = 8
+
+# 並列実行時に1件分のログが混ざらないようにするためのロック
+_print_lock = threading.Lock()
+
+
+def get_max_workers(max_workers=None):
+    """
+    詳細取得・保存の同時実行数を決定する
+
+    Args:
+        max_workers: 明示的に指定された同時実行数（Noneの場合は環境変数を参照）
+
+    Returns:
+        int: 同時実行数（1以上）
+    """
+    if max_workers is None:
+        max_workers = os.environ.get("FETCH_MAX_WORKERS", DEFAULT_MAX_WORKERS)
+    try:
+        max_workers = int(max_workers)
+    except (TypeError, ValueError):
+        raise ValueError(f"同時実行数が不正です: {max_workers}")
+    return max(1, max_workers)
+
+
+# 時間制限のうち、残りのアップロード・マニフェスト・スナップショットの書き込みのために残す時間（秒）
+FINALIZE_RESERVE_SECONDS = 60
+
+
+def get_deadline(started, time_budget_seconds=None):
+    """
+    新しい補助金の処理を開始しない期限を決定する
+
+    Args:
+        started: 実行開始時刻（time.monotonic()）
+        time_budget_seconds: 実行全体の時間制限（秒）
+            （Noneの場合は環境変数 SYNC_TIME_BUDGET_SECONDS、未設定または0なら制限なし）
+
+    Returns:
+        float: 期限（time.monotonic()基準）。制限なしの場合はNone
+    """
+    if time_budget_seconds is None:
+        time_budget_seconds = os.environ.get("SYNC_TIME_BUDGET_SECONDS") or 0
+    try:
+        time_budget_seconds = float(time_budget_seconds)
+    except (TypeError, ValueError):
+        raise ValueError(f"時間制限が不正です: {time_budget_seconds}")
+    if time_budget_seconds <= 0:
+        return None
+    # 時間制限が短い場合でも、半分以上は詳細取得に使う
+    reserve = min(FINALIZE_RESERVE_SECONDS, time_budget_seconds / 2)
+    return started + time_budget_seconds - reserve
+
+
+def prioritize_checkpoint(target_subsidies, checkpoint):
+    """
+    前回時間切れで処理できなかった補助金を先頭に並べ替える（それ以外の順序は維持）
+
+    Args:
+        target_subsidies: 処理対象の補助金一覧
+        checkpoint: 前回のチェックポイント（Noneの場合は並べ替えない）
+
+    Returns:
+        list: 並べ替えた補助金一覧
+    """
+    if not checkpoint:
+        return target_subsidies
+    remaining_ids = set(checkpoint.get("remaining_ids", []))
+    return sorted(target_subsidies, key=lambda s: s.get("id") not in remaining_ids)
+
+
+def process_subsidy(sink, manifest, subsidy, idx, total, encoding, deadline=None, attachment_store=None,
+                    text_store=None):
+    """
+    1件の補助金について詳細を取得し、Blobへのアップロードをシンクに積む
+
+    内容が前回保存時と同じ場合はアップロードせず、その場でマニフェストを更新する。
+    期限を過ぎてから処理の順番が来た場合、送信レートの制限・再試行の待ち時間が期限を超える場合、
+    APIの障害を検知してリクエストを停止している場合は、何もせずに次回へ持ち越す。
+    並列実行されるため、ログは1件分をまとめて出力する
+
+    Args:
+        sink: AsyncBlobSink
+        manifest: SubsidyManifest
+        subsidy: 補助金一覧の1件分のデータ
+        idx: 処理番号（1始まり）
+        total: 処理対象の総件数
+        encoding: 保存形式
+        deadline: 新しい処理を開始しない期限（time.monotonic()基準、Noneの場合は制限なし）
+        attachment_store: 添付ファイルの保存先（AttachmentStore、Noneの場合は保存しない）
+        text_store: 本文から抽出したテキストの保存先（DetailTextStore、Noneの場合は保存しない）
+
+    Returns:
+        str: 処理結果（"queued"・"unchanged"・"failed"・"deferred"）
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        return "deferred"
+
+    subsidy_id = subsidy.get("id")
+    title = subsidy.get("title") or "不明"
+    lines = [
+        f"\n[{idx}/{total}] 処理中: {subsidy_id}",
+        f"  タイトル: {title[:50]}...",
+    ]
+    metrics = get_metrics()
+
+    try:
+        # 詳細情報を取得（不要フィールドは自動除外）
+        with metrics.item():
+            try:
+                detail_data = fetch_subsidy_detail(subsidy_id, attachment_store=attachment_store, deadline=deadline)
+            except CircuitOpenError:
+                lines.append(f"  ⏸️  APIの障害を検知したため次回に持ち越し")
+                return "deferred"
+            except DeadlineExceededError:
+                lines.append(f"  ⏸️  期限までに取得できないため次回に持ち越し")
+                return "deferred"
+
+        if not detail_data:
+            lines.append(f"  ❌ 詳細情報の取得に失敗")
+            return "failed"
+
+        # 保存形式にエンコード（シリアライズは1回のみ）し、データサイズを確認
+        with metrics.stage("serialize"):
+            encoded = encode_subsidy(detail_data, encoding)
+        payload = encoded["payload"]
+        content_hash = encoded["hash"]
+        size_kb = encoded["raw_size"] / 1024
+        if encoding == ENCODING_GZIP:
+            lines.append(f"  データサイズ: {size_kb:.2f} KB（圧縮後: {len(payload) / 1024:.2f} KB）")
+        else:
+            lines.append(f"  データサイズ: {size_kb:.2f} KB")
+
+        # 除外フィールドの確認
+        if 'result' in detail_data and len(detail_data['result']) > 0:
+            result = detail_data['result'][0]
+            excluded_fields = ['application_guidelines', 'outline_of_grant', 'application_form']
+            has_excluded = any(field in result for field in excluded_fields)
+            if has_excluded:
+                lines.append(f"  ⚠️  警告: 除外すべきフィールドが含まれています")
+            else:
+                lines.append(f"  ✅ 不要フィールドは除外済み")
+
+        # 内容が前回保存時と同じ場合はアップロードしない
+        previous = manifest.get(subsidy_id)
+        updated_date = get_updated_date(subsidy, detail_data)
+        if previous and previous.get("hash") == content_hash:
+            lines.append(f"  ➖ 内容に変更がないため保存をスキップ")
+            manifest.update(
+                subsidy_id,
+                content_hash,
+                updated_date=updated_date,
+                fingerprint=list_fingerprint(subsidy),
+                etag=previous.get("etag"),
+            )
+            return "unchanged"
+        
+        # 内容が変わった場合のみ、本文（detail のHTML）からテキストを抽出して保存
+        if text_store is not None:
+            try:
+                text_store.save(subsidy_id, detail_data, content_hash)
+                lines.append(f"  📝 本文のテキストを保存")
+            except Exception as e:
+                lines.append(f"  ⚠️  本文のテキストを保存できませんでした: {e}")
+        
+        # Blobへのアップロードをキューに積む（結果は sink.close() でまとめて受け取る）
+        sink.submit(
+            subsidy_id, payload, content_hash,
+            previous=previous,
+            context=(subsidy, updated_date, encoded["json"]),
+            content_settings=encoded["content_settings"],
+        )
+        lines.append(f"  ⏫ アップロード待ちに追加")
+        return "queued"
+    finally:
+        with _print_lock:
+            print("\n".join(lines))
+
+
+def sync_subsidies(container_name, manifest, target_subsidies, max_workers, encoding, deadline=None):
+    """
+    対象の補助金の詳細を取得（最大 max_workers 件を並列実行）し、
+    取得できたものから順にBlobへ非同期でアップロードして、マニフェストを更新する
+    
+    マニフェストのBlobへの書き込みは呼び出し側で行う。
     
     Args:
-        blob_service_client: BlobServiceClient
         container_name: コンテナ名
-        subsidy_id: 補助金ID
-        detail_data: 補助金詳細データ（除外済み）
+        manifest: SubsidyManifest
+        target_subsidies: 処理対象の補助金一覧
+        max_workers: 詳細取得の同時実行数
+        encoding: 保存形式
+        deadline: 新しい処理を開始しない期限（time.monotonic()基準、Noneの場合は制限なし）
+    
+    Returns:
+        dict: 処理結果
+            - saved: 保存した件数
+            - unchanged: 内容に変更がなかった件数
+            - failed_ids: 取得・保存に失敗した補助金ID
+            - deferred_ids: 期限を過ぎた・APIの障害を検知したため処理しなかった補助金ID
+            - changed_lines: 補助金IDをキーとする、保存した内容（空白なしのJSON）
     """
-    blob_client = blob_service_client.get_blob_client(
-        container=container_name,
-        blob=f"{subsidy_id}.json"
-    )
+    sink = create_blob_sink(container_name)
+    print(f"同時実行数: 詳細取得 {max_workers} / アップロード {sink.concurrency}")
+    print(f"保存形式: {encoding}")
+    # 添付ファイルは詳細取得のスレッドから同期版のクライアントで保存する
+    attachment_store = None
+    if is_attachments_enabled():
+        attachment_store = AttachmentStore(get_blob_service_client().get_container_client(container_name))
+        print(f"添付ファイル: {ATTACHMENT_PREFIX} に保存")
+    # 本文から抽出したテキストも同様に、詳細取得のスレッドから保存する
+    text_store = None
+    if is_detail_text_enabled():
+        text_store = DetailTextStore(get_blob_service_client().get_container_client(container_name))
+        print(f"本文のテキスト: {TEXT_PREFIX} に保存")
+    saved_count = 0
+    unchanged_count = 0
+    failed_ids = []
+    deferred_ids = []
+    changed_lines = {}
+    total = len(target_subsidies)
+    
+    sink.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=profile_current_thread) as executor:
+            futures = {
+                executor.submit(
+                    process_subsidy, sink, manifest, subsidy, idx, total, encoding, deadline, attachment_store,
+                    text_store
+                ): subsidy.get("id")
+                for idx, subsidy in enumerate(target_subsidies, 1)
+            }
+            for future in as_completed(futures):
+                try:
+                    status = future.result()
+                except Exception as e:
+                    with _print_lock:
+                        print(f"  ❌ 予期しないエラー: {e}")
+                    status = "failed"
+                if status == "unchanged":
+                    unchanged_count += 1
+                elif status == "failed":
+                    failed_ids.append(futures[future])
+                elif status == "deferred":
+                    deferred_ids.append(futures[future])
+    finally:
+        # 残りのアップロードを完了させ、1件ごとの結果を受け取る
+        upload_results = sink.close()
+    
+    for subsidy_id, (subsidy, updated_date, json_line), result in upload_results:
+        if isinstance(result, Exception):
+            print(f"  ❌ 保存エラー ({subsidy_id}): {result}")
+            failed_ids.append(subsidy_id)
+            continue
+        
+        manifest.update(
+            subsidy_id,
+            result["hash"],
+            updated_date=updated_date,
+            fingerprint=list_fingerprint(subsidy),
+            etag=result["etag"],
+        )
+        if result["status"] == "unchanged":
+            unchanged_count += 1
+        else:
+            saved_count += 1
+            changed_lines[subsidy_id] = json_line
+    print(f"\nBlobへのアップロード完了: {len(upload_results)}件")
+    
+    return {
+        "saved": saved_count,
+        "unchanged": unchanged_count,
+        "failed_ids": failed_ids,
+        "deferred_ids": deferred_ids,
+        "changed_lines": changed_lines,
+    }
+
+
+def finalize_run(container_client, manifest, changed_lines, snapshot_enabled, deltas=None):
+    """
+    マニフェストを書き込み、全文検索の索引と、必要に応じてスナップショットを更新する
     
-    json_data = json.dumps(detail_data, ensure_ascii=False, indent=2)
-    blob_client.upload_blob(json_data, overwrite=True)
+    キュートリガーの関数が保存した分（マニフェストの差分）も、この実行で保存した分と同じように反映する。
+    
+    Args:
+        container_client: ContainerClient
+        manifest: SubsidyManifest
+        changed_lines: 補助金IDをキーとする、この実行で保存した内容
+        snapshot_enabled: スナップショットを作成するかどうか
+        deltas: manifest.apply_deltas() の結果（マニフェストに書き込んだ後に差分のBlobを削除する）
+    """
+    metrics = get_metrics()
+    if deltas and deltas["changed_ids"]:
+        # キュートリガーの関数が保存した補助金の内容を個別のBlobから読み込む
+        changed_ids = (deltas["changed_ids"] & manifest.ids()) - set(changed_lines)
+        changed_lines = dict(changed_lines, **load_lines(container_client, changed_ids))
+    
+    # マニフェストを書き込む（ETag条件付き）
+    if manifest.dirty:
+        with metrics.stage("manifest_save"):
+            manifest.save(container_client)
+        print(f"マニフェストを更新しました: {len(manifest.ids())}件")
+    if deltas and deltas["names"]:
+        SubsidyManifest.delete_deltas(container_client, deltas["names"])
+    
+    # 全文検索の索引に、この実行で保存した補助金を反映する
+    # （検索APIはスナップショットが変わったときに索引を読み直すため、スナップショットより先に更新する）
+    if is_text_index_enabled():
+        try:
+            update_text_index(container_client, manifest, changed_lines)
+        except Exception as e:
+            print(f"⚠️  全文検索の索引を更新できませんでした: {e}")
+    
+    # 全件をまとめたスナップショットを更新
+    if snapshot_enabled:
+        if is_snapshot_stale(container_client, manifest, changed_lines):
+            with metrics.stage("snapshot"):
+                build_snapshot(container_client, manifest, changed_lines)
+        else:
+            print("スナップショットに変更はありません")
+
+
+# 実行モード
+# - inline: この実行の中で詳細の取得・保存まで行う
+# - queue: 対象の補助金をキューに追加し、詳細の取得・保存はキュートリガーの関数に任せる
+SYNC_MODE_INLINE = "inline"
+SYNC_MODE_QUEUE = "queue"
+SYNC_MODES = (SYNC_MODE_INLINE, SYNC_MODE_QUEUE)
 
 
-def main(max_items=None):
+def get_sync_mode(sync_mode=None):
+    """
+    実行モードを決定する
+
+    Args:
+        sync_mode: 明示的に指定された実行モード（Noneの場合は環境変数 SYNC_MODE、未設定なら "inline"）
+
+    Returns:
+        str: 実行モード（"inline" または "queue"）
+    """
+    if sync_mode is None:
+        sync_mode = os.environ.get("SYNC_MODE", SYNC_MODE_INLINE)
+    sync_mode = sync_mode.lower()
+    if sync_mode not in SYNC_MODES:
+        raise ValueError(f"実行モードが不正です: {sync_mode}（{', '.join(SYNC_MODES)} のいずれか）")
+    return sync_mode
+
+
+def enqueue_targets(container_client, manifest, target_subsidies, snapshot_enabled, deltas=None):
+    """
+    キューモードの実行: 対象の補助金をバッチに分けて詳細取得キューに追加する
+
+    マニフェスト・全文検索の索引・スナップショットは、前回の実行以降にキュートリガーの関数が保存した分
+    （マニフェストの差分）を反映して更新する（この実行でキューに追加した分は次回の実行で反映される）。
+
+    Args:
+        container_client: ContainerClient
+        manifest: SubsidyManifest
+        target_subsidies: 詳細を取得する補助金一覧
+        snapshot_enabled: スナップショットを作成するかどうか
+        deltas: manifest.apply_deltas() の結果
+
+    Returns:
+        int: 追加したメッセージ数
+    """
+    finalize_run(container_client, manifest, {}, snapshot_enabled, deltas)
+
+    if not target_subsidies:
+        return 0
+    queue_client = get_queue_client(get_connection_string())
+    return enqueue_subsidies(queue_client, target_subsidies)
+
+
+def process_queue_batch(subsidies, max_workers=None):
+    """
+    詳細取得キューの1メッセージ分の補助金を処理する（キュートリガーの関数から呼び出す）
+
+    同じメッセージが再配信されても結果が変わらないよう、
+    マニフェスト上で既に同じ一覧の内容（フィンガープリント）で取得済みの補助金は処理しない
+    （再取得の対象は、再取得を決めた日時より後に取得済みの場合に処理しない）。
+    保存時は内容のハッシュとETagで判定するため、同じ内容を二重に書き込むことはない。
+    マニフェスト本体は書き換えず、更新したエントリを差分のBlobに書き込む（タイマー実行時にまとめて反映する）。
+
+    Args:
+        subsidies: メッセージに含まれる補助金一覧の一部
+        max_workers: 詳細取得の同時実行数
+
+    Returns:
+        dict: sync_subsidies と同じ処理結果（skipped: 取得済みのため処理しなかった件数 を追加）
+    """
+    container_name = os.environ.get("BLOB_CONTAINER_NAME", "subsidies")
+    max_workers = get_max_workers(max_workers)
+    encoding = get_blob_encoding()
+
+    blob_service_client = get_blob_service_client()
+    container_client, _ = ensure_container(blob_service_client, container_name)
+    manifest = load_manifest(container_client)
+    # 他のメッセージの処理で保存した、まだマニフェスト本体に反映していない分も取得済みとして扱う
+    manifest.apply_deltas(container_client, record=False)
+
+    target_subsidies = [
+        s for s in subsidies
+        if manifest.is_changed(s) or is_refresh_pending(s, manifest.get(s.get("id")))
+    ]
+    skipped = len(subsidies) - len(target_subsidies)
+    if skipped:
+        print(f"取得済みのためスキップ: {skipped}件")
+
+    result = {"saved": 0, "unchanged": 0, "failed_ids": [], "deferred_ids": [], "changed_lines": {}}
+    if target_subsidies:
+        result = sync_subsidies(container_name, manifest, target_subsidies, max_workers, encoding)
+    if manifest.dirty:
+        manifest.save_delta(container_client, result["changed_lines"])
+    result["skipped"] = skipped
+    return result
+
+
+def main(max_items=None, max_workers=None, rebuild_manifest=None, snapshot_enabled=None, time_budget_seconds=None,
+         sync_mode=None):
     """
     メイン処理
     
+    時間制限を指定した場合は、期限が近づいた時点で新しい補助金の処理を開始せずに終了し、
+    残りの補助金IDと件数をチェックポイント（_checkpoint.json）に保存する。
+    次回の実行ではチェックポイントの補助金を優先して処理し、件数を累計する。
+    
+    キューモードでは、対象の補助金をキューに追加して終了する（詳細の取得・保存はキュートリガーの関数で行う）。
+    
+    終了時に段階ごと（一覧取得・コンテナの確認・詳細取得・解析・シリアライズ・アップロードなど）の
+    処理時間と転送バイト数を logging で出力する。
+    環境変数 METRICS_TRACEMALLOC=1 の場合は1件ごとのメモリ使用量のピークを、
+    PROFILE_OUTPUT を指定した場合は cProfile の結果をそのファイルに保存する。
+    
     Args:
         max_items: 処理する最大件数（Noneの場合は全件処理）
+        max_workers: 詳細取得・保存の同時実行数
+            （Noneの場合は環境変数 FETCH_MAX_WORKERS、未設定なら8）
+        rebuild_manifest: Trueの場合、Blob一覧からマニフェストを再構築する（修復用）
+            （Noneの場合は環境変数 MANIFEST_REBUILD を参照）
+        snapshot_enabled: 全件をまとめたスナップショット（NDJSON.gz）を作成するかどうか
+            （Noneの場合は環境変数 SNAPSHOT_ENABLED、未設定なら作成する）
+        time_budget_seconds: 実行全体の時間制限（秒）
+            （Noneの場合は環境変数 SYNC_TIME_BUDGET_SECONDS、未設定なら制限なし）
+        sync_mode: 実行モード（"inline" または "queue"）
+            （Noneの場合は環境変数 SYNC_MODE、未設定なら "inline"）
     """
+    # 段階ごとの計測値を初期化し、必要に応じてメモリの追跡・プロファイルを開始する
+    metrics = reset_metrics()
+    if metrics.trace_memory:
+        tracemalloc.start()
+    start_profiling()
+    try:
+        _run(max_items, max_workers, rebuild_manifest, snapshot_enabled, time_budget_seconds, sync_mode)
+    finally:
+        stop_profiling()
+        metrics.emit()
+        if metrics.trace_memory:
+            tracemalloc.stop()
+
+
+def _run(max_items, max_workers, rebuild_manifest, snapshot_enabled, time_budget_seconds, sync_mode):
+    """main() の本体（引数は main() と同じ）"""
+    started = time.monotonic()
+    
     # 環境変数から設定を取得
     container_name = os.environ.get("BLOB_CONTAINER_NAME", "subsidies")
+    max_workers = get_max_workers(max_workers)
+    encoding = get_blob_encoding()
+    deadline = get_deadline(started, time_budget_seconds)
+    sync_mode = get_sync_mode(sync_mode)
+    if rebuild_manifest is None:
+        rebuild_manifest = os.environ.get("MANIFEST_REBUILD", "0") == "1"
+    if snapshot_enabled is None:
+        snapshot_enabled = os.environ.get("SNAPSHOT_ENABLED", "1") == "1"
     
     print("補助金データ取得・保存処理を開始します")
     if max_items:
         print(f"（テストモード: 最大 {max_items} 件まで処理）")
+    if sync_mode == SYNC_MODE_QUEUE:
+        print("（キューモード: 詳細の取得・保存はキュートリガーで行います）")
+    elif deadline is not None:
+        print(f"時間制限: 開始から {deadline - started:.0f} 秒後以降は新しい補助金の処理を開始しません")
     
     # 1. Blob Storageクライアントを取得
     blob_service_client = get_blob_service_client()
     
-    # 2. 既存の補助金IDを取得
-    existing_ids = get_existing_subsidy_ids(blob_service_client, container_name)
+    # 2. マニフェストから既存の補助金IDを取得し、前回のチェックポイントを読み込む
+    metrics = get_metrics()
+    with metrics.stage("container_scan"):
+        container_client, _ = ensure_container(blob_service_client, container_name)
+        manifest = load_manifest(container_client, rebuild=rebuild_manifest)
+        # キュートリガーの関数が保存した分（マニフェストの差分）を反映する
+        deltas = manifest.apply_deltas(container_client)
+        checkpoint = load_checkpoint(container_client)
+    existing_ids = manifest.ids()
     print(f"既存の補助金データ: {len(existing_ids)}件")
+    if deltas["names"]:
+        print(f"キューで保存した分を反映: {len(deltas['names'])}件の差分（保存: {len(deltas['changed_ids'])}件）")
+    if checkpoint:
+        print(f"前回の実行から持ち越した補助金: {len(checkpoint.get('remaining_ids', []))}件"
+              f"（{checkpoint.get('created_at')} 時点）")
     
     # 3. 補助金一覧を取得
-    subsidies_data = fetch_subsidies_list()
+    with metrics.stage("list_fetch"):
+        subsidies_data = fetch_catalog(deadline=deadline)
     if not subsidies_data:
         print("補助金一覧の取得に失敗しました")
         return
@@ -108,70 +675,108 @@ def main(max_items=None):
     subsidies = subsidies_data.get("result", [])
     print(f"API取得件数: {len(subsidies)}件")
     
-    # 4. 新規の補助金のみをフィルタリング
+    # Blob一覧から再構築したエントリは、保存済みの内容に対応するフィンガープリントとして一覧の値を記録する
+    filled_count = manifest.fill_missing_fingerprints(subsidies)
+    if filled_count:
+        print(f"フィンガープリントを一覧から補完: {filled_count}件")
+    
+    # 4. 新規の補助金と、一覧の内容（受付期間・上限額など）が変わった補助金をフィルタリング
     new_subsidies = [s for s in subsidies if s.get("id") not in existing_ids]
+    changed_subsidies = [
+        s for s in subsidies
+        if s.get("id") in existing_ids and manifest.is_changed(s)
+    ]
+    target_subsidies = prioritize_checkpoint(new_subsidies + changed_subsidies, checkpoint)
     
-    if len(new_subsidies) == 0:
-        print("新規の補助金はありません")
+    # 受付状況ごとの間隔を過ぎた保存済みの補助金を再取得の対象に加え、1回の実行での取得件数の上限を適用
+    refresh_count = 0
+    if is_refresh_enabled():
+        plan = RefreshScheduler().plan(target_subsidies, subsidies, manifest)
+        target_subsidies = plan["targets"]
+        refresh_count = plan["refresh"]
+        if plan["due"] or plan["postponed"]:
+            tiers = "・".join(f"{tier} {count}件" for tier, count in plan["tiers"].items())
+            print(f"再取得の対象: {refresh_count}件（{tiers or 'なし'}）"
+                  f" / 時期を過ぎたもの: {plan['due']}件 / 上限により次回以降: {plan['postponed']}件")
+    
+    if sync_mode == SYNC_MODE_QUEUE:
+        if max_items and len(target_subsidies) > max_items:
+            target_subsidies = target_subsidies[:max_items]
+        message_count = enqueue_targets(container_client, manifest, target_subsidies, snapshot_enabled, deltas)
+        if checkpoint:
+            # 持ち越した補助金もキューに追加したため、チェックポイントは不要
+            clear_checkpoint(container_client)
+        print(f"\n{'='*60}")
+        print(f"キューへの追加完了")
+        print(f"   新規補助金: {len(new_subsidies)}件")
+        print(f"   更新対象: {len(changed_subsidies)}件")
+        print(f"   再取得: {refresh_count}件")
+        print(f"   キューに追加: {len(target_subsidies)}件（{message_count}メッセージ）")
+        print(f"{'='*60}")
+        return
+    
+    if len(target_subsidies) == 0:
+        print("新規・更新対象の補助金はありません")
+        finalize_run(container_client, manifest, {}, snapshot_enabled, deltas)
+        if checkpoint:
+            clear_checkpoint(container_client)
         return
     
     print(f"新規補助金: {len(new_subsidies)}件")
+    print(f"更新対象: {len(changed_subsidies)}件")
+    print(f"再取得: {refresh_count}件")
     
     # テストモードの場合は件数を制限
-    if max_items and len(new_subsidies) > max_items:
-        new_subsidies = new_subsidies[:max_items]
+    if max_items and len(target_subsidies) > max_items:
+        target_subsidies = target_subsidies[:max_items]
         print(f"テストのため {max_items} 件のみ処理します")
     
-    # 5. 各補助金の詳細を取得してBlobに保存
-    saved_count = 0
-    failed_count = 0
+    # 5. 対象の補助金の詳細を取得し、Blobへ非同期でアップロードする
+    result = sync_subsidies(container_name, manifest, target_subsidies, max_workers, encoding, deadline)
+    saved_count = result["saved"]
+    unchanged_count = result["unchanged"]
+    failed_count = len(result["failed_ids"])
+    deferred_ids = result["deferred_ids"]
+    changed_lines = result["changed_lines"]
     
-    for idx, subsidy in enumerate(new_subsidies, 1):
-        subsidy_id = subsidy.get("id")
-        title = subsidy.get("title", "不明")
-        
-        print(f"\n[{idx}/{len(new_subsidies)}] 処理中: {subsidy_id}")
-        print(f"  タイトル: {title[:50]}...")
-        
-        # 詳細情報を取得（不要フィールドは自動除外）
-        detail_data = fetch_subsidy_detail(subsidy_id)
-        
-        if not detail_data:
-            print(f"  ❌ 詳細情報の取得に失敗")
-            failed_count += 1
-            continue
-        
-        # データサイズを確認
-        json_str = json.dumps(detail_data, ensure_ascii=False)
-        size_kb = len(json_str.encode('utf-8')) / 1024
-        print(f"  データサイズ: {size_kb:.2f} KB")
-        
-        # 除外フィールドの確認
-        if 'result' in detail_data and len(detail_data['result']) > 0:
-            result = detail_data['result'][0]
-            excluded_fields = ['application_guidelines', 'outline_of_grant', 'application_form']
-            has_excluded = any(field in result for field in excluded_fields)
-            if has_excluded:
-                print(f"  ⚠️  警告: 除外すべきフィールドが含まれています")
-            else:
-                print(f"  ✅ 不要フィールドは除外済み")
-        
-        # Blobに保存
-        try:
-            save_subsidy_to_blob(blob_service_client, container_name, subsidy_id, detail_data)
-            print(f"  ✅ Blobに保存完了")
-            saved_count += 1
-        except Exception as e:
-            print(f"  ❌ 保存エラー: {e}")
-            failed_count += 1
+    # 6. マニフェストを書き込み、スナップショットを更新
+    finalize_run(container_client, manifest, changed_lines, snapshot_enabled, deltas)
+    
+    # 7. 時間切れで処理できなかった補助金をチェックポイントに保存（すべて処理できた場合は削除）
+    counters = {"saved": saved_count, "unchanged": unchanged_count, "failed": failed_count}
+    if deferred_ids:
+        # 一覧の順序（チェックポイント優先）を維持して保存する
+        deferred = set(deferred_ids)
+        remaining_ids = [s.get("id") for s in target_subsidies if s.get("id") in deferred]
+        cumulative = save_checkpoint(container_client, remaining_ids, counters, previous=checkpoint)["counters"]
+    else:
+        cumulative = {
+            key: (checkpoint or {}).get("counters", {}).get(key, 0) + value
+            for key, value in counters.items()
+        }
+        if checkpoint:
+            clear_checkpoint(container_client)
     
-    # 6. 結果サマリー
+    # 8. 結果サマリー
     print(f"\n{'='*60}")
-    print(f"処理完了")
+    circuit_open = get_default_client().is_circuit_open
+    if not deferred_ids:
+        print(f"処理完了")
+    else:
+        print(f"APIの障害により中断" if circuit_open else f"時間制限により中断")
     print(f"   新規補助金: {len(new_subsidies)}件")
+    print(f"   更新対象: {len(changed_subsidies)}件")
+    print(f"   再取得: {refresh_count}件")
     print(f"   保存成功: {saved_count}件")
+    print(f"   変更なし: {unchanged_count}件")
     if failed_count > 0:
         print(f"   失敗: {failed_count}件")
+    if deferred_ids:
+        print(f"   ⏸️  次回に持ち越し: {len(deferred_ids)}件")
+    if checkpoint:
+        print(f"   （前回からの累計: 保存成功 {cumulative['saved']}件 / "
+              f"変更なし {cumulative['unchanged']}件 / 失敗 {cumulative['failed']}件）")
+    print(f"   経過時間: {time.monotonic() - started:.1f}秒")
     print(f"{'='*60}")
 
 
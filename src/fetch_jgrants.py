@@ -1,40 +1,191 @@
+import os
+import json
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from jgrants_client import get_default_client
+from metrics import get_metrics
 
-def fetch_subsidies_list(params=None):
+# 一覧取得のデフォルトパラメータ
+DEFAULT_LIST_PARAMS = {
+    "keyword": "補助金",
+    "sort": "created_date",
+    "order": "DESC",
+    "acceptance": "0"  # 1: 受付中, 0: すべて
+}
+
+# 分割した一覧取得の同時実行数（省略時）
+DEFAULT_LIST_MAX_WORKERS = 4
+
+def fetch_subsidies_list(params=None, client=None, deadline=None):
     """
     J-Grants APIから補助金の一覧を取得する
     
     Args:
         params (dict, optional): APIリクエストパラメータ
             デフォルトは受付中の補助金を新しい順で取得
+        client (JGrantsClient, optional): 利用するAPIクライアント
+            （Noneの場合は共有クライアントを利用）
+        deadline (float, optional): 期限（time.monotonic()基準）。再試行で期限を超えて待たない
     
     Returns:
         dict: APIレスポンス全体（取得失敗時はNone）
     """
-    url = "https://api.jgrants-portal.go.jp/exp/v1/public/subsidies"
-    headers = {"Accept": "application/json"}
+    if client is None:
+        client = get_default_client()
     
     # デフォルトパラメータ
     if params is None:
-        params = {
-            "keyword": "補助金",
-            "sort": "created_date",
-            "order": "DESC",
-            "acceptance": "0"  # 1: 受付中, 0: すべて
-        }
+        params = dict(DEFAULT_LIST_PARAMS)
     
     try:
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return client.list_subsidies(params=params, deadline=deadline)
     except requests.exceptions.RequestException as e:
         print(f"API取得エラー: {e}")
         return None
 
 
+def get_list_partitions(partitions=None):
+    """
+    一覧取得の分割条件を決定する
+
+    環境変数 LIST_PARTITIONS にはJSONの配列を指定する。
+    各要素はデフォルトのパラメータに上書きする条件（例: {"keyword": "助成金"}、
+    {"target_area_search": "東京都"}）で、"name" を指定するとカバー率の表示に使う。
+    文字列の要素はキーワードとして扱う（例: ["補助金", "助成金", "支援金"]）。
+
+    Args:
+        partitions (list, optional): 明示的に指定された分割条件（Noneの場合は環境変数を参照）
+
+    Returns:
+        list: 分割条件（name・params を持つ辞書）のリスト（分割しない場合はNone）
+    """
+    if partitions is None:
+        value = os.environ.get("LIST_PARTITIONS")
+        if not value:
+            return None
+        try:
+            partitions = json.loads(value)
+        except ValueError:
+            raise ValueError(f"LIST_PARTITIONS がJSONとして不正です: {value}")
+    if not isinstance(partitions, list) or not partitions:
+        raise ValueError(f"分割条件はJSONの配列で指定してください: {partitions}")
+
+    normalized = []
+    for partition in partitions:
+        if isinstance(partition, str):
+            partition = {"keyword": partition}
+        if not isinstance(partition, dict):
+            raise ValueError(f"分割条件が不正です: {partition}")
+        overrides = {k: str(v) for k, v in partition.items() if k != "name"}
+        params = dict(DEFAULT_LIST_PARAMS, **overrides)
+        name = partition.get("name") or ",".join(f"{k}={v}" for k, v in overrides.items())
+        normalized.append({"name": name, "params": params})
+    return normalized
+
+
+def harvest_subsidies_list(partitions, max_workers=None, client=None, deadline=None):
+    """
+    分割した条件で補助金の一覧を並列に取得し、IDで重複を除いてまとめる
+
+    1回の検索（keyword=補助金）では、キーワードに一致しない補助金が取得できないため、
+    キーワード・受付状況・対象地域などで分けた複数の検索の結果を合わせて全体を取得する。
+    一部の条件で取得に失敗した場合も、取得できた分をまとめて返す。
+
+    Args:
+        partitions (list): get_list_partitions() の結果
+        max_workers (int, optional): 同時実行数
+            （Noneの場合は環境変数 LIST_MAX_WORKERS、未設定なら4）
+        client (JGrantsClient, optional): 利用するAPIクライアント
+        deadline (float, optional): 期限（time.monotonic()基準）
+
+    Returns:
+        dict: fetch_subsidies_list() と同じ形式のレスポンス
+            （metadata.partitions に条件ごとのカバー率を追加、すべて失敗した場合はNone）
+    """
+    if client is None:
+        client = get_default_client()
+    if max_workers is None:
+        max_workers = int(os.environ.get("LIST_MAX_WORKERS", DEFAULT_LIST_MAX_WORKERS))
+    metrics = get_metrics()
+
+    def fetch(partition):
+        with metrics.stage("list_partition"):
+            return fetch_subsidies_list(partition["params"], client=client, deadline=deadline)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(partitions)))) as executor:
+        responses = list(executor.map(fetch, partitions))
+
+    # 条件の順に、初めて出てきた補助金を採用する
+    merged = {}
+    sources = {}
+    for index, data in enumerate(responses):
+        if not data:
+            continue
+        for subsidy in data.get("result", []):
+            subsidy_id = subsidy.get("id")
+            if subsidy_id is None:
+                continue
+            merged.setdefault(subsidy_id, subsidy)
+            sources.setdefault(subsidy_id, set()).add(index)
+
+    coverage = []
+    for index, (partition, data) in enumerate(zip(partitions, responses)):
+        entry = {"name": partition["name"], "params": partition["params"]}
+        if not data:
+            entry["error"] = True
+            coverage.append(entry)
+            continue
+        ids = {s.get("id") for s in data.get("result", []) if s.get("id") is not None}
+        entry.update({
+            "count": data.get("metadata", {}).get("resultset", {}).get("count", len(ids)),
+            "fetched": len(ids),
+            # この条件でしか取得できなかった件数
+            "unique": sum(1 for subsidy_id in ids if sources[subsidy_id] == {index}),
+            "coverage": round(len(ids) / len(merged), 4) if merged else 0,
+        })
+        coverage.append(entry)
+
+    print(f"一覧の分割取得: {len(partitions)}条件（同時実行数: {max_workers}）")
+    for entry in coverage:
+        if entry.get("error"):
+            print(f"   ❌ {entry['name']}: 取得失敗")
+        else:
+            print(f"   {entry['name']}: {entry['fetched']}件（全体の {entry['coverage']:.1%}、"
+                  f"この条件のみ: {entry['unique']}件）")
+    print(f"   重複を除いた件数: {len(merged)}件")
+
+    if all(not data for data in responses):
+        return None
+    return {
+        "metadata": {
+            "resultset": {"count": len(merged)},
+            "partitions": coverage,
+        },
+        "result": list(merged.values()),
+    }
+
+
+def fetch_catalog(partitions=None, client=None, deadline=None):
+    """
+    同期対象の補助金一覧を取得する（分割条件が設定されていれば分割して取得する）
+
+    Args:
+        partitions (list, optional): 分割条件（Noneの場合は環境変数 LIST_PARTITIONS を参照）
+        client (JGrantsClient, optional): 利用するAPIクライアント
+        deadline (float, optional): 期限（time.monotonic()基準）。再試行で期限を超えて待たない
+
+    Returns:
+        dict: APIレスポンス全体（取得失敗時はNone）
+    """
+    partitions = get_list_partitions(partitions)
+    if partitions is None:
+        return fetch_subsidies_list(client=client, deadline=deadline)
+    return harvest_subsidies_list(partitions, client=client, deadline=deadline)
+
+
 if __name__ == "__main__":
     # テスト用
-    data = fetch_subsidies_list()
+    data = fetch_catalog()
     
     if data:
         count = data.get("metadata", {}).get("resultset", {}).get("count", 0)
@@ -0,0 +1,139 @@
+import os
+import json
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+from manifest import FINGERPRINT_FIELDS, utc_now_iso
+from refresh_scheduler import REFRESH_REQUESTED_FIELD
+
+# 詳細取得を分散実行するためのキュー名（function_app.py のキュートリガーと一致させる）
+FETCH_QUEUE_NAME = "subsidy-fetch"
+
+# 1メッセージに含める補助金の件数のデフォルト値
+DEFAULT_BATCH_SIZE = 20
+
+# メッセージの最大処理回数（host.json の extensions.queues.maxDequeueCount と一致させる）
+# 最後の処理でも失敗した補助金は、次回のタイマー実行で再びキューに追加される
+MAX_DEQUEUE_COUNT = 5
+
+# メッセージに含める一覧APIのフィールド（詳細取得と、フィンガープリント・updated_date の記録に使う）
+# 再取得の対象には、再取得を決めた日時も含める
+MESSAGE_FIELDS = ["id", "title"] + FINGERPRINT_FIELDS + [REFRESH_REQUESTED_FIELD]
+
+# キューのメッセージサイズの上限（Base64エンコード前、バイト）
+MAX_MESSAGE_SIZE = 48 * 1024
+
+
+def get_batch_size(batch_size=None):
+    """
+    1メッセージに含める補助金の件数を決定する
+
+    Args:
+        batch_size: 明示的に指定された件数（Noneの場合は環境変数 FETCH_QUEUE_BATCH_SIZE を参照）
+
+    Returns:
+        int: 件数（1以上）
+    """
+    if batch_size is None:
+        batch_size = os.environ.get("FETCH_QUEUE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    try:
+        batch_size = int(batch_size)
+    except (TypeError, ValueError):
+        raise ValueError(f"バッチサイズが不正です: {batch_size}")
+    return max(1, batch_size)
+
+
+def get_queue_client(connection_string, queue_name=FETCH_QUEUE_NAME):
+    """
+    詳細取得キューのクライアントを取得する（キューが存在しない場合は作成）
+
+    Functionsのキュートリガーの既定の形式に合わせ、メッセージはBase64でエンコードする。
+
+    Args:
+        connection_string (str): Azure Storageの接続文字列（Azuriteの場合は UseDevelopmentStorage=true）
+        queue_name (str): キュー名
+
+    Returns:
+        QueueClient: キューのクライアント
+    """
+    queue_client = QueueClient.from_connection_string(
+        connection_string,
+        queue_name,
+        message_encode_policy=TextBase64EncodePolicy(),
+    )
+    try:
+        queue_client.create_queue()
+    except ResourceExistsError:
+        pass
+    return queue_client
+
+
+def encode_batch(subsidies):
+    """補助金一覧の一部を、キューのメッセージ本文（JSON）にする"""
+    message = {
+        "enqueued_at": utc_now_iso(),
+        "subsidies": [
+            {field: subsidy.get(field) for field in MESSAGE_FIELDS if subsidy.get(field) is not None}
+            for subsidy in subsidies
+        ],
+    }
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_batch(body):
+    """
+    キューのメッセージ本文から補助金一覧の一部を取り出す
+
+    Args:
+        body (str | bytes): メッセージ本文（Base64デコード済み）
+
+    Returns:
+        list: 補助金一覧の一部（MESSAGE_FIELDS のみ）
+
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    message = json.loads(body)
+    subsidies = message.get("subsidies") if isinstance(message, dict) else None
+    if not isinstance(subsidies, list) or not all(isinstance(s, dict) and s.get("id") for s in subsidies):
+        raise ValueError("補助金一覧が含まれていないメッセージです")
+    return subsidies
+
+
+def iter_batches(subsidies, batch_size):
+    """
+    補助金一覧をメッセージ単位に分割する
+
+    件数が batch_size 以下でも、メッセージサイズの上限を超える場合はさらに分割する。
+
+    Yields:
+        str: メッセージ本文
+    """
+    batch = []
+    for subsidy in subsidies:
+        candidate = batch + [subsidy]
+        if batch and (len(candidate) > batch_size or len(encode_batch(candidate).encode('utf-8')) > MAX_MESSAGE_SIZE):
+            yield encode_batch(batch)
+            candidate = [subsidy]
+        batch = candidate
+    if batch:
+        yield encode_batch(batch)
+
+
+def enqueue_subsidies(queue_client, subsidies, batch_size=None):
+    """
+    補助金一覧をバッチに分けて詳細取得キューに追加する
+
+    Args:
+        queue_client: QueueClient
+        subsidies (list): 詳細を取得する補助金一覧
+        batch_size (int, optional): 1メッセージに含める件数
+
+    Returns:
+        int: 追加したメッセージ数
+    """
+    batch_size = get_batch_size(batch_size)
+    count = 0
+    for body in iter_batches(subsidies, batch_size):
+        queue_client.send_message(body)
+        count += 1
+    return count
@@ -1,39 +1,82 @@
 import requests
 import json
+import time
+from jgrants_client import get_default_client
+from rate_limiter import CircuitOpenError, DeadlineExceededError
+from detail_stream import DEFAULT_CHUNK_SIZE, parse_detail_stream
+from metrics import ChunkTimer, get_metrics
+from attachments import ATTACHMENT_REFS_FIELD
 
-def fetch_subsidy_detail(subsidy_id, exclude_fields=None):
+def fetch_subsidy_detail(subsidy_id, exclude_fields=None, client=None, stream=True, attachment_store=None,
+                         deadline=None):
     """
     J-Grants APIから特定の補助金の詳細情報を取得する
     
     Args:
         subsidy_id (str): 補助金のID
         exclude_fields (list): 除外するフィールド名のリスト
+        client (JGrantsClient, optional): 利用するAPIクライアント
+            （Noneの場合は共有クライアントを利用）
+        stream (bool): Trueの場合、レスポンスを逐次読み込みながら除外フィールドを読み飛ばす
+            （Base64のPDFデータなどをメモリに展開しない）
+        attachment_store (AttachmentStore, optional): 指定した場合、公募要領などの添付ファイルを
+            読み込みながら保存し、参照（application_guideline_refs）を詳細情報に追加する（stream=True の場合のみ）
+        deadline (float, optional): 期限（time.monotonic()基準）。送信レートの制限・再試行で期限を超えて待たない
     
     Returns:
         dict: 補助金の詳細情報（取得失敗時はNone）
+
+    Raises:
+        CircuitOpenError: APIの障害を検知して、リクエストを停止している場合（呼び出し側で次回に持ち越す）
+        DeadlineExceededError: 期限までに取得できない場合（呼び出し側で次回に持ち越す）
     """
-    url = f"https://api.jgrants-portal.go.jp/exp/v1/public/subsidies/id/{subsidy_id}"
-    headers = {"Accept": "application/json"}
+    if client is None:
+        client = get_default_client()
     
     # デフォルトで除外するフィールド
     if exclude_fields is None:
         exclude_fields = ['application_guidelines', 'outline_of_grant', 'application_form']
     
+    metrics = get_metrics()
+    started = time.perf_counter()
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+        if stream:
+            # 受信しながら除外フィールドを読み飛ばす
+            with client.get_subsidy_detail(subsidy_id, stream=True, deadline=deadline) as response:
+                connected = time.perf_counter()
+                chunks = ChunkTimer(response.iter_content(chunk_size=DEFAULT_CHUNK_SIZE))
+                extractor = attachment_store.extractor() if attachment_store is not None else None
+                data = parse_detail_stream(chunks, exclude_fields, extractor)
+            if extractor is not None and data and data.get('result'):
+                data['result'][0][ATTACHMENT_REFS_FIELD] = extractor.refs
+            # 受信の待ち時間を詳細取得、それ以外を除外フィールドの読み飛ばし（解析）として記録
+            fetch_time = (connected - started) + chunks.wait
+            metrics.observe("detail_fetch", fetch_time, chunks.bytes)
+            metrics.observe("filter", time.perf_counter() - started - fetch_time)
+            return data
+        
+        with client.get_subsidy_detail(subsidy_id, deadline=deadline) as response:
+            data = response.json()
+            size = len(response.content)
+        fetched = time.perf_counter()
+        metrics.observe("detail_fetch", fetched - started, size)
         
         # resultフィールドが存在する場合、その中の最初の要素から不要なフィールドを削除
         if data and 'result' in data and len(data['result']) > 0:
             for field in exclude_fields:
                 if field in data['result'][0]:
                     del data['result'][0][field]
+        metrics.observe("filter", time.perf_counter() - fetched)
         
         return data
+    except (CircuitOpenError, DeadlineExceededError):
+        raise
     except requests.exceptions.RequestException as e:
         print(f"API取得エラー (ID: {subsidy_id}): {e}")
         return None
+    except ValueError as e:
+        print(f"JSON解析エラー (ID: {subsidy_id}): {e}")
+        return None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from urllib.parse import urlencode
+
+# エンドポイントごとのキャッシュ有効期間（秒）のデフォルト値
+DEFAULT_TTLS = {
+    "list": 60 * 60,          # 補助金一覧: 1時間
+    "detail": 24 * 60 * 60,   # 補助金詳細: 1日
+}
+
+# キャッシュ全体のサイズ上限のデフォルト値（バイト）
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# 上限を超えた場合に削除して減らす先（上限に対する割合）
+# 上限ちょうどまでしか減らさないと、次の保存でまた上限を超えて走査することになるため、余裕を空けておく
+EVICT_TARGET_RATIO = 0.9
+
+# レスポンス本文をキャッシュに書き込む際のチャンクサイズ（バイト）
+WRITE_CHUNK_SIZE = 64 * 1024
+
+_META_SUFFIX = ".meta.json"
+_BODY_SUFFIX = ".body"
+
+
+def endpoint_of(url):
+    """URLからTTLの区分（"detail" または "list"）を判定する"""
+    return "detail" if "/subsidies/id/" in url else "list"
+
+
+class ResponseCache:
+    """
+    J-Grants APIのレスポンスをディスクに保存するキャッシュ
+
+    URLとクエリパラメータをキーに、本文（.body）とメタ情報（.meta.json）を保存する。
+    - エンドポイントごとのTTL内であればAPIにアクセスせずに返す
+    - TTLを過ぎたものは ETag / Last-Modified があれば条件付きリクエストで再検証する
+    - 合計サイズが上限を超えたら、最後に使われた日時が古いものから削除する（LRU）
+      合計サイズは最初の保存時に1回だけ走査し、以降は保存ごとの増減を加算する
+      （削除は上限の EVICT_TARGET_RATIO まで行い、保存のたびに走査しない）
+    - オフラインモードでは、TTLに関係なくキャッシュのみを返す
+    """
+
+    def __init__(self, directory, ttls=None, max_size=None, offline=False):
+        """
+        Args:
+            directory (str): キャッシュを保存するディレクトリ
+            ttls (dict, optional): エンドポイント（"list"・"detail"）ごとのTTL（秒）
+            max_size (int, optional): キャッシュ全体のサイズ上限（バイト）
+            offline (bool): Trueの場合、APIにアクセスせずキャッシュのみを使う
+        """
+        self.directory = directory
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update({k: v for k, v in ttls.items() if v is not None})
+        self.max_size = int(max_size or DEFAULT_MAX_SIZE)
+        self.offline = offline
+        # キャッシュ全体のサイズ（未計測の場合はNone）
+        self._total_size = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, directory):
+        """
+        環境変数から設定を読み込んでキャッシュを生成する
+
+        - JGRANTS_CACHE_TTL_LIST / JGRANTS_CACHE_TTL_DETAIL: TTL（秒）
+        - JGRANTS_CACHE_MAX_MB: キャッシュ全体のサイズ上限（MB）
+        - JGRANTS_CACHE_OFFLINE: 1の場合はオフラインモード
+        """
+        ttl_list = os.environ.get("JGRANTS_CACHE_TTL_LIST")
+        ttl_detail = os.environ.get("JGRANTS_CACHE_TTL_DETAIL")
+        max_mb = os.environ.get("JGRANTS_CACHE_MAX_MB")
+        return cls(
+            directory,
+            ttls={
+                "list": float(ttl_list) if ttl_list else None,
+                "detail": float(ttl_detail) if ttl_detail else None,
+            },
+            max_size=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+            offline=os.environ.get("JGRANTS_CACHE_OFFLINE", "0") == "1",
+        )
+
+    def key(self, url, params=None):
+        """URLとクエリパラメータからキャッシュキーを計算する"""
+        query = urlencode(sorted((params or {}).items()))
+        return hashlib.sha256(f"{url}?{query}".encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + _META_SUFFIX, base + _BODY_SUFFIX
+
+    def lookup(self, url, params=None):
+        """
+        キャッシュを検索する
+
+        Returns:
+            dict: メタ情報（key・url・stored_at・etag・last_modified・size・headers）。ない場合はNone
+        """
+        key = self.key(url, params)
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(body_path):
+            return None
+        meta["key"] = key
+        return meta
+
+    def is_fresh(self, meta):
+        """TTL内かどうか"""
+        ttl = self.ttls.get(endpoint_of(meta["url"]), 0)
+        return time.time() - meta["stored_at"] < ttl
+
+    def validators(self, meta):
+        """再検証用の条件付きリクエストヘッダー"""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def open_body(self, meta):
+        """
+        キャッシュの本文を開き、最後に使われた日時を更新する（LRU用）
+
+        Raises:
+            FileNotFoundError: 他のスレッドの削除などで本文が存在しない場合
+        """
+        meta_path, body_path = self._paths(meta["key"])
+        now = time.time()
+        try:
+            os.utime(meta_path, (now, now))
+        except OSError:
+            pass
+        return open(body_path, 'rb')
+
+    def refresh(self, meta):
+        """再検証で変更がなかった（304）場合に、保存日時を更新する"""
+        meta_path, _ = self._paths(meta["key"])
+        meta = {k: v for k, v in meta.items() if k != "key"}
+        meta["stored_at"] = time.time()
+        self._write_meta(meta_path, meta)
+
+    def _write_meta(self, meta_path, meta):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def store(self, url, params, response):
+        """
+        レスポンス本文をチャンクごとにキャッシュに書き込む（本文全体をメモリに保持しない）
+
+        Args:
+            url (str): リクエストURL
+            params (dict): クエリパラメータ
+            response (requests.Response): stream=True で取得したレスポンス
+
+        Returns:
+            dict: 保存したキャッシュのメタ情報
+        """
+        key = self.key(url, params)
+        meta_path, body_path = self._paths(key)
+        previous_size = self._entry_size(key)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=WRITE_CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, body_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        meta = {
+            "url": url,
+            "params": params or {},
+            "stored_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type"),
+            "size": size,
+        }
+        self._write_meta(meta_path, meta)
+        if self._add_size(self._entry_size(key) - previous_size):
+            self.evict(keep=key)
+        meta["key"] = key
+        return meta
+
+    def _entry_size(self, key):
+        """1件分（本文とメタ情報）のサイズ（存在しない場合は0）"""
+        size = 0
+        for path in self._paths(key):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _add_size(self, delta):
+        """
+        保存による増減を合計サイズに反映する（初回はディレクトリを走査して計測する）
+
+        Returns:
+            bool: 合計サイズが上限を超えた場合はTrue
+        """
+        with self._lock:
+            if self._total_size is None:
+                self._total_size = self._scan()[1]
+            else:
+                self._total_size += delta
+            return self._total_size > self.max_size
+
+    def _scan(self, keep=None):
+        """
+        ディレクトリを走査する
+
+        Returns:
+            tuple: (keep 以外の (最後に使われた日時, サイズ, メタ情報のパス, 本文のパス) のリスト, 合計サイズ)
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(_META_SUFFIX):
+                continue
+            key = name[:-len(_META_SUFFIX)]
+            if key == keep:
+                total += self._entry_size(key)
+                continue
+            meta_path, body_path = self._paths(key)
+            try:
+                size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                last_used = os.path.getmtime(meta_path)
+            except OSError:
+                continue
+            entries.append((last_used, size, meta_path, body_path))
+            total += size
+        return entries, total
+
+    def evict(self, keep=None):
+        """
+        合計サイズが上限を超えている場合、最後に使われた日時が古いものから上限の EVICT_TARGET_RATIO まで削除する
+
+        保存のたびには呼び出さず、記録している合計サイズが上限を超えた場合のみ呼び出す。
+
+        Args:
+            keep (str, optional): 削除しないキャッシュキー（保存した直後のものなど）
+        """
+        with self._lock:
+            # 他のプロセスの書き込みも含めて、削除の前に実際のサイズを計測し直す
+            entries, total = self._scan(keep)
+            self._total_size = total
+            if total <= self.max_size:
+                return
+
+            target = self.max_size * EVICT_TARGET_RATIO
+            entries.sort()
+            for _, size, meta_path, body_path in entries:
+                for path in (meta_path, body_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                if total <= target:
+                    break
+            self._total_size = total
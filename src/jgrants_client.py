@@ -0,0 +1,264 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from http_cache import ResponseCache
+from metrics import get_metrics
+from rate_limiter import RetryPolicy, check_deadline, parse_retry_after
+
+# J-Grants API（公開API）のベースURL
+DEFAULT_BASE_URL = "https://api.jgrants-portal.go.jp/exp/v1/public"
+
+# 接続プールのサイズ（同時に保持するKeep-Alive接続数）
+DEFAULT_POOL_SIZE = 10
+
+# タイムアウト（秒）
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+# 送信レートの制限で待った時間をこの秒数以上の場合だけ計測値（rate_wait）に記録する
+# （制限中でもトークンがあれば待たずに送信するため、ロックの取得などのごく短い時間は記録しない）
+RATE_WAIT_MIN_SECONDS = 0.001
+
+# 調査スクリプト（src/survey）のレスポンスのキャッシュの保存先（プロジェクト直下の .cache/jgrants）
+SURVEY_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'jgrants')
+
+
+class JGrantsClient:
+    """
+    J-Grants APIクライアント
+
+    requests.Sessionを1つ保持し、Keep-Alive接続をプールして再利用する。
+    補助金ごとにTCP+TLSのハンドシェイクが発生しないよう、
+    一覧取得・詳細取得のすべての呼び出しでこのクライアントを共有する。
+    Sessionはスレッド間で共有して利用する。
+    キャッシュ（ResponseCache）を指定した場合は、レスポンスをディスクにキャッシュする。
+    RetryPolicy を指定した場合は、送信レートの制御・429/5xx/接続エラーの再試行・サーキットブレーカーを
+    APIへの送信ごとに適用する（キャッシュから返すレスポンスには適用しない）。
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None, cache=None,
+                 retry_policy=None):
+        """
+        Args:
+            base_url (str, optional): APIのベースURL（ローカルの代替サーバーを指す場合などに指定）
+            pool_size (int, optional): 接続プールのサイズ
+            connect_timeout (float, optional): 接続タイムアウト（秒）
+            read_timeout (float, optional): 読み取りタイムアウト（秒）
+            cache (ResponseCache, optional): レスポンスのキャッシュ（Noneの場合はキャッシュしない）
+            retry_policy (RetryPolicy, optional): 送信レート・再試行・サーキットブレーカーの設定
+                （Noneの場合は制限・再試行しない）
+        """
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.pool_size = int(pool_size or DEFAULT_POOL_SIZE)
+        self.timeout = (
+            float(connect_timeout or DEFAULT_CONNECT_TIMEOUT),
+            float(read_timeout or DEFAULT_READ_TIMEOUT),
+        )
+        self.cache = cache
+        self.retry_policy = retry_policy
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept": "application/json"})
+        # プールが満杯の場合は新規接続を作らず空きを待つ
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_env(cls):
+        """
+        環境変数から設定を読み込んでクライアントを生成する
+
+        - JGRANTS_BASE_URL: APIのベースURL
+        - JGRANTS_POOL_SIZE: 接続プールのサイズ
+        - JGRANTS_CONNECT_TIMEOUT: 接続タイムアウト（秒）
+        - JGRANTS_READ_TIMEOUT: 読み取りタイムアウト（秒）
+        - JGRANTS_CACHE_DIR: レスポンスのキャッシュを保存するディレクトリ（未設定の場合はキャッシュしない）
+          その他のキャッシュの設定は ResponseCache.from_env を参照
+        - 送信レート・再試行・サーキットブレーカーの設定は RetryPolicy.from_env を参照
+        """
+        cache_dir = os.environ.get("JGRANTS_CACHE_DIR")
+        return cls(
+            base_url=os.environ.get("JGRANTS_BASE_URL"),
+            pool_size=os.environ.get("JGRANTS_POOL_SIZE"),
+            connect_timeout=os.environ.get("JGRANTS_CONNECT_TIMEOUT"),
+            read_timeout=os.environ.get("JGRANTS_READ_TIMEOUT"),
+            cache=ResponseCache.from_env(cache_dir) if cache_dir else None,
+            retry_policy=RetryPolicy.from_env(),
+        )
+
+    def url(self, path):
+        """ベースURLからの相対パスを完全なURLに変換する"""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path, params=None, stream=False, deadline=None):
+        """
+        GETリクエストを送信する
+
+        Args:
+            path (str): ベースURLからの相対パス
+            params (dict, optional): クエリパラメータ
+            stream (bool): Trueの場合、レスポンス本文を逐次読み込む
+            deadline (float, optional): 期限（time.monotonic()基準）。送信レートの制限・再試行の待ち時間が
+                期限を超える場合は待たずに DeadlineExceededError を送出する（RetryPolicy を指定した場合）
+
+        Returns:
+            requests.Response: レスポンス（HTTPエラー時は例外を送出）
+        """
+        url = self.url(path)
+        if self.cache is not None:
+            return self._cached_get(url, params, deadline)
+        return self._request(url, params, stream, deadline=deadline)
+
+    @property
+    def is_circuit_open(self):
+        """APIの障害を検知して、リクエストを停止しているかどうか"""
+        return self.retry_policy is not None and self.retry_policy.is_open
+
+    def _request(self, url, params, stream, headers=None, deadline=None):
+        if self.retry_policy is None:
+            response = self.session.get(url, params=params, timeout=self.timeout, stream=stream, headers=headers)
+        else:
+            response = self._send_with_retry(url, params, stream, headers, deadline)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    def _send_with_retry(self, url, params, stream, headers, deadline=None):
+        """
+        送信レートの制限に従って送信し、429・5xx・接続エラーの場合は待ってから再試行する
+
+        GETは冪等なため、ストリーミングのレスポンスも本文を読み込む前であれば再試行できる。
+        再試行の回数を使い切った場合は最後のレスポンスを返し（呼び出し側でHTTPエラーにする）、
+        接続エラーはそのまま送出する。サーキットブレーカーが開いている場合は CircuitOpenError を送出する。
+        待ち時間（送信レートの制限・Retry-After・バックオフ）が期限を超える場合は、待たずに DeadlineExceededError を送出する。
+        """
+        policy = self.retry_policy
+        metrics = get_metrics()
+        attempt = 0
+        while True:
+            waited = policy.before_request(deadline)
+            if waited >= RATE_WAIT_MIN_SECONDS:
+                metrics.observe("rate_wait", waited)
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream, headers=headers)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                policy.on_error()
+                attempt += 1
+                delay = policy.retry_delay(attempt)
+                if delay is None:
+                    raise
+                check_deadline(deadline, delay)
+            except BaseException:
+                policy.on_abort()
+                raise
+            else:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if not policy.on_response(response.status_code, retry_after, response.elapsed.total_seconds()):
+                    return response
+                attempt += 1
+                delay = policy.retry_delay(attempt, retry_after)
+                if delay is None:
+                    return response
+                response.close()
+                check_deadline(deadline, delay)
+            with metrics.stage("retry_wait"):
+                time.sleep(delay)
+
+    def _cached_get(self, url, params, deadline=None):
+        """
+        キャッシュを経由してGETする
+
+        TTL内のキャッシュがあればそのまま返し、期限切れの場合は条件付きリクエストで再検証する。
+        取得した本文は一度キャッシュに書き込み、キャッシュのファイルから読み込むレスポンスとして返す。
+        """
+        meta = self.cache.lookup(url, params)
+        if meta and (self.cache.offline or self.cache.is_fresh(meta)):
+            try:
+                return self._response_from_cache(meta)
+            except FileNotFoundError:
+                # 検索後に削除された場合は、キャッシュがないものとして取得し直す
+                meta = None
+        if self.cache.offline:
+            raise requests.exceptions.ConnectionError(
+                f"オフラインモードのため、キャッシュにないURLは取得できません: {url}"
+            )
+
+        headers = self.cache.validators(meta) if meta else None
+        with self._request(url, params, stream=True, headers=headers, deadline=deadline) as response:
+            if response.status_code == 304 and meta:
+                self.cache.refresh(meta)
+            else:
+                meta = self.cache.store(url, params, response)
+        return self._response_from_cache(meta)
+
+    def _response_from_cache(self, meta):
+        """キャッシュの本文を読み込む requests.Response を作成する"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = meta["url"]
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict({
+            "Content-Type": meta.get("content_type") or "application/json",
+            "X-Cache": "HIT",
+        })
+        response.raw = self.cache.open_body(meta)
+        return response
+
+    def get_json(self, path, params=None, deadline=None):
+        """GETリクエストを送信し、レスポンスをJSONとして返す"""
+        with self.get(path, params=params, deadline=deadline) as response:
+            data = response.json()
+            get_metrics().add_bytes(len(response.content))
+            return data
+
+    def list_subsidies(self, params=None, deadline=None):
+        """補助金一覧APIを呼び出す"""
+        return self.get_json("subsidies", params=params, deadline=deadline)
+
+    def get_subsidy_detail(self, subsidy_id, stream=False, deadline=None):
+        """補助金詳細APIを呼び出し、レスポンスを返す"""
+        return self.get(f"subsidies/id/{subsidy_id}", stream=stream, deadline=deadline)
+
+    def close(self):
+        """プールしている接続をすべて閉じる"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def use_survey_cache():
+    """
+    調査スクリプト用に、レスポンスを SURVEY_CACHE_DIR にキャッシュする（JGRANTS_CACHE_DIR が未設定の場合）
+
+    共有クライアント（get_default_client）を生成する前に呼び出す。
+    """
+    os.environ.setdefault("JGRANTS_CACHE_DIR", SURVEY_CACHE_DIR)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    プロセス全体で共有するクライアントを取得する（初回呼び出し時に環境変数から生成）
+
+    Returns:
+        JGrantsClient: 共有クライアント
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = JGrantsClient.from_env()
+        return _default_client
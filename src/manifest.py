@@ -0,0 +1,366 @@
+import json
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+# マニフェスト（保存済み補助金の索引）のBlob名
+MANIFEST_BLOB_NAME = "_manifest.json"
+
+# 補助金データのBlobに内容のハッシュを記録するメタデータのキー
+CONTENT_HASH_METADATA_KEY = "content_sha256"
+
+# 管理用Blob（マニフェストなど）の接頭辞。補助金データのBlobとは区別する
+RESERVED_BLOB_PREFIX = "_"
+
+# キュートリガーの関数が書き込むマニフェストの差分のBlobの接頭辞（タイマー実行時にまとめてマニフェストに反映する）
+MANIFEST_DELTA_PREFIX = "_manifest_delta/"
+
+MANIFEST_VERSION = 1
+
+# ETag競合時に再読み込みしてマージし直す最大回数
+MAX_SAVE_ATTEMPTS = 5
+
+# 変更検知に使う一覧APIのフィールド
+FINGERPRINT_FIELDS = [
+    'acceptance_start_datetime',
+    'acceptance_end_datetime',
+    'subsidy_max_limit',
+    'target_area_search',
+    'updated_date',
+]
+
+
+def utc_now_iso():
+    """現在時刻（UTC）をISO 8601形式で返す"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def list_fingerprint(subsidy):
+    """
+    一覧APIの1件分のデータから変更検知用のフィンガープリントを計算する
+
+    受付期間・上限額・対象地域（および存在する場合は updated_date）が
+    変わった場合にのみ値が変わる。
+
+    Args:
+        subsidy (dict): 補助金一覧の1件分のデータ
+
+    Returns:
+        str: フィンガープリント（SHA-256の先頭16文字）
+    """
+    values = {field: subsidy.get(field) for field in FINGERPRINT_FIELDS if subsidy.get(field) is not None}
+    payload = json.dumps(values, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def is_subsidy_blob_name(blob_name):
+    """補助金データのBlob（{id}.json）かどうか"""
+    return blob_name.endswith('.json') and not blob_name.startswith(RESERVED_BLOB_PREFIX)
+
+
+class SubsidyManifest:
+    """
+    保存済み補助金の索引（マニフェスト）
+
+    補助金IDごとに、保存内容のハッシュ・取得日時・取得元の updated_date、
+    一覧APIのフィンガープリントを保持する。
+    実行開始時に1回のGETで読み込み、終了時にETag条件付きで書き戻すことで、
+    コンテナ全体の一覧取得を不要にする。
+    """
+
+    def __init__(self, entries=None, etag=None):
+        """
+        Args:
+            entries (dict, optional): 補助金IDをキーとするエントリ
+            etag (str, optional): 読み込み時のマニフェストBlobのETag（新規作成時はNone）
+        """
+        self.entries = entries or {}
+        self.etag = etag
+        # この実行で更新したエントリ（競合時のマージに使う）
+        self._updated = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, container_client):
+        """
+        マニフェストBlobを読み込む
+
+        Args:
+            container_client: ContainerClient
+
+        Returns:
+            SubsidyManifest: 読み込んだマニフェスト（存在しない場合はNone）
+        """
+        blob_client = container_client.get_blob_client(MANIFEST_BLOB_NAME)
+        try:
+            downloader = blob_client.download_blob()
+        except ResourceNotFoundError:
+            return None
+        data = json.loads(downloader.readall())
+        return cls(entries=data.get("subsidies", {}), etag=downloader.properties.etag)
+
+    @classmethod
+    def rebuild_from_listing(cls, container_client, previous=None):
+        """
+        コンテナ内のBlob一覧からマニフェストを再構築する（修復用）
+
+        一覧に存在するBlobだけをエントリとする。
+        ハッシュとETagはBlobのメタデータ・プロパティから取得し、
+        既存のマニフェストにエントリがあれば updated_date などを引き継ぐ。
+        新しいエントリの取得日時は再構築した時刻とする（Blobの更新日時を使うと、再構築の直後に
+        古いBlobがすべて再取得の対象になるため）。
+
+        Args:
+            container_client: ContainerClient
+            previous (SubsidyManifest, optional): 既存のマニフェスト
+
+        Returns:
+            SubsidyManifest: 再構築したマニフェスト
+                （新しいエントリのフィンガープリントは fill_missing_fingerprints で一覧APIから補完する）
+        """
+        manifest = cls(etag=previous.etag if previous else None)
+        for blob in container_client.list_blobs(include=['metadata']):
+            if not is_subsidy_blob_name(blob.name):
+                continue
+            subsidy_id = blob.name[:-5]  # .jsonを除去
+            content_hash = (blob.metadata or {}).get(CONTENT_HASH_METADATA_KEY)
+            old = previous.get(subsidy_id) if previous else None
+            if old:
+                manifest.update(
+                    subsidy_id,
+                    content_hash or old.get("hash"),
+                    updated_date=old.get("updated_date"),
+                    fetched_at=old.get("fetched_at"),
+                    fingerprint=old.get("fingerprint"),
+                    etag=blob.etag,
+                )
+                continue
+            manifest.update(subsidy_id, content_hash, etag=blob.etag)
+        return manifest
+
+    def ids(self):
+        """登録されている補助金IDのセット"""
+        with self._lock:
+            return set(self.entries)
+
+    def get(self, subsidy_id):
+        """補助金IDのエントリを取得する（存在しない場合はNone）"""
+        with self._lock:
+            return self.entries.get(subsidy_id)
+
+    def update(self, subsidy_id, content_hash, updated_date=None, fetched_at=None, fingerprint=None, etag=None):
+        """
+        補助金のエントリを追加・更新する（複数スレッドから呼び出し可能）
+
+        Args:
+            subsidy_id (str): 補助金ID
+            content_hash (str): 保存内容のSHA-256
+            updated_date (str, optional): 取得元の updated_date
+            fetched_at (str, optional): 取得日時（Noneの場合は現在時刻）
+            fingerprint (str, optional): 一覧APIのフィンガープリント
+            etag (str, optional): 補助金データのBlobのETag（条件付き書き込みに使う）
+        """
+        entry = {
+            "hash": content_hash,
+            "fetched_at": fetched_at or utc_now_iso(),
+            "updated_date": updated_date,
+            "fingerprint": fingerprint,
+            "etag": etag,
+        }
+        with self._lock:
+            self.entries[subsidy_id] = entry
+            self._updated[subsidy_id] = entry
+
+    def fill_missing_fingerprints(self, subsidies):
+        """
+        フィンガープリントが記録されていないエントリ（Blob一覧から再構築したものなど）に、
+        一覧APIの現在の値からフィンガープリントを記録する
+
+        Blobが保存済みのため、一覧の内容は保存時から変わっていないものとして扱う。
+        記録しないと、再構築後の最初の実行で保存済みの全件を変更ありとして取得し直すことになる。
+        内容の変化は受付状況ごとの再取得（RefreshScheduler）で検知する。
+
+        Args:
+            subsidies (list): 補助金一覧のデータ
+
+        Returns:
+            int: フィンガープリントを記録したエントリの件数
+        """
+        filled = 0
+        for subsidy in subsidies:
+            subsidy_id = subsidy.get("id")
+            with self._lock:
+                entry = self.entries.get(subsidy_id)
+                if entry is None or entry.get("fingerprint"):
+                    continue
+                entry = dict(entry, fingerprint=list_fingerprint(subsidy))
+                self.entries[subsidy_id] = entry
+                self._updated[subsidy_id] = entry
+            filled += 1
+        return filled
+
+    def is_changed(self, subsidy):
+        """
+        一覧APIのデータが前回取得時から変わっているかどうか
+
+        フィンガープリントが記録されていないエントリは変更ありとして扱う
+        （一覧から再構築したエントリは、事前に fill_missing_fingerprints で記録しておく）。
+
+        Args:
+            subsidy (dict): 補助金一覧の1件分のデータ
+
+        Returns:
+            bool: 未登録またはフィンガープリントが異なる場合はTrue
+        """
+        entry = self.get(subsidy.get("id"))
+        if entry is None:
+            return True
+        return entry.get("fingerprint") != list_fingerprint(subsidy)
+
+    @property
+    def dirty(self):
+        """未保存の更新があるかどうか"""
+        return bool(self._updated)
+
+    def _serialize(self):
+        data = {
+            "version": MANIFEST_VERSION,
+            "updated_at": utc_now_iso(),
+            "subsidies": self.entries,
+        }
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def save(self, container_client, max_attempts=None):
+        """
+        マニフェストBlobをETag条件付きで書き込む
+
+        読み込み後に他の実行がマニフェストを更新していた場合は、
+        最新のマニフェストを読み直してこの実行での更新分をマージし、再度書き込む。
+
+        Args:
+            container_client: ContainerClient
+            max_attempts (int, optional): 競合時にマージし直す最大回数（省略時は MAX_SAVE_ATTEMPTS）
+
+        Raises:
+            ResourceModifiedError: 競合が解消しなかった場合
+        """
+        max_attempts = max_attempts or MAX_SAVE_ATTEMPTS
+        blob_client = container_client.get_blob_client(MANIFEST_BLOB_NAME)
+        for attempt in range(1, max_attempts + 1):
+            with self._lock:
+                payload = self._serialize()
+                etag = self.etag
+            try:
+                if etag is None:
+                    # 新規作成（他の実行が先に作成していた場合は競合）
+                    result = blob_client.upload_blob(payload, overwrite=False)
+                else:
+                    result = blob_client.upload_blob(
+                        payload,
+                        overwrite=True,
+                        etag=etag,
+                        match_condition=MatchConditions.IfNotModified,
+                    )
+            except (ResourceExistsError, ResourceModifiedError):
+                if attempt == max_attempts:
+                    raise
+                print(f"マニフェストが他の処理で更新されていたため再読み込みします（{attempt}回目）")
+                self._merge_latest(container_client)
+                continue
+
+            with self._lock:
+                self.etag = result.get("etag")
+                self._updated = {}
+            return
+
+    def save_delta(self, container_client, changed_ids=()):
+        """
+        この実行で更新したエントリを、マニフェスト本体ではなく差分のBlobに書き込む
+
+        キュートリガーの関数が並行してマニフェスト本体を書き換えると競合が続くため、
+        関数ごとに重複しない名前（書き込んだ時刻の順に並ぶ）の差分を書き込み、
+        タイマー実行時に apply_deltas() でまとめて反映する。
+
+        Args:
+            container_client: ContainerClient
+            changed_ids (iterable): 内容を保存した補助金ID（反映時に全文検索の索引・スナップショットを更新する）
+
+        Returns:
+            str: 書き込んだ差分のBlob名
+        """
+        with self._lock:
+            entries = dict(self._updated)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        blob_name = f"{MANIFEST_DELTA_PREFIX}{stamp}-{uuid.uuid4().hex[:12]}.json"
+        payload = json.dumps({
+            "version": MANIFEST_VERSION,
+            "created_at": utc_now_iso(),
+            "subsidies": entries,
+            "changed_ids": sorted(changed_ids),
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        container_client.get_blob_client(blob_name).upload_blob(payload, overwrite=False)
+        with self._lock:
+            for subsidy_id, entry in entries.items():
+                if self._updated.get(subsidy_id) is entry:
+                    del self._updated[subsidy_id]
+        return blob_name
+
+    def apply_deltas(self, container_client, record=True):
+        """
+        差分のBlob（save_delta()）を書き込んだ順に読み込み、エントリに反映する
+
+        取得日時がマニフェストのエントリより古い差分のエントリは反映しない。
+
+        Args:
+            container_client: ContainerClient
+            record (bool): Trueの場合は反映したエントリをこの実行での更新として扱う（save() でマニフェスト本体に書き込む）
+
+        Returns:
+            dict: 読み込んだ差分のBlob名（names）・内容を保存した補助金IDのセット（changed_ids）
+        """
+        names = []
+        changed_ids = set()
+        for blob in container_client.list_blobs(name_starts_with=MANIFEST_DELTA_PREFIX):
+            try:
+                data = json.loads(container_client.get_blob_client(blob.name).download_blob().readall())
+            except ResourceNotFoundError:
+                # 他の実行が反映して削除した
+                continue
+            except ValueError as e:
+                print(f"⚠️  マニフェストの差分を読み込めません: {blob.name}（{e}）")
+                continue
+            names.append(blob.name)
+            changed_ids.update(data.get("changed_ids") or [])
+            with self._lock:
+                for subsidy_id, entry in (data.get("subsidies") or {}).items():
+                    current = self.entries.get(subsidy_id)
+                    if current and (current.get("fetched_at") or "") > (entry.get("fetched_at") or ""):
+                        continue
+                    self.entries[subsidy_id] = entry
+                    if record:
+                        self._updated[subsidy_id] = entry
+        return {"names": names, "changed_ids": changed_ids}
+
+    @staticmethod
+    def delete_deltas(container_client, names):
+        """マニフェスト本体に反映した差分のBlobを削除する"""
+        for name in names:
+            try:
+                container_client.get_blob_client(name).delete_blob()
+            except ResourceNotFoundError:
+                pass
+
+    def _merge_latest(self, container_client):
+        """最新のマニフェストを読み込み、この実行での更新分を上書きマージする"""
+        latest = SubsidyManifest.load(container_client)
+        with self._lock:
+            if latest is None:
+                self.etag = None
+                return
+            entries = latest.entries
+            entries.update(self._updated)
+            self.entries = entries
+            self.etag = latest.etag
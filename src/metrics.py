@@ -0,0 +1,341 @@
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Application Insights に送るログのロガー名
+METRICS_LOGGER_NAME = "jgrants.metrics"
+
+logger = logging.getLogger(METRICS_LOGGER_NAME)
+
+# 処理時間のヒストグラムの区切り（ミリ秒、最後の区切りを超えたものは "inf" に数える）
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# 1件ごとのメモリ使用量（tracemalloc のピーク）を記録する区分名
+ITEM_MEMORY_STAGE = "item_memory"
+
+# プロファイル結果を表示する関数の数
+PROFILE_PRINT_LIMIT = 20
+
+
+def percentile(ordered, p):
+    """
+    ソート済みのリストの百分位数（最近傍順位法）
+
+    ベンチマーク・調査スクリプトの集計でも共通で使う。
+
+    Returns:
+        百分位数（リストが空の場合はNone）
+    """
+    if not ordered:
+        return None
+    rank = max(1, int(round(p / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class StageStats:
+    """1つの処理段階（一覧取得・詳細取得など）の計測値"""
+
+    def __init__(self, name):
+        self.name = name
+        self.durations = []
+        self.bytes = 0
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+
+    def add(self, seconds, nbytes=0):
+        self.durations.append(seconds)
+        self.bytes += nbytes or 0
+        ms = seconds * 1000
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def summary(self):
+        """集計値（ミリ秒単位）"""
+        ordered = sorted(self.durations)
+        total = sum(ordered)
+        labels = [f"le_{bound}" for bound in HISTOGRAM_BUCKETS_MS] + ["inf"]
+        return {
+            "stage": self.name,
+            "count": len(ordered),
+            "total_ms": round(total * 1000, 1),
+            "mean_ms": round(total / len(ordered) * 1000, 2) if ordered else None,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2) if ordered else None,
+            "p90_ms": round(percentile(ordered, 90) * 1000, 2) if ordered else None,
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2) if ordered else None,
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else None,
+            "bytes": self.bytes,
+            "histogram_ms": dict(zip(labels, self.histogram)),
+        }
+
+
+class PipelineMetrics:
+    """
+    補助金データ取得・保存処理の段階ごとの計測値
+
+    段階ごとに処理時間のヒストグラム・百分位数・転送バイト数を集計し、
+    実行の最後に logging で出力する（Application Insights では customDimensions として集計できる）。
+    複数スレッドから同時に記録できる。
+    """
+
+    def __init__(self, trace_memory=False):
+        """
+        Args:
+            trace_memory (bool): Trueの場合、tracemalloc で1件ごとのメモリ使用量のピークを記録する
+        """
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.memory_peaks = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def observe(self, stage, seconds, nbytes=0):
+        """処理時間（秒）と転送バイト数を記録する"""
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(stage)
+            stats.add(seconds, nbytes)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        with文の中の処理時間を記録する
+
+        中で add_bytes() を呼び出すと、その段階の転送バイト数として記録する。
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        counter = [0]
+        stack.append(counter)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            self.observe(name, elapsed, counter[0])
+
+    def add_bytes(self, nbytes):
+        """このスレッドで実行中の段階（stage）に転送バイト数を加える（実行中の段階がなければ何もしない）"""
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1][0] += nbytes
+
+    @contextmanager
+    def item(self):
+        """
+        1件分の処理のメモリ使用量のピークを記録する（trace_memory=True の場合のみ）
+
+        tracemalloc はプロセス全体で1つのため、並列実行時の値には
+        同時に処理中の他の補助金の分も含まれる（FETCH_MAX_WORKERS=1 で1件ごとの値になる）。
+        """
+        if not (self.trace_memory and tracemalloc.is_tracing()):
+            yield
+            return
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            with self._lock:
+                self.memory_peaks.append(max(0, peak - start))
+
+    def summary(self):
+        """段階ごとの集計値のリスト"""
+        with self._lock:
+            summaries = [stats.summary() for stats in self.stages.values()]
+            peaks = sorted(self.memory_peaks)
+        if peaks:
+            summaries.append({
+                "stage": ITEM_MEMORY_STAGE,
+                "count": len(peaks),
+                "p50_bytes": percentile(peaks, 50),
+                "p99_bytes": percentile(peaks, 99),
+                "max_bytes": peaks[-1],
+            })
+        return summaries
+
+    def emit(self, run_id=None):
+        """
+        集計値を段階ごとに1行ずつ logging で出力し、表形式で表示する
+
+        Args:
+            run_id (str, optional): 実行を識別する値（customDimensions に含める）
+        """
+        summaries = self.summary()
+        for summary in summaries:
+            dimensions = dict(summary, run_id=run_id) if run_id else summary
+            logger.info(
+                "pipeline_stage %s",
+                json.dumps(dimensions, ensure_ascii=False, separators=(',', ':')),
+                extra={"custom_dimensions": dimensions},
+            )
+
+        print(f"\n段階ごとの計測値:")
+        print(f"   {'段階':<16} {'件数':>6} {'合計(s)':>9} {'p50(ms)':>9} {'p99(ms)':>9} {'最大(ms)':>9} {'転送(MB)':>9}")
+        for summary in summaries:
+            if summary["stage"] == ITEM_MEMORY_STAGE:
+                continue
+            print(
+                f"   {summary['stage']:<16} {summary['count']:>6} {summary['total_ms'] / 1000:>9.2f} "
+                f"{summary['p50_ms']:>9.1f} {summary['p99_ms']:>9.1f} {summary['max_ms']:>9.1f} "
+                f"{summary['bytes'] / 1024 / 1024:>9.2f}"
+            )
+        memory = next((s for s in summaries if s["stage"] == ITEM_MEMORY_STAGE), None)
+        if memory:
+            print(f"   1件あたりのメモリ使用量のピーク: p50 {memory['p50_bytes'] / 1024:.1f} KB / "
+                  f"p99 {memory['p99_bytes'] / 1024:.1f} KB / 最大 {memory['max_bytes'] / 1024:.1f} KB")
+
+
+class ChunkTimer:
+    """
+    チャンクのイテレータをラップし、受信の待ち時間と受信したバイト数を数える
+
+    逐次読み込みでは受信と解析が交互に行われるため、
+    全体の時間からこの待ち時間を引いたものを解析の時間として扱う。
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.wait = 0.0
+        self.bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            chunk = next(self._chunks)
+        finally:
+            self.wait += time.perf_counter() - started
+        self.bytes += len(chunk)
+        return chunk
+
+
+_metrics = PipelineMetrics()
+
+
+def get_metrics():
+    """現在の実行の計測値"""
+    return _metrics
+
+
+def reset_metrics(trace_memory=None):
+    """
+    計測値を初期化する（実行の開始時に呼び出す）
+
+    Args:
+        trace_memory (bool, optional): 1件ごとのメモリ使用量を記録するかどうか
+            （Noneの場合は環境変数 METRICS_TRACEMALLOC、未設定なら記録しない）
+
+    Returns:
+        PipelineMetrics: 新しい計測値
+    """
+    global _metrics
+    if trace_memory is None:
+        trace_memory = os.environ.get("METRICS_TRACEMALLOC", "0") == "1"
+    _metrics = PipelineMetrics(trace_memory=trace_memory)
+    return _metrics
+
+
+class RunProfiler:
+    """
+    cProfile で1回の実行をプロファイルする
+
+    cProfile はスレッドごとに有効にする必要があるため、
+    開始したスレッドに加えて profile_current_thread() を呼び出したスレッド
+    （詳細取得のワーカーなど）の結果をまとめて保存する。
+    Python 3.12 以降は同時に有効にできるプロファイラが1つだけのため、
+    ワーカーのスレッドで有効にできない場合は警告を出し、開始したスレッドだけをプロファイルする。
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self._profiles = []
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    def profile_current_thread(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # 別のプロファイラが有効（Python 3.12 以降）: このスレッドはプロファイルしない
+            with self._lock:
+                self._skipped += 1
+                first = self._skipped == 1
+            if first:
+                logger.warning(f"このスレッドはプロファイルできないため、開始したスレッドだけをプロファイルします: {e}")
+            return
+        with self._lock:
+            self._profiles.append(profile)
+
+    def dump(self):
+        """プロファイルを終了し、結果をファイルに保存して上位の関数を表示する"""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            print("\n⚠️ プロファイルできたスレッドがないため、結果を保存しませんでした")
+            return
+        # すべてのプロファイルを止めてから結果をまとめる（開始したスレッドを先頭に）
+        for profile in profiles:
+            profile.disable()
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(self.output_path)
+
+        out = io.StringIO()
+        pstats.Stats(self.output_path, stream=out).sort_stats("cumulative").print_stats(PROFILE_PRINT_LIMIT)
+        skipped = f"、プロファイルできなかったスレッド: {self._skipped}" if self._skipped else ""
+        print(f"\nプロファイル結果を保存しました: {self.output_path}（{len(profiles)}スレッド{skipped}）")
+        print(out.getvalue())
+
+
+_profiler = None
+
+
+def start_profiling(output_path=None):
+    """
+    プロファイルを開始する
+
+    Args:
+        output_path (str, optional): 結果（.prof）の保存先
+            （Noneの場合は環境変数 PROFILE_OUTPUT、未設定ならプロファイルしない）
+
+    Returns:
+        RunProfiler: 開始したプロファイラ（プロファイルしない場合はNone）
+    """
+    global _profiler
+    output_path = output_path or os.environ.get("PROFILE_OUTPUT")
+    if not output_path:
+        return None
+    _profiler = RunProfiler(output_path)
+    _profiler.profile_current_thread()
+    return _profiler
+
+
+def profile_current_thread():
+    """プロファイル中であれば、このスレッドもプロファイルの対象にする（スレッドプールの initializer に指定する）"""
+    if _profiler is not None:
+        _profiler.profile_current_thread()
+
+
+def stop_profiling():
+    """プロファイル中であれば終了して結果を保存する"""
+    global _profiler
+    if _profiler is None:
+        return
+    profiler, _profiler = _profiler, None
+    profiler.dump()
@@ -0,0 +1,462 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+# 過負荷を受け取った後のレートの下限（1秒あたりのリクエスト数、省略時）
+# 初期値（JGRANTS_RATE_LIMIT）と上限（JGRANTS_MAX_RATE）は省略時は制限しない
+DEFAULT_MIN_RATE = 0.5
+
+# 過負荷の後、成功が続いた場合に1秒あたりに増やすリクエスト数（加算的増加）
+RATE_INCREASE_PER_SECOND = 1.0
+
+# 過負荷（429・503）の場合にレートに掛ける係数（乗算的減少）
+RATE_DECREASE_FACTOR = 0.5
+
+# その他の再試行する5xx（500・502・504）と応答の遅延の場合にレートに掛ける係数（過負荷より緩やかに下げる）
+RATE_SOFT_DECREASE_FACTOR = 0.8
+
+# 応答時間の指数移動平均がこの秒数を超えたら、APIが混雑しているものとしてレートを下げる（省略時、0の場合は使わない）
+DEFAULT_SLOW_RESPONSE_SECONDS = 5.0
+
+# 応答時間の指数移動平均で、最新の応答時間に掛ける重み
+LATENCY_EWMA_ALPHA = 0.2
+
+# APIが過負荷を示すステータスコード（Retry-After に従い、レートを下げる）
+OVERLOAD_STATUSES = frozenset({429, 503})
+
+# 制限なしで送信している間の送信レートを計測する期間（秒、最初の過負荷でこの計測値から制限を始める）
+RATE_MEASURE_WINDOW_SECONDS = 5.0
+
+# 同時に失敗した複数のリクエストで何度も減らさないよう、減少の間隔を空ける（秒）
+DECREASE_INTERVAL_SECONDS = 1.0
+
+# 再試行の回数と待ち時間（秒、省略時）
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+# Retry-After がこの秒数を超える場合は再試行しない（時間内に回復しないものとして失敗にする）
+MAX_RETRY_AFTER_SECONDS = 120.0
+
+# 再試行するステータスコード
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# サーキットブレーカーを開く連続失敗数と、開いてから試行を再開するまでの時間（秒、省略時）
+DEFAULT_BREAKER_THRESHOLD = 10
+DEFAULT_BREAKER_COOLDOWN = 60.0
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """APIの障害を検知してサーキットブレーカーが開いているため、リクエストを送信しなかった"""
+
+
+class DeadlineExceededError(requests.exceptions.RequestException):
+    """送信レートの制限・再試行の待ち時間が期限（実行の時間制限）を超えるため、リクエストを送信しなかった"""
+
+
+def check_deadline(deadline, wait=0.0):
+    """
+    待ち時間が期限までに収まるか確認する（収まらない場合は DeadlineExceededError を送出）
+
+    Args:
+        deadline (float): 期限（time.monotonic()基準、Noneの場合は制限なし）
+        wait (float): これから待つ時間（秒）
+    """
+    if deadline is not None and time.monotonic() + wait >= deadline:
+        raise DeadlineExceededError(f"期限までの残り時間（{max(0.0, deadline - time.monotonic()):.1f}秒）では{wait:.1f}秒待てません")
+
+
+def parse_retry_after(value, now=None):
+    """
+    Retry-After ヘッダー（秒数またはHTTP日付）を待ち時間（秒）に変換する
+
+    Returns:
+        float: 待ち時間（ヘッダーがない・不正な場合はNone）
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF_BASE, cap=DEFAULT_BACKOFF_MAX):
+    """
+    再試行までの待ち時間（指数バックオフ、0〜上限の一様乱数のジッター付き）
+
+    Args:
+        attempt (int): 再試行の回数（1始まり）
+    """
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class AdaptiveRateLimiter:
+    """
+    APIの過負荷・遅延に合わせて送信レートを調整するトークンバケット
+
+    すべてのスレッドで1つを共有する。初期値を指定しない場合は制限せずに送信し、
+    最初にレートを下げる時点で、直前の送信レートの計測値から制限を始める。
+    以降は成功のたびに1秒あたり RATE_INCREASE_PER_SECOND ずつ上げ、過負荷（429・503）では半分に、
+    その他の5xx（500・502・504）と応答時間の指数移動平均がしきい値を超えた場合は RATE_SOFT_DECREASE_FACTOR 倍に下げる（AIMD）。
+    接続エラー・タイムアウトではレートを下げない（障害はサーキットブレーカーで扱う）。
+    Retry-After を受け取った場合は、その時間が過ぎるまですべてのスレッドの送信を止める。
+    """
+
+    def __init__(self, rate=None, min_rate=DEFAULT_MIN_RATE, max_rate=None,
+                 slow_response=DEFAULT_SLOW_RESPONSE_SECONDS):
+        """
+        Args:
+            rate (float, optional): 1秒あたりのリクエスト数の初期値（Noneの場合は最初にレートを下げるまで制限しない）
+            min_rate (float): 過負荷で下げるレートの下限
+            max_rate (float, optional): レートの上限（Noneの場合は上限なし）
+            slow_response (float): レートを下げる応答時間の指数移動平均（秒、0の場合は応答時間では下げない）
+        """
+        self.min_rate = float(min_rate)
+        self.max_rate = None if max_rate is None else max(self.min_rate, float(max_rate))
+        self.rate = None if rate is None else self._clamp(float(rate))
+        self.slow_response = float(slow_response)
+        self.latency = None
+        self.tokens = 1.0
+        self.paused_until = 0.0
+        self._sent = deque()
+        self._updated = time.monotonic()
+        self._decreased = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_limited(self):
+        """送信レートを制限しているかどうか（最初の過負荷を受け取るまではFalse）"""
+        return self.rate is not None
+
+    def _clamp(self, rate):
+        rate = max(self.min_rate, rate)
+        return rate if self.max_rate is None else min(self.max_rate, rate)
+
+    def _refill(self, now):
+        if self.rate is None:
+            return
+        # 最大で1秒分（レートの値）までトークンを貯める
+        burst = max(1.0, self.rate)
+        self.tokens = min(burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _measured_rate(self, now):
+        """制限なしで送信している間の、直近の送信レート（1秒あたりのリクエスト数）"""
+        while self._sent and now - self._sent[0] > RATE_MEASURE_WINDOW_SECONDS:
+            self._sent.popleft()
+        if not self._sent:
+            return self.min_rate
+        return len(self._sent) / max(1.0, now - self._sent[0])
+
+    def acquire(self, deadline=None):
+        """
+        送信できるまで待ってトークンを1つ使う
+
+        Args:
+            deadline (float, optional): 期限（time.monotonic()基準）。待ち時間が期限を超える場合は待たずに失敗する
+
+        Returns:
+            float: 待った時間（秒）
+
+        Raises:
+            DeadlineExceededError: 期限までに送信できない場合
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate is None:
+                    self._sent.append(now)
+                    return now - started
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - started
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            check_deadline(deadline, wait)
+            time.sleep(wait)
+
+    def on_success(self, elapsed=None):
+        """
+        成功したレスポンスを反映する
+
+        Args:
+            elapsed (float, optional): 応答時間（秒）。指数移動平均がしきい値を超えた場合は、レートを上げずに下げる
+        """
+        with self._lock:
+            if elapsed is not None and self._observe_latency(elapsed):
+                self._decrease(time.monotonic(), RATE_SOFT_DECREASE_FACTOR)
+            elif self.rate is not None:
+                # 1件ごとに 増加量/レート ずつ上げると、1秒あたりでおよそ RATE_INCREASE_PER_SECOND 増える
+                self.rate = self._clamp(self.rate + RATE_INCREASE_PER_SECOND / self.rate)
+
+    def on_overload(self, retry_after=None):
+        """
+        過負荷（429・503）を反映してレートを半分にする
+
+        Args:
+            retry_after (float, optional): この秒数だけ送信を止める
+        """
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            self._decrease(now, RATE_DECREASE_FACTOR)
+
+    def on_server_error(self):
+        """その他の再試行する5xx（500・502・504）を反映して、過負荷より緩やかにレートを下げる"""
+        with self._lock:
+            self._decrease(time.monotonic(), RATE_SOFT_DECREASE_FACTOR)
+
+    def _observe_latency(self, elapsed):
+        """応答時間の指数移動平均を更新し、しきい値を超えているかどうかを返す"""
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_EWMA_ALPHA * (elapsed - self.latency)
+        return self.slow_response > 0 and self.latency > self.slow_response
+
+    def _decrease(self, now, factor):
+        # 同時に失敗した複数のリクエストで何度も減らさないよう、間隔を空ける
+        if now - self._decreased < DECREASE_INTERVAL_SECONDS:
+            return
+        self._decreased = now
+        if self.rate is None:
+            # 制限なしの送信でAPIが処理できた量を基準にする
+            self.rate = self._clamp(self._measured_rate(now) * factor)
+            self._sent.clear()
+            self._updated = now
+            self.tokens = 1.0
+            return
+        self._refill(now)
+        self.rate = self._clamp(self.rate * factor)
+        self.tokens = min(self.tokens, max(1.0, self.rate))
+
+
+class CircuitBreaker:
+    """
+    APIの障害を検知して、以降のリクエストを送信せずに失敗させるサーキットブレーカー
+
+    5xx・接続エラーが threshold 回続くと開き（CircuitOpenError を送出）、
+    cooldown 秒後に1件だけ試行して、成功すれば閉じる・失敗すれば再び開く。
+    429 と 4xx はAPIが応答しているため失敗として数えない。
+    """
+
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        """
+        Args:
+            threshold (int): 開くまでの連続失敗数（0以下の場合は開かない）
+            cooldown (float): 開いてから試行を再開するまでの時間（秒）
+        """
+        self.threshold = int(threshold)
+        self.cooldown = float(cooldown)
+        self.failures = 0
+        self.opened_at = None
+        self.open_count = 0
+        # 試行中のスレッドのID（試行していない場合はNone）
+        self._probing = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """開いている（試行の再開待ちを含む）かどうか"""
+        with self._lock:
+            return self.opened_at is not None
+
+    def before_request(self):
+        """リクエストを送信してよいか確認する（開いている場合は CircuitOpenError を送出）"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self._probing is None and time.monotonic() - self.opened_at >= self.cooldown:
+                # 試行の再開: 1件だけ送信し、結果で閉じるか開き直すかを決める
+                self._probing = threading.get_ident()
+                return
+        raise CircuitOpenError(f"J-Grants APIの障害を検知したため、リクエストを停止しています（連続失敗: {self.failures}回）")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            probing = self._probing is not None
+            if probing or (self.threshold > 0 and self.failures >= self.threshold and self.opened_at is None):
+                if self.opened_at is None:
+                    self.open_count += 1
+                self.opened_at = time.monotonic()
+                self._probing = None
+
+    def cancel_probe(self):
+        """
+        このスレッドの試行を、結果を得ずに取りやめる（期限切れ・送信前の例外など）
+
+        成功・失敗のどちらも記録されないまま試行中のままになると、以降のリクエストが
+        すべて CircuitOpenError になるため、次のリクエストが改めて試行できるようにする。
+        """
+        with self._lock:
+            if self._probing == threading.get_ident():
+                self._probing = None
+
+
+class RetryPolicy:
+    """
+    冪等なGETリクエストの送信レート・再試行・サーキットブレーカーをまとめたもの（JGrantsClient が使う）
+    """
+
+    def __init__(self, limiter=None, breaker=None, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX):
+        """
+        Args:
+            limiter (AdaptiveRateLimiter, optional): 送信レートの制御（Noneの場合は制限しない）
+            breaker (CircuitBreaker, optional): サーキットブレーカー（Noneの場合は使わない）
+            max_retries (int): 再試行の最大回数
+            backoff_base (float): 1回目の再試行の待ち時間の上限（秒、以降は2倍ずつ）
+            backoff_max (float): 再試行の待ち時間の上限（秒）
+        """
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+
+    @classmethod
+    def from_env(cls):
+        """
+        環境変数から設定を読み込む
+
+        - JGRANTS_RATE_LIMIT: 1秒あたりのリクエスト数の初期値（未設定・0の場合は最初の過負荷まで制限しない）
+        - JGRANTS_MIN_RATE・JGRANTS_MAX_RATE: レートの下限・上限（上限は未設定の場合は制限しない）
+        - JGRANTS_SLOW_RESPONSE_SECONDS: レートを下げる応答時間の指数移動平均（秒、0の場合は応答時間では下げない）
+        - JGRANTS_MAX_RETRIES: 再試行の最大回数
+        - JGRANTS_BACKOFF_BASE・JGRANTS_BACKOFF_MAX: 再試行の待ち時間（秒）
+        - JGRANTS_BREAKER_THRESHOLD: サーキットブレーカーを開く連続失敗数（0の場合は使わない）
+        - JGRANTS_BREAKER_COOLDOWN: サーキットブレーカーを開いてから試行を再開するまでの時間（秒）
+        """
+        env = os.environ.get
+        try:
+            rate = float(env("JGRANTS_RATE_LIMIT") or 0)
+            max_rate = float(env("JGRANTS_MAX_RATE") or 0)
+            limiter = AdaptiveRateLimiter(
+                rate=rate if rate > 0 else None,
+                min_rate=float(env("JGRANTS_MIN_RATE") or DEFAULT_MIN_RATE),
+                max_rate=max_rate if max_rate > 0 else None,
+                slow_response=float(env("JGRANTS_SLOW_RESPONSE_SECONDS") or DEFAULT_SLOW_RESPONSE_SECONDS),
+            )
+            threshold = int(env("JGRANTS_BREAKER_THRESHOLD") or DEFAULT_BREAKER_THRESHOLD)
+            breaker = None
+            if threshold > 0:
+                breaker = CircuitBreaker(threshold, float(env("JGRANTS_BREAKER_COOLDOWN") or DEFAULT_BREAKER_COOLDOWN))
+            return cls(
+                limiter=limiter,
+                breaker=breaker,
+                max_retries=int(env("JGRANTS_MAX_RETRIES") or DEFAULT_MAX_RETRIES),
+                backoff_base=float(env("JGRANTS_BACKOFF_BASE") or DEFAULT_BACKOFF_BASE),
+                backoff_max=float(env("JGRANTS_BACKOFF_MAX") or DEFAULT_BACKOFF_MAX),
+            )
+        except ValueError as e:
+            raise ValueError(f"J-Grants APIの送信レート・再試行の設定が不正です: {e}")
+
+    @property
+    def is_open(self):
+        """サーキットブレーカーが開いているかどうか"""
+        return self.breaker is not None and self.breaker.is_open
+
+    def before_request(self, deadline=None):
+        """
+        送信前の確認と待機（期限・サーキットブレーカーの確認とトークンの取得）
+
+        Args:
+            deadline (float, optional): 期限（time.monotonic()基準）
+
+        Returns:
+            float: 送信レートの制限で待った時間（秒）
+
+        Raises:
+            DeadlineExceededError: 期限を過ぎた・期限までに送信できない場合
+            CircuitOpenError: サーキットブレーカーが開いている場合
+        """
+        check_deadline(deadline)
+        if self.breaker is not None:
+            self.breaker.before_request()
+        try:
+            return self.limiter.acquire(deadline) if self.limiter is not None else 0.0
+        except BaseException:
+            self.on_abort()
+            raise
+
+    def on_abort(self):
+        """応答も接続エラーも得ずに送信を取りやめたことを反映する（サーキットブレーカーの試行を解放する）"""
+        if self.breaker is not None:
+            self.breaker.cancel_probe()
+
+    def on_response(self, status_code, retry_after=None, elapsed=None):
+        """
+        レスポンスを反映する
+
+        Args:
+            elapsed (float, optional): 応答時間（秒、送信レートの調整に使う）
+
+        Returns:
+            bool: 再試行の対象（429・5xx）の場合はTrue
+        """
+        if status_code in RETRY_STATUSES:
+            if self.limiter is not None:
+                if status_code in OVERLOAD_STATUSES:
+                    self.limiter.on_overload(retry_after)
+                else:
+                    self.limiter.on_server_error()
+            if self.breaker is not None:
+                if status_code == 429:
+                    # APIは応答しているため、障害としては数えない
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+            return True
+        if self.limiter is not None:
+            self.limiter.on_success(elapsed)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return False
+
+    def on_error(self):
+        """接続エラー・タイムアウトを反映する（送信レートは下げない）"""
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    def retry_delay(self, attempt, retry_after=None):
+        """
+        再試行までの待ち時間（秒）
+
+        Args:
+            attempt (int): 再試行の回数（1始まり）
+            retry_after (float, optional): Retry-After の秒数（これより短くは待たない）
+
+        Returns:
+            float: 待ち時間（再試行しない場合はNone）
+        """
+        if attempt > self.max_retries:
+            return None
+        if retry_after is not None and retry_after > MAX_RETRY_AFTER_SECONDS:
+            return None
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+        return max(delay, retry_after or 0.0)
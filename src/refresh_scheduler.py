@@ -0,0 +1,213 @@
+import os
+import json
+from collections import Counter
+from datetime import datetime, timezone
+
+# 受付状況の区分（優先度の高い順）
+TIER_CLOSING = "closing"    # 受付中で、締切まで closing_days 日以内
+TIER_OPEN = "open"          # 受付中（締切がないものを含む）
+TIER_UPCOMING = "upcoming"  # 受付開始前
+TIER_CLOSED = "closed"      # 受付終了
+
+TIERS = (TIER_CLOSING, TIER_OPEN, TIER_UPCOMING, TIER_CLOSED)
+
+# 区分ごとの再取得の間隔（時間）。環境変数 REFRESH_INTERVAL_HOURS（JSON）で上書きできる
+DEFAULT_REFRESH_INTERVAL_HOURS = {
+    TIER_CLOSING: 24,
+    TIER_OPEN: 72,
+    TIER_UPCOMING: 168,
+    TIER_CLOSED: 2160,
+}
+
+# 締切が近いとみなす日数（省略時）
+DEFAULT_CLOSING_DAYS = 14
+
+# 再取得の対象に付ける、再取得を決めた日時のフィールド（キューのメッセージにも含める）
+REFRESH_REQUESTED_FIELD = "refresh_requested_at"
+
+# 前回の取得からの経過時間を判定するときの余裕（秒）
+# タイマーの実行時刻のずれで、ちょうど間隔の分だけ前の取得が対象外にならないようにする
+DUE_SLACK_SECONDS = 3600
+
+
+def is_refresh_enabled():
+    """保存済みの補助金を受付状況に応じて再取得するかどうか（環境変数 REFRESH_ENABLED、既定は無効）"""
+    return os.environ.get("REFRESH_ENABLED", "0") == "1"
+
+
+def parse_iso_datetime(value):
+    """ISO 8601形式の日時（例: 2025-09-08T07:00Z）をdatetime（UTC）に変換する（不正な場合はNone）"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def is_refresh_pending(subsidy, entry):
+    """
+    再取得の対象として渡された補助金が、まだ再取得されていないかどうか
+
+    キューのメッセージが再配信された場合に、再取得を決めた日時より後に取得済みであれば処理しない。
+
+    Args:
+        subsidy (dict): 補助金一覧の1件分のデータ（REFRESH_REQUESTED_FIELD を含む場合のみ対象）
+        entry (dict): マニフェストのエントリ
+
+    Returns:
+        bool: 再取得が必要な場合はTrue
+    """
+    requested_at = parse_iso_datetime(subsidy.get(REFRESH_REQUESTED_FIELD))
+    if requested_at is None:
+        return False
+    fetched_at = parse_iso_datetime((entry or {}).get("fetched_at"))
+    return fetched_at is None or fetched_at < requested_at
+
+
+def lifecycle_tier(subsidy, now, closing_days=DEFAULT_CLOSING_DAYS):
+    """
+    一覧APIの受付期間から補助金の受付状況の区分を判定する
+
+    Args:
+        subsidy (dict): 補助金一覧の1件分のデータ
+        now (datetime): 基準日時（UTC）
+        closing_days (int): 締切が近いとみなす日数
+
+    Returns:
+        str: TIERS のいずれか
+    """
+    start = parse_iso_datetime(subsidy.get("acceptance_start_datetime"))
+    end = parse_iso_datetime(subsidy.get("acceptance_end_datetime"))
+    if end is not None and end <= now:
+        return TIER_CLOSED
+    if start is not None and start > now:
+        return TIER_UPCOMING
+    if end is not None and (end - now).total_seconds() <= closing_days * 86400:
+        return TIER_CLOSING
+    return TIER_OPEN
+
+
+def get_refresh_intervals(intervals=None):
+    """
+    区分ごとの再取得の間隔（時間）を決定する
+
+    Args:
+        intervals (dict, optional): 明示的に指定された間隔（Noneの場合は環境変数 REFRESH_INTERVAL_HOURS を参照）
+
+    Returns:
+        dict: 区分をキーとする間隔（時間、0以下の区分は再取得しない）
+    """
+    if intervals is None:
+        value = os.environ.get("REFRESH_INTERVAL_HOURS")
+        try:
+            intervals = json.loads(value) if value else {}
+        except ValueError:
+            raise ValueError(f"REFRESH_INTERVAL_HOURS がJSONとして不正です: {value}")
+    if not isinstance(intervals, dict) or any(tier not in TIERS for tier in intervals):
+        raise ValueError(f"再取得の間隔は {', '.join(TIERS)} をキーとするJSONで指定してください: {intervals}")
+    try:
+        return {tier: float(intervals.get(tier, DEFAULT_REFRESH_INTERVAL_HOURS[tier])) for tier in TIERS}
+    except (TypeError, ValueError):
+        raise ValueError(f"再取得の間隔が不正です: {intervals}")
+
+
+class RefreshScheduler:
+    """
+    受付状況に応じて、保存済みの補助金を再取得する時期と順序を決める
+
+    新規・一覧の内容が変わった補助金に加えて、前回の取得（マニフェストの fetched_at）から
+    区分ごとの間隔が経過した補助金を再取得の対象とする。
+    1回の実行で詳細APIを呼び出す件数の上限がある場合は、新規・変更を優先し、
+    残りを締切が近い → 受付中 → 受付開始前 → 受付終了の順（同じ区分では間隔を超過した割合の大きい順）に割り当てる。
+    """
+
+    def __init__(self, intervals=None, closing_days=None, max_calls=None, now=None):
+        """
+        Args:
+            intervals (dict, optional): 区分ごとの再取得の間隔（時間）
+            closing_days (int, optional): 締切が近いとみなす日数
+                （Noneの場合は環境変数 REFRESH_CLOSING_DAYS、未設定なら14）
+            max_calls (int, optional): 1回の実行で詳細APIを呼び出す件数の上限
+                （Noneの場合は環境変数 REFRESH_MAX_CALLS、未設定または0なら制限なし）
+            now (datetime, optional): 基準日時（Noneの場合は現在時刻）
+        """
+        self.intervals = get_refresh_intervals(intervals)
+        if closing_days is None:
+            closing_days = os.environ.get("REFRESH_CLOSING_DAYS", DEFAULT_CLOSING_DAYS)
+        if max_calls is None:
+            max_calls = os.environ.get("REFRESH_MAX_CALLS") or 0
+        try:
+            self.closing_days = float(closing_days)
+            self.max_calls = int(max_calls)
+        except (TypeError, ValueError):
+            raise ValueError(f"再取得の設定が不正です: closing_days={closing_days}, max_calls={max_calls}")
+        self.now = now or datetime.now(timezone.utc)
+
+    def tier(self, subsidy):
+        """補助金の受付状況の区分"""
+        return lifecycle_tier(subsidy, self.now, self.closing_days)
+
+    def overdue_ratio(self, subsidy, entry):
+        """
+        前回の取得からの経過時間と、区分の再取得の間隔の比
+
+        Returns:
+            float: 1以上なら再取得の時期（再取得しない区分・取得日時が不明な場合は0）
+        """
+        interval = self.intervals[self.tier(subsidy)] * 3600
+        fetched_at = parse_iso_datetime((entry or {}).get("fetched_at"))
+        if interval <= 0 or fetched_at is None:
+            return 0.0
+        elapsed = (self.now - fetched_at).total_seconds() + DUE_SLACK_SECONDS
+        return elapsed / interval
+
+    def plan(self, required, subsidies, manifest):
+        """
+        この実行で詳細を取得する補助金を決める
+
+        Args:
+            required (list): 必ず取得する補助金（新規・一覧の内容が変わったもの、優先順）
+            subsidies (list): 補助金一覧全体
+            manifest: SubsidyManifest
+
+        Returns:
+            dict:
+                - targets: 取得する補助金（required の後に、REFRESH_REQUESTED_FIELD を付けた再取得の対象）
+                - refresh: targets のうち再取得の対象の件数
+                - due: 再取得の時期になっている件数
+                - postponed: 上限により次回以降に回した件数
+                - tiers: 再取得の対象の区分ごとの件数
+        """
+        required_ids = {s.get("id") for s in required}
+        due = []
+        for subsidy in subsidies:
+            subsidy_id = subsidy.get("id")
+            if subsidy_id in required_ids:
+                continue
+            entry = manifest.get(subsidy_id)
+            if entry is None:
+                continue
+            ratio = self.overdue_ratio(subsidy, entry)
+            if ratio >= 1:
+                due.append((TIERS.index(self.tier(subsidy)), -ratio, subsidy))
+        due.sort(key=lambda item: item[:2])
+
+        if self.max_calls > 0:
+            kept = list(required[:self.max_calls])
+            budget = max(0, self.max_calls - len(kept))
+        else:
+            kept = list(required)
+            budget = len(due)
+        requested_at = self.now.strftime("%Y-%m-%dT%H:%M:%SZ")
+        refresh = [dict(subsidy, **{REFRESH_REQUESTED_FIELD: requested_at}) for _, _, subsidy in due[:budget]]
+        return {
+            "targets": kept + refresh,
+            "refresh": len(refresh),
+            "due": len(due),
+            "postponed": len(required) - len(kept) + len(due) - len(refresh),
+            "tiers": Counter(self.tier(subsidy) for subsidy in refresh),
+        }
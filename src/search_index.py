@@ -0,0 +1,475 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from azure.core.exceptions import ResourceNotFoundError
+from manifest import MANIFEST_BLOB_NAME
+from snapshot import iter_snapshot_lines, load_latest_pointer
+from text_index import TextIndex
+
+# 検索結果として返すフィールド（索引にはこれだけを保持する）
+SEARCH_RESULT_FIELDS = (
+    'id',
+    'name',
+    'title',
+    'subsidy_catch_phrase',
+    'target_area_search',
+    'industry',
+    'use_purpose',
+    'target_number_of_employees',
+    'subsidy_max_limit',
+    'acceptance_start_datetime',
+    'acceptance_end_datetime',
+    'updated_date',
+    'front_subsidy_detail_page_url',
+)
+
+# 全国を対象とする補助金の target_area_search の値
+NATIONWIDE_AREA = "全国"
+
+# target_area_search の複数地域の区切り
+AREA_SEPARATOR = " / "
+
+# 並べ替えに指定できるキーと、対応するフィールド
+SORT_FIELDS = {
+    "acceptance_end": "acceptance_end_datetime",
+    "acceptance_start": "acceptance_start_datetime",
+    "subsidy_max_limit": "subsidy_max_limit",
+    "updated": "updated_date",
+}
+
+DEFAULT_SORT = "acceptance_end"
+
+# 全文検索（q）のスコアの高い順に並べるキー（q を指定した場合の既定値）
+RELEVANCE_SORT = "relevance"
+
+# 1ページの件数の既定値と上限
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# マニフェストのETagを確認する間隔（秒）。この間は索引をそのまま使う
+DEFAULT_REFRESH_INTERVAL_SECONDS = 30
+
+# 検索結果をキャッシュする件数
+DEFAULT_CACHE_SIZE = 256
+
+# 「X名以下」「X名以上」「X名超」「X名未満」の形式の従業員数の条件
+_EMPLOYEES_PATTERN = re.compile(r'(\d+)\s*名(以下|以上|超|未満)')
+
+
+def parse_datetime(value):
+    """
+    J-Grants APIの日時（例: 2025-09-08T07:00Z、2025-09-08T07:00:00.000Z）をUNIX時刻に変換する
+
+    日付のみ（例: 2025-09-30）の場合はその日の0時（UTC）とする。
+
+    Returns:
+        float: UNIX時刻（値がない・不正な場合はNone）
+    """
+    if not value:
+        return None
+    text = str(value).strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_employee_range(value):
+    """
+    target_number_of_employees（例: 300名以下、901名以上、従業員数の制約なし）を範囲に変換する
+
+    Returns:
+        tuple: (下限, 上限)。制約がない場合・解釈できない場合は (None, None)
+    """
+    m = _EMPLOYEES_PATTERN.search(value or "")
+    if m is None:
+        return None, None
+    number, kind = int(m.group(1)), m.group(2)
+    if kind == "以下":
+        return None, number
+    if kind == "未満":
+        return None, number - 1
+    if kind == "以上":
+        return number, None
+    return number + 1, None
+
+
+def _int_param(params, name, default=None, minimum=None, maximum=None):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} には整数を指定してください: {value}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} には {minimum} 以上を指定してください: {value}")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{name} には {maximum} 以下を指定してください: {value}")
+    return value
+
+
+def _bool_param(params, name, default=False):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def parse_query(params):
+    """
+    検索条件（HTTPのクエリパラメータ）を検証して正規化する
+
+    Args:
+        params (dict): クエリパラメータ
+            - q: 全文検索の語（タイトル・キャッチフレーズ・本文。空白で区切った語はすべてを含むもの）
+            - area: 対象地域（例: 東京都）
+            - nationwide: 0の場合、area を指定しても全国対象の補助金を含めない（既定値: 1）
+            - open_now: 1の場合、現在受付中の補助金のみ
+            - closing_before: 受付終了日時がこの日時以前の補助金のみ（ISO 8601形式）
+            - min_amount / max_amount: 補助金上限額（subsidy_max_limit）の範囲
+            - employees: 従業員数（対象の従業員数の条件を満たす補助金のみ）
+            - sort: 並べ替えのキー（acceptance_end・acceptance_start・subsidy_max_limit・updated、
+              q を指定した場合は relevance も指定でき、既定値も relevance）
+            - order: asc または desc（既定値: asc）
+            - offset / limit: ページの開始位置と件数（limit の既定値は20、上限は100）
+
+    Returns:
+        dict: 正規化した検索条件
+
+    Raises:
+        ValueError: 条件が不正な場合
+    """
+    closing_before = params.get("closing_before") or None
+    closing_before_ts = parse_datetime(closing_before) if closing_before else None
+    if closing_before and closing_before_ts is None:
+        raise ValueError(f"closing_before にはISO 8601形式の日時を指定してください: {closing_before}")
+
+    q = (params.get("q") or "").strip() or None
+    sort = params.get("sort") or (RELEVANCE_SORT if q else DEFAULT_SORT)
+    sorts = list(SORT_FIELDS) + ([RELEVANCE_SORT] if q else [])
+    if sort not in sorts:
+        raise ValueError(f"sort には {', '.join(sorts)} のいずれかを指定してください: {sort}")
+    order = (params.get("order") or ("desc" if sort == RELEVANCE_SORT else "asc")).lower()
+    if order not in ("asc", "desc"):
+        raise ValueError(f"order には asc または desc を指定してください: {order}")
+
+    return {
+        "q": q,
+        "area": (params.get("area") or "").strip() or None,
+        "nationwide": _bool_param(params, "nationwide", default=True),
+        "open_now": _bool_param(params, "open_now"),
+        "closing_before": closing_before_ts,
+        "min_amount": _int_param(params, "min_amount", minimum=0),
+        "max_amount": _int_param(params, "max_amount", minimum=0),
+        "employees": _int_param(params, "employees", minimum=0),
+        "sort": sort,
+        "order": order,
+        "offset": _int_param(params, "offset", default=0, minimum=0),
+        "limit": _int_param(params, "limit", default=DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT),
+    }
+
+
+class SubsidyIndex:
+    """
+    スナップショットから作成した、補助金の検索用の索引
+
+    検索に使う値（日時・金額・従業員数の範囲）は読み込み時に数値に変換し、
+    地域ごとの補助金の集合と、並べ替えのキーごとの順序を事前に作成しておく。
+    全文検索（q）には text_index.TextIndex を使う。
+    作成後は変更しないため、複数のスレッドから同時に検索できる。
+    """
+
+    def __init__(self, subsidies, version=None, source=None, text_index=None):
+        """
+        Args:
+            subsidies (list): 補助金詳細（result[0]）のリスト
+            version (str, optional): 索引の版（スナップショットのハッシュなど、レスポンスのETagに使う）
+            source (str, optional): 作成元（スナップショットのBlob名）
+            text_index (TextIndex, optional): 全文検索の索引（Noneの場合はタイトル・キャッチフレーズの部分一致）
+        """
+        self.version = version
+        self.source = source
+        self.text_index = text_index
+        self.loaded_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.records = [{field: s.get(field) for field in SEARCH_RESULT_FIELDS} for s in subsidies]
+
+        self.starts = [parse_datetime(r["acceptance_start_datetime"]) for r in self.records]
+        self.ends = [parse_datetime(r["acceptance_end_datetime"]) for r in self.records]
+        self.amounts = [r["subsidy_max_limit"] if isinstance(r["subsidy_max_limit"], (int, float)) else None
+                        for r in self.records]
+        self.employee_ranges = [parse_employee_range(r["target_number_of_employees"]) for r in self.records]
+        self.positions = {r["id"]: p for p, r in enumerate(self.records)}
+
+        # 地域ごとの補助金（位置の集合）
+        self.by_area = {}
+        for position, record in enumerate(self.records):
+            for area in (record["target_area_search"] or "").split(AREA_SEPARATOR):
+                area = area.strip()
+                if area:
+                    self.by_area.setdefault(area, set()).add(position)
+
+        # 並べ替えのキーごとの昇順（値がないものは末尾）
+        sort_values = {
+            "acceptance_end": self.ends,
+            "acceptance_start": self.starts,
+            "subsidy_max_limit": self.amounts,
+            "updated": [parse_datetime(r["updated_date"]) for r in self.records],
+        }
+        self.orders = {}
+        for sort, values in sort_values.items():
+            present = sorted((p for p, v in enumerate(values) if v is not None), key=lambda p: (values[p], p))
+            missing = [p for p, v in enumerate(values) if v is None]
+            self.orders[sort] = (present, missing)
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_snapshot(cls, container_client, pointer):
+        """
+        最新のスナップショットから索引を作成する
+
+        Args:
+            container_client: ContainerClient
+            pointer (dict): スナップショットのポインタ（load_latest_pointer() の結果）
+        """
+        subsidies = []
+        for line in iter_snapshot_lines(container_client, pointer["blob"]):
+            result = json.loads(line).get("result") or []
+            if result:
+                subsidies.append(result[0])
+        return cls(subsidies, version=pointer.get("sha256"), source=pointer["blob"],
+                   text_index=TextIndex.load(container_client))
+
+    def text_scores(self, q):
+        """
+        全文検索の語を含む補助金の位置とスコア
+
+        Returns:
+            dict: 位置をキーとするスコア
+        """
+        if self.text_index is None:
+            # 索引がまだない場合は、タイトル・キャッチフレーズの部分一致（スコアは語を含むフィールドの数）
+            words = q.split()
+            scores = {}
+            for p, r in enumerate(self.records):
+                score = sum(
+                    all(w in (r[field] or "") for w in words)
+                    for field in ("title", "subsidy_catch_phrase")
+                )
+                if score:
+                    scores[p] = float(score)
+            return scores
+        return {
+            self.positions[subsidy_id]: score
+            for subsidy_id, score in self.text_index.search(q).items()
+            if subsidy_id in self.positions
+        }
+
+    def _matches(self, query, now, scores=None):
+        """検索条件を満たす補助金の位置の集合"""
+        if query["area"]:
+            candidates = set(self.by_area.get(query["area"], ()))
+            if query["nationwide"] and query["area"] != NATIONWIDE_AREA:
+                candidates |= self.by_area.get(NATIONWIDE_AREA, set())
+        else:
+            candidates = range(len(self.records))
+        if scores is not None:
+            # 全文検索の語を含むものに絞り込む
+            candidates = set(scores).intersection(candidates)
+
+        open_now = query["open_now"]
+        closing_before = query["closing_before"]
+        min_amount = query["min_amount"]
+        max_amount = query["max_amount"]
+        employees = query["employees"]
+
+        matched = set()
+        for p in candidates:
+            if open_now and not (
+                (self.starts[p] is None or self.starts[p] <= now)
+                and self.ends[p] is not None and now <= self.ends[p]
+            ):
+                continue
+            if closing_before is not None and (self.ends[p] is None or self.ends[p] > closing_before):
+                continue
+            if min_amount is not None and (self.amounts[p] is None or self.amounts[p] < min_amount):
+                continue
+            if max_amount is not None and (self.amounts[p] is None or self.amounts[p] > max_amount):
+                continue
+            if employees is not None:
+                lower, upper = self.employee_ranges[p]
+                if (lower is not None and employees < lower) or (upper is not None and employees > upper):
+                    continue
+            matched.add(p)
+        return matched
+
+    def search(self, query, now=None):
+        """
+        補助金を検索する
+
+        Args:
+            query (dict): parse_query() の結果
+            now (float, optional): 受付中の判定に使う現在時刻（UNIX時刻）
+
+        Returns:
+            dict: 検索結果（total・offset・limit・results）
+        """
+        now = time.time() if now is None else now
+        scores = self.text_scores(query["q"]) if query.get("q") else None
+        matched = self._matches(query, now, scores)
+        start, stop = query["offset"], query["offset"] + query["limit"]
+
+        if query["sort"] == RELEVANCE_SORT:
+            ranked = sorted(matched, key=lambda p: (-scores[p], p))
+            if query["order"] == "asc":
+                ranked.reverse()
+            page = [dict(self.records[p], score=round(scores[p], 4)) for p in ranked[start:stop]]
+        else:
+            present, missing = self.orders[query["sort"]]
+            ordered = reversed(present) if query["order"] == "desc" else present
+            page = []
+            index = 0
+            for positions in (ordered, missing):
+                for p in positions:
+                    if p not in matched:
+                        continue
+                    if index >= start:
+                        page.append(dict(self.records[p], score=round(scores[p], 4)) if scores else self.records[p])
+                    index += 1
+                    if index >= stop:
+                        break
+                if index >= stop:
+                    break
+
+        return {
+            "total": len(matched),
+            "offset": query["offset"],
+            "limit": query["limit"],
+            "results": page,
+        }
+
+
+class SearchService:
+    """
+    検索APIの処理（Functionsのインスタンスごとに1つ）
+
+    初回の検索時に最新のスナップショットから索引を作成し、以降はメモリ上の索引で検索する。
+    refresh_interval 秒ごとにマニフェストのETagを確認し、変わっていれば
+    スナップショットのポインタを読み直して、新しいスナップショットであれば索引を作り直す。
+    同じ条件の検索結果は索引の版ごとにキャッシュする。
+    """
+
+    def __init__(self, container_client_factory, refresh_interval=None, cache_size=None):
+        """
+        Args:
+            container_client_factory: 補助金データのコンテナの ContainerClient を返す関数
+            refresh_interval (float, optional): マニフェストのETagを確認する間隔（秒）
+                （Noneの場合は環境変数 SEARCH_REFRESH_INTERVAL_SECONDS、未設定なら30）
+            cache_size (int, optional): キャッシュする検索結果の件数
+                （Noneの場合は環境変数 SEARCH_CACHE_SIZE、未設定なら256）
+        """
+        if refresh_interval is None:
+            refresh_interval = os.environ.get("SEARCH_REFRESH_INTERVAL_SECONDS", DEFAULT_REFRESH_INTERVAL_SECONDS)
+        if cache_size is None:
+            cache_size = os.environ.get("SEARCH_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+        self.refresh_interval = float(refresh_interval)
+        self.cache_size = int(cache_size)
+        self._container_client_factory = container_client_factory
+        self._container_client = None
+        self._index = None
+        self._manifest_etag = None
+        self._checked_at = None
+        self._refresh_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _get_container_client(self):
+        if self._container_client is None:
+            self._container_client = self._container_client_factory()
+        return self._container_client
+
+    def _manifest_etag_now(self, container_client):
+        try:
+            return container_client.get_blob_client(MANIFEST_BLOB_NAME).get_blob_properties().etag
+        except ResourceNotFoundError:
+            return None
+
+    def get_index(self):
+        """
+        索引を返す（確認の間隔が過ぎていれば、マニフェストのETagを確認して必要に応じて作り直す）
+
+        Returns:
+            SubsidyIndex: 索引（スナップショットがまだない場合はNone）
+        """
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.refresh_interval:
+            return self._index
+
+        with self._refresh_lock:
+            # 他のスレッドが確認を終えていればその結果を使う
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._index
+            container_client = self._get_container_client()
+            etag = self._manifest_etag_now(container_client)
+            if self._index is None or etag != self._manifest_etag:
+                pointer = load_latest_pointer(container_client)
+                if pointer and (self._index is None or pointer.get("sha256") != self._index.version):
+                    started = time.perf_counter()
+                    self._index = SubsidyIndex.from_snapshot(container_client, pointer)
+                    with self._cache_lock:
+                        self._cache.clear()
+                    print(f"検索用の索引を作成しました: {pointer['blob']}（{len(self._index)}件、"
+                          f"{(time.perf_counter() - started) * 1000:.0f} ms）")
+                # スナップショットの作成はマニフェストの保存より後のため、
+                # 新しいスナップショットを読み込めた場合のみETagを記録する（それまでは毎回確認する）
+                if self._index is not None and pointer and pointer.get("sha256") == self._index.version:
+                    self._manifest_etag = etag
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def search(self, params, now=None):
+        """
+        検索条件で補助金を検索する
+
+        Args:
+            params (dict): クエリパラメータ（parse_query() を参照）
+            now (float, optional): 受付中の判定に使う現在時刻（UNIX時刻）
+
+        Returns:
+            dict: 検索結果（索引がまだない場合はNone）
+
+        Raises:
+            ValueError: 検索条件が不正な場合
+        """
+        query = parse_query(params)
+        index = self.get_index()
+        if index is None:
+            return None
+
+        now = time.time() if now is None else now
+        # 受付中の判定は分単位でキャッシュする
+        key = (index.version, tuple(sorted(query.items())), int(now // 60) if query["open_now"] else None)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        result = index.search(query, now)
+        result["index"] = {"version": index.version, "source": index.source, "loaded_at": index.loaded_at}
+        with self._cache_lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
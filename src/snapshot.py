@@ -0,0 +1,198 @@
+import gzip
+import json
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+from blob_codec import GZIP_MAGIC, dumps_compact, load_subsidy_from_blob
+from manifest import utc_now_iso
+
+# スナップショット（全件をまとめたNDJSON.gz）のBlobの接頭辞
+SNAPSHOT_PREFIX = "_snapshots/"
+
+# 最新のスナップショットを指すポインタのBlob名
+LATEST_POINTER_BLOB_NAME = f"{SNAPSHOT_PREFIX}latest.json"
+
+# スナップショットはgzipのまま保存する（Content-Encoding は設定しない）
+# Content-Encoding: gzip を設定すると、SDKがダウンロード時に展開し、範囲ごとの並列ダウンロードでは展開できなくなる
+SNAPSHOT_CONTENT_TYPE = "application/gzip"
+
+# 作成中のスナップショットをメモリに置く上限（超えた分は一時ファイルに書き出す）
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+def snapshot_blob_name(now=None):
+    """実行日時からスナップショットのBlob名を決める"""
+    now = now or datetime.now(timezone.utc)
+    return f"{SNAPSHOT_PREFIX}subsidies_{now.strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
+
+
+def line_subsidy_id(line):
+    """スナップショットの1行（{id}.json と同じ内容）から補助金IDを取得する"""
+    data = json.loads(line)
+    result = data.get("result") or [{}]
+    return result[0].get("id")
+
+
+def load_latest_pointer(container_client):
+    """
+    最新のスナップショットのポインタを読み込む
+
+    Returns:
+        dict: ポインタ（blob・created_at・count・sha256）。存在しない場合はNone
+    """
+    try:
+        payload = container_client.get_blob_client(LATEST_POINTER_BLOB_NAME).download_blob().readall()
+    except ResourceNotFoundError:
+        return None
+    return json.loads(payload)
+
+
+def iter_snapshot_lines(container_client, blob_name):
+    """
+    スナップショットを先頭から順に読み込み、1行ずつ返す
+
+    Args:
+        container_client: ContainerClient
+        blob_name (str): スナップショットのBlob名
+
+    Yields:
+        bytes: 1件分のJSON（改行なし）
+    """
+    with tempfile.TemporaryFile() as f:
+        container_client.get_blob_client(blob_name).download_blob().readinto(f)
+        f.seek(0)
+        # 以前の形式（Content-Encoding: gzip）のスナップショットは、SDKが展開したNDJSONのまま届く
+        compressed = f.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+        f.seek(0)
+        with (gzip.GzipFile(fileobj=f, mode='rb') if compressed else f) as lines:
+            for line in lines:
+                line = line.rstrip(b'\n')
+                if line:
+                    yield line
+
+
+def is_snapshot_stale(container_client, manifest, changed_lines):
+    """
+    スナップショットの作成が必要かどうか
+
+    この実行で保存した補助金がある場合、スナップショットが存在しない場合、
+    件数がマニフェストと一致しない場合に作成が必要と判定する。
+    """
+    if changed_lines:
+        return True
+    pointer = load_latest_pointer(container_client)
+    return pointer is None or pointer.get("count") != len(manifest.ids())
+
+
+def load_lines(container_client, subsidy_ids):
+    """
+    補助金の内容を個別のBlobから読み込む
+
+    キューで分散実行した場合など、保存した内容（changed_lines）が手元にないときに、
+    キュートリガーの関数が保存した補助金だけを読み込むために使う。
+
+    Args:
+        container_client: ContainerClient
+        subsidy_ids (iterable): 補助金ID
+
+    Returns:
+        dict: 補助金IDをキーとする内容（空白なしのJSON）
+    """
+    lines = {}
+    for subsidy_id in sorted(subsidy_ids):
+        blob_client = container_client.get_blob_client(f"{subsidy_id}.json")
+        try:
+            lines[subsidy_id] = dumps_compact(load_subsidy_from_blob(blob_client))
+        except ResourceNotFoundError:
+            print(f"  ⚠️  スナップショット作成時にBlobが見つかりません: {subsidy_id}")
+    return lines
+
+
+def build_snapshot(container_client, manifest, changed_lines, now=None):
+    """
+    マニフェストに登録された全件をまとめたスナップショットを作成し、ポインタを更新する
+
+    前回のスナップショットを1回読み込み、変更のない補助金はその行をそのまま再利用する。
+    この実行で保存した補助金は changed_lines の内容に置き換え、
+    前回のスナップショットにない補助金のみ個別のBlobから読み込む。
+
+    Args:
+        container_client: ContainerClient
+        manifest: SubsidyManifest
+        changed_lines (dict): 補助金IDをキーとする、この実行で保存した内容（空白なしのJSON）
+        now (datetime, optional): スナップショットの作成日時
+
+    Returns:
+        dict: 更新後のポインタ
+    """
+    ids = manifest.ids()
+    lines = {}
+
+    # 1. 前回のスナップショットから、変更のない補助金の行を再利用
+    pointer = load_latest_pointer(container_client)
+    reused_count = 0
+    if pointer:
+        try:
+            for line in iter_snapshot_lines(container_client, pointer["blob"]):
+                subsidy_id = line_subsidy_id(line)
+                if subsidy_id in ids and subsidy_id not in changed_lines:
+                    lines[subsidy_id] = line
+                    reused_count += 1
+        except ResourceNotFoundError:
+            print(f"前回のスナップショットが見つかりません: {pointer['blob']}")
+            lines = {}
+            reused_count = 0
+
+    # 2. この実行で保存した補助金の行
+    for subsidy_id, line in changed_lines.items():
+        if subsidy_id in ids:
+            lines[subsidy_id] = line
+
+    # 3. どちらにもない補助金は個別のBlobから読み込む（初回作成時など）
+    missing_ids = sorted(ids - set(lines))
+    for subsidy_id in missing_ids:
+        blob_client = container_client.get_blob_client(f"{subsidy_id}.json")
+        try:
+            lines[subsidy_id] = dumps_compact(load_subsidy_from_blob(blob_client))
+        except ResourceNotFoundError:
+            print(f"  ⚠️  スナップショット作成時にBlobが見つかりません: {subsidy_id}")
+
+    # 4. ID順に書き出して圧縮し、アップロード
+    blob_name = snapshot_blob_name(now)
+    digest = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as f:
+        with gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+            for subsidy_id in sorted(lines):
+                gz.write(lines[subsidy_id])
+                gz.write(b'\n')
+        size = f.tell()
+        f.seek(0)
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+        f.seek(0)
+        container_client.get_blob_client(blob_name).upload_blob(
+            f,
+            length=size,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=SNAPSHOT_CONTENT_TYPE),
+        )
+
+    # 5. ポインタを更新（スナップショットのアップロード完了後）
+    new_pointer = {
+        "blob": blob_name,
+        "created_at": utc_now_iso(),
+        "count": len(lines),
+        "size": size,
+        "sha256": digest.hexdigest(),
+    }
+    container_client.get_blob_client(LATEST_POINTER_BLOB_NAME).upload_blob(
+        json.dumps(new_pointer, ensure_ascii=False).encode('utf-8'),
+        overwrite=True,
+        content_settings=ContentSettings(content_type="application/json; charset=utf-8"),
+    )
+
+    print(f"スナップショットを作成しました: {blob_name}")
+    print(f"   件数: {len(lines)}件（再利用: {reused_count}件 / 今回保存: {len(changed_lines)}件 / 個別読み込み: {len(missing_ids)}件）")
+    return new_pointer
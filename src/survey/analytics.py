@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+補助金一覧のスナップショット（subsidies_*.json）の集計
+
+1つのファイルまたはディレクトリ内の日付ごとのスナップショットを読み込み、
+指定した集計（月別件数・対象地域ごとの件数・締切までの期間・上限額の分布など）をまとめて実行する。
+各スナップショットは subsidy_table で1回だけ読み込み、行ごとの1回のループで登録したすべての集計に渡す。
+複数のスナップショットはプロセスを分けて並列に処理する。
+
+    python src/survey/analytics.py output/                                  ディレクトリ内の全スナップショット
+    python src/survey/analytics.py output/subsidies_20251216_111354.json    1つのスナップショット
+    python src/survey/analytics.py output/archive/                          アーカイブ（snapshot_archive.py）の全スナップショット
+    python src/survey/analytics.py output/ --areas 富山県,東京都 --aggregators area,deadline
+    python src/survey/analytics.py output/ --output output/analytics.json   結果をJSONで保存
+
+集計の追加は、Aggregator を継承したクラスに @register_aggregator("名前") を付けて定義する。
+"""
+import os
+import re
+import sys
+import json
+import glob
+import time
+import argparse
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# 同じディレクトリの subsidy_table.py と、srcディレクトリの metrics.py を読み込むため、パスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from subsidy_table import MISSING, SubsidyTable, load_table
+from snapshot_archive import SnapshotArchive
+from metrics import percentile
+
+# スナップショットのファイル名（subsidies_YYYYMMDD_HHMMSS.json）
+SNAPSHOT_PATTERN = re.compile(r'subsidies_(\d{8})_(\d{6})\.json$')
+
+# 全国を対象とする補助金の target_area_search の値
+NATIONWIDE_AREA = "全国"
+
+# area の結果で、指定した地域のうち全国も対象とする件数のキー（(地域, WITH_NATIONWIDE)）
+WITH_NATIONWIDE = "with_national"
+
+# 締切までの期間の区分（日数の上限と表示名）
+DEADLINE_BUCKETS = ((7, "7日以内"), (30, "30日以内"), (90, "90日以内"))
+
+# 補助金上限額の区分（上限と表示名）
+AMOUNT_BUCKETS = (
+    (1_000_000, "100万円未満"),
+    (10_000_000, "1000万円未満"),
+    (100_000_000, "1億円未満"),
+)
+
+# 既定で実行する集計
+DEFAULT_AGGREGATORS = ("monthly", "area", "deadline", "amount")
+
+AGGREGATORS = {}
+
+
+def register_aggregator(name):
+    """集計のクラスを名前で登録するデコレータ"""
+    def decorator(cls):
+        cls.name = name
+        AGGREGATORS[name] = cls
+        return cls
+    return decorator
+
+
+def format_label(label):
+    """結果のキーを表示名にする（(地域, WITH_NATIONWIDE) は「地域（全国も対象）」）"""
+    if isinstance(label, tuple):
+        target, kind = label
+        if kind == WITH_NATIONWIDE:
+            return f"{target}（全国も対象）"
+        return f"{target}（{kind}）"
+    return label
+
+
+class Aggregator:
+    """
+    集計の基底クラス
+
+    begin() で1つのスナップショットの表を受け取り、add() で行ごとに数え、end() で表の集計を終える。
+    result() で結果を返す。結果はプロセス間で受け渡すため、表示名または (地域, 区分) のタプルを
+    キーとする件数などの辞書とする（表示・保存の際は format_label() で表示名にする）。
+    """
+
+    name = None
+    # 複数のスナップショットの表示名をまとめるときに並べ替えるかどうか
+    sort_labels = False
+
+    def __init__(self, snapshot_at=None):
+        """
+        Args:
+            snapshot_at (int, optional): スナップショットの取得日時（UNIX時刻、締切の判定などの基準）
+        """
+        self.snapshot_at = snapshot_at
+
+    def begin(self, table):
+        """表の集計を始める（列の取り出しなど）"""
+
+    def add(self, row):
+        """行を数える"""
+        raise NotImplementedError
+
+    def end(self):
+        """表の集計を終える（行ごとにまとめた値の変換など）"""
+
+    def consume(self, table):
+        """1つの集計だけを表に対して実行する（複数の集計は consume_all() で1回のループにまとめる）"""
+        consume_all(table, [self])
+
+    def result(self):
+        raise NotImplementedError
+
+
+def consume_all(table, aggregators):
+    """表の行を1回だけ走査し、各行をすべての集計に渡す"""
+    for aggregator in aggregators:
+        aggregator.begin(table)
+    adds = [aggregator.add for aggregator in aggregators]
+    for row in range(len(table)):
+        for add in adds:
+            add(row)
+    for aggregator in aggregators:
+        aggregator.end()
+
+
+@register_aggregator("monthly")
+class MonthlyCounts(Aggregator):
+    """日時の列（既定では募集開始日時）の月別件数"""
+
+    sort_labels = True
+
+    def __init__(self, snapshot_at=None, column="acceptance_start_datetime"):
+        super().__init__(snapshot_at)
+        self.column = column
+        self.counts = Counter()
+
+    def begin(self, table):
+        self._values = table.numbers[self.column]
+        # 同じ日の値は月も同じため、日単位にまとめてから変換する
+        self._days = Counter()
+
+    def add(self, row):
+        value = self._values[row]
+        if value != MISSING:
+            self._days[value // 86400] += 1
+
+    def end(self):
+        for day, count in self._days.items():
+            self.counts[time.strftime("%Y-%m", time.gmtime(day * 86400))] += count
+        self._values = self._days = None
+
+    def result(self):
+        return dict(sorted(self.counts.items()))
+
+
+@register_aggregator("area")
+class AreaCounts(Aggregator):
+    """
+    対象地域ごとの件数
+
+    areas を指定した場合はその地域（部分一致、例: 富山 → 富山県）を対象とする補助金の件数と、
+    そのうち全国も対象とする件数（キーは (地域, WITH_NATIONWIDE)）を数える。
+    指定しない場合はすべての地域の件数を数える。
+    """
+
+    def __init__(self, snapshot_at=None, areas=None, samples=0):
+        """
+        Args:
+            areas (list, optional): 集計する地域
+            samples (int): 地域ごとに結果に含める補助金の例の件数
+        """
+        super().__init__(snapshot_at)
+        self.areas = list(areas) if areas else None
+        self.samples = samples
+        self.counts = Counter()
+        self.examples = {}
+
+    def begin(self, table):
+        self._table = table
+        self._codes = table.codes["target_area_search"]
+        self._area_sets = table.area_sets()
+        # 地域の値ごとにまとめて、表の終わりに判定する（行ごとに文字列を調べない）
+        self._code_counts = Counter()
+        self._matches = {}
+
+    def _targets(self, code):
+        """地域の値の番号に該当する、指定した地域のリスト（番号ごとに1回だけ判定する）"""
+        targets = self._matches.get(code)
+        if targets is None:
+            areas = self._area_sets[code]
+            targets = [target for target in self.areas if any(target in area for area in areas)]
+            self._matches[code] = targets
+        return targets
+
+    def add(self, row):
+        code = self._codes[row]
+        self._code_counts[code] += 1
+        if self.samples and self.areas:
+            for target in self._targets(code):
+                examples = self.examples.setdefault(target, [])
+                if len(examples) < self.samples:
+                    examples.append({
+                        "id": self._table.value("id", row),
+                        "title": self._table.value("title", row),
+                        "target_area_search": self._table.value("target_area_search", row),
+                    })
+
+    def end(self):
+        for code, count in self._code_counts.items():
+            areas = self._area_sets[code]
+            if self.areas is None:
+                for area in areas:
+                    self.counts[area] += count
+                continue
+            nationwide = NATIONWIDE_AREA in areas
+            if nationwide:
+                self.counts[NATIONWIDE_AREA] += count
+            for target in self._targets(code):
+                if target != NATIONWIDE_AREA:
+                    self.counts[target] += count
+                    if nationwide:
+                        self.counts[(target, WITH_NATIONWIDE)] += count
+        self._table = self._codes = self._area_sets = self._code_counts = self._matches = None
+
+    def result(self):
+        if self.areas is None:
+            return dict(self.counts.most_common())
+        labels = [NATIONWIDE_AREA] + [
+            label for target in self.areas if target != NATIONWIDE_AREA
+            for label in (target, (target, WITH_NATIONWIDE))
+        ]
+        return {label: self.counts.get(label, 0) for label in labels}
+
+
+@register_aggregator("deadline")
+class DeadlineBuckets(Aggregator):
+    """スナップショットの取得日時から募集終了日時までの期間の区分ごとの件数"""
+
+    def __init__(self, snapshot_at=None):
+        super().__init__(snapshot_at)
+        self.counts = Counter()
+
+    def begin(self, table):
+        self._ends = table.numbers["acceptance_end_datetime"]
+        self._limits = [self.snapshot_at + days * 86400 for days, _ in DEADLINE_BUCKETS]
+        self._labels = [label for _, label in DEADLINE_BUCKETS] + ["それ以降"]
+
+    def add(self, row):
+        end = self._ends[row]
+        if end == MISSING:
+            self.counts["締切なし"] += 1
+        elif end <= self.snapshot_at:
+            self.counts["終了済み"] += 1
+        else:
+            self.counts[self._labels[bisect_right(self._limits, end - 1)]] += 1
+
+    def result(self):
+        labels = ["終了済み"] + [label for _, label in DEADLINE_BUCKETS] + ["それ以降", "締切なし"]
+        return {label: self.counts.get(label, 0) for label in labels}
+
+
+@register_aggregator("amount")
+class AmountDistribution(Aggregator):
+    """補助金上限額（subsidy_max_limit）の区分ごとの件数と百分位数"""
+
+    def __init__(self, snapshot_at=None):
+        super().__init__(snapshot_at)
+        self.counts = Counter()
+        self.amounts = []
+
+    def begin(self, table):
+        self._amounts = table.numbers["subsidy_max_limit"]
+        self._bounds = [bound for bound, _ in AMOUNT_BUCKETS]
+        self._labels = [label for _, label in AMOUNT_BUCKETS] + ["1億円以上"]
+
+    def add(self, row):
+        amount = self._amounts[row]
+        if amount == MISSING or amount <= 0:
+            self.counts["記載なし"] += 1
+            return
+        self.amounts.append(amount)
+        self.counts[self._labels[bisect_right(self._bounds, amount)]] += 1
+
+    def result(self):
+        labels = ["記載なし"] + [label for _, label in AMOUNT_BUCKETS] + ["1億円以上"]
+        result = {label: self.counts.get(label, 0) for label in labels}
+        ordered = sorted(self.amounts)
+        for p in (50, 90):
+            if ordered:
+                result[f"p{p}（円）"] = percentile(ordered, p)
+        return result
+
+
+def stamp_time(stamp):
+    """スナップショットの日時（YYYYMMDD_HHMMSS、日本時間）をUNIX時刻に変換する"""
+    parsed = datetime.strptime(stamp, "%Y%m%d_%H%M%S")
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp()) - 9 * 3600
+
+
+def snapshot_time(json_path):
+    """スナップショットの取得日時（ファイル名の日時、ない場合はファイルの更新日時）"""
+    m = SNAPSHOT_PATTERN.search(os.path.basename(json_path))
+    if m:
+        return stamp_time(f"{m.group(1)}_{m.group(2)}")
+    return int(os.path.getmtime(json_path))
+
+
+def snapshot_paths(path):
+    """ファイルまたはディレクトリから、取得日時の順にスナップショットのパスを返す"""
+    if os.path.isdir(path) and SnapshotArchive.is_archive(path):
+        return [path]
+    if os.path.isdir(path):
+        paths = [p for p in glob.glob(os.path.join(path, "subsidies_*.json")) if SNAPSHOT_PATTERN.search(p)]
+    else:
+        paths = [path]
+    return sorted(paths, key=snapshot_time)
+
+
+def analyze_snapshot(json_path, specs):
+    """
+    1つのスナップショットを読み込み、すべての集計を実行する（プロセスプールから呼び出す）
+
+    Args:
+        json_path (str): スナップショットのパス
+        specs (list): (集計の名前, 引数の辞書) のリスト
+
+    Returns:
+        dict: file・snapshot_at・rows・results（集計の名前をキーとする結果）
+    """
+    return analyze_table(load_table(json_path), snapshot_time(json_path), json_path, specs)
+
+
+def analyze_table(table, snapshot_at, source, specs):
+    """表に対してすべての集計を実行する（行の走査は1回）"""
+    aggregators = [AGGREGATORS[name](snapshot_at=snapshot_at, **kwargs) for name, kwargs in specs]
+    consume_all(table, aggregators)
+    return {
+        "file": source,
+        "snapshot_at": datetime.fromtimestamp(snapshot_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "rows": len(table),
+        "results": {aggregator.name: aggregator.result() for aggregator in aggregators},
+    }
+
+
+def analyze_archive_segment(archive_path, stamps, specs):
+    """
+    アーカイブの1区間（キーフレームとその後の差分）を順に復元し、スナップショットごとに集計を実行する
+    （プロセスプールから呼び出す）
+
+    Returns:
+        list: analyze_snapshot() と同じ形式の結果（stamps の順）
+    """
+    archive = SnapshotArchive(archive_path)
+    return [
+        analyze_table(SubsidyTable.from_subsidies(data["result"]), stamp_time(stamp), f"{archive_path}@{stamp}", specs)
+        for stamp, data in archive.iter_range(stamps[0], stamps[-1])
+    ]
+
+
+def run_analytics(paths, specs, max_workers=None):
+    """
+    スナップショットごとに集計を実行する（複数の場合はプロセスを分けて並列に実行）
+
+    Args:
+        paths (list): スナップショットのパス（アーカイブのディレクトリの場合は全スナップショット）
+        specs (list): (集計の名前, 引数の辞書) のリスト
+        max_workers (int, optional): 同時に実行するプロセス数（Noneの場合はCPU数）
+
+    Returns:
+        list: analyze_snapshot() の結果（paths の順）
+    """
+    for name, _ in specs:
+        if name not in AGGREGATORS:
+            raise ValueError(f"集計の名前が不正です: {name}（{', '.join(AGGREGATORS)} のいずれか）")
+
+    # アーカイブはキーフレームごとの区間を1つの処理単位とする
+    tasks = []
+    for path in paths:
+        if os.path.isdir(path) and SnapshotArchive.is_archive(path):
+            tasks.extend((analyze_archive_segment, (path, stamps, specs))
+                         for stamps in SnapshotArchive(path).segments())
+        else:
+            tasks.append((analyze_snapshot, (path, specs)))
+
+    if len(tasks) <= 1 or max_workers == 1:
+        outputs = [function(*args) for function, args in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(function, *args) for function, args in tasks]
+            outputs = [future.result() for future in futures]
+
+    snapshots = []
+    for (function, _), output in zip(tasks, outputs):
+        if function is analyze_archive_segment:
+            snapshots.extend(output)
+        else:
+            snapshots.append(output)
+    return snapshots
+
+
+def print_report(snapshots):
+    """集計ごとに、表示名を行・スナップショットを列とする表を表示する"""
+    if not snapshots:
+        print("スナップショットがありません")
+        return
+    headers = [s["snapshot_at"][:10] for s in snapshots]
+    print("=" * 80)
+    print(f"📊 補助金一覧の集計（{len(snapshots)}件のスナップショット）")
+    print("=" * 80)
+    print("  " + " / ".join(f"{h}: {s['rows']}件" for h, s in zip(headers, snapshots)))
+    for name in snapshots[0]["results"]:
+        labels = []
+        for snapshot in snapshots:
+            for label in snapshot["results"][name]:
+                if label not in labels:
+                    labels.append(label)
+        if AGGREGATORS[name].sort_labels:
+            labels.sort()
+        print(f"\n【{name}】")
+        print(f"  {'':<24}" + "".join(f"{h:>14}" for h in headers))
+        for label in labels:
+            values = [snapshot["results"][name].get(label, 0) for snapshot in snapshots]
+            print(f"  {format_label(label):<24}" + "".join(f"{v:>14,}" for v in values))
+    print("=" * 80)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="補助金一覧のスナップショットの集計")
+    parser.add_argument("path", nargs="?", default="output", help="スナップショットのファイルまたはディレクトリ")
+    parser.add_argument("--aggregators", default=",".join(DEFAULT_AGGREGATORS),
+                        help=f"実行する集計（カンマ区切り: {', '.join(AGGREGATORS)}）")
+    parser.add_argument("--areas", help="area で集計する地域（カンマ区切り、省略時はすべての地域）")
+    parser.add_argument("--workers", type=int, help="同時に実行するプロセス数（省略時はCPU数）")
+    parser.add_argument("--output", help="結果を保存するJSONファイル")
+    args = parser.parse_args(argv)
+
+    specs = []
+    for name in [n.strip() for n in args.aggregators.split(",") if n.strip()]:
+        kwargs = {}
+        if name == "area" and args.areas:
+            kwargs["areas"] = [a.strip() for a in args.areas.split(",") if a.strip()]
+        specs.append((name, kwargs))
+
+    paths = snapshot_paths(args.path)
+    try:
+        snapshots = run_analytics(paths, specs, max_workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print_report(snapshots)
+    if args.output:
+        # JSONのキーは文字列に限られるため、(地域, 区分) のキーは表示名にする
+        for snapshot in snapshots:
+            snapshot["results"] = {
+                name: {format_label(label): value for label, value in result.items()}
+                for name, result in snapshot["results"].items()
+            }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(snapshots, f, ensure_ascii=False, indent=2)
+        print(f"✅ 結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
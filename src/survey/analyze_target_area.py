@@ -1,59 +1,48 @@
 import json
+import os
 import sys
 
-def analyze_target_area(json_file):
+# 同じディレクトリの analytics.py を読み込むため、このディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from analytics import NATIONWIDE_AREA, WITH_NATIONWIDE, AreaCounts
+from subsidy_table import load_table
+
+# 地域を指定しない場合の集計対象
+DEFAULT_AREAS = ["富山"]
+
+def analyze_target_area(json_file, areas=None):
     """
-    JSONファイルから全国と富山が対象の補助金件数を集計
+    JSONファイルから全国と指定した地域（部分一致、省略時は富山）が対象の補助金件数を集計
+
+    集計は analytics.AreaCounts を使う
     """
+    areas = [a for a in (areas or DEFAULT_AREAS) if a != NATIONWIDE_AREA]
     try:
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        subsidies = data.get("result", [])
-        total_count = len(subsidies)
-        
-        # 全国対象の件数
-        zenkoku_count = 0
-        # 富山県対象の件数
-        toyama_count = 0
-        # 両方に該当する件数
-        both_count = 0
-        
-        for subsidy in subsidies:
-            target_area = subsidy.get("target_area_search", "")
-            
-            # target_area_searchがNoneの場合は空文字列に変換
-            if target_area is None:
-                target_area = ""
-            
-            is_zenkoku = "全国" in target_area
-            is_toyama = "富山" in target_area
-            
-            if is_zenkoku:
-                zenkoku_count += 1
-            if is_toyama:
-                toyama_count += 1
-            if is_zenkoku and is_toyama:
-                both_count += 1
-        
+        table = load_table(json_file)
+        aggregator = AreaCounts(areas=areas, samples=5)
+        aggregator.consume(table)
+        counts = aggregator.result()
+
         print("=" * 50)
         print(f"📊 対象地域の集計結果（ファイル: {json_file}）")
         print("=" * 50)
-        print(f"総件数: {total_count}件")
+        print(f"総件数: {len(table)}件")
         print(f"")
-        print(f"🌏 全国が対象: {zenkoku_count}件")
-        print(f"🏔️  富山が対象: {toyama_count}件")
-        print(f"🔄 両方に該当: {both_count}件")
+        print(f"🌏 全国が対象: {counts[NATIONWIDE_AREA]}件")
+        for area in areas:
+            print(f"🏔️  {area}が対象: {counts[area]}件")
+            print(f"🔄 {area}と全国の両方に該当: {counts[(area, WITH_NATIONWIDE)]}件")
         print("=" * 50)
-        
-        # サンプル表示（富山が対象のもの）
-        print(f"\n【富山が対象の補助金サンプル（最初の5件）】")
-        toyama_samples = [s for s in subsidies if s.get("target_area_search") and "富山" in s.get("target_area_search", "")]
-        for i, subsidy in enumerate(toyama_samples[:5], 1):
-            print(f"{i}. {subsidy.get('title', 'タイトルなし')}")
-            print(f"   対象地域: {subsidy.get('target_area_search', 'N/A')}")
-            print()
-        
+
+        # サンプル表示（指定した地域が対象のもの）
+        for area in areas:
+            print(f"\n【{area}が対象の補助金サンプル（最初の5件）】")
+            for i, subsidy in enumerate(aggregator.examples.get(area, []), 1):
+                print(f"{i}. {subsidy['title'] or 'タイトルなし'}")
+                print(f"   対象地域: {subsidy['target_area_search'] or 'N/A'}")
+                print()
+
     except FileNotFoundError:
         print(f"❌ ファイルが見つかりません: {json_file}")
     except json.JSONDecodeError:
@@ -63,10 +52,11 @@ def analyze_target_area(json_file):
 
 
 if __name__ == "__main__":
-    # コマンドライン引数でファイル名を指定、なければ最新のファイルを使用
+    # コマンドライン引数でファイル名と地域を指定、なければ最新のファイルと富山を使用
+    # 例: python analyze_target_area.py subsidies_20251216_111354.json 富山 東京
     if len(sys.argv) > 1:
         json_file = sys.argv[1]
     else:
         json_file = "subsidies_20251216_111354.json"
-    
-    analyze_target_area(json_file)
+
+    analyze_target_area(json_file, sys.argv[2:])
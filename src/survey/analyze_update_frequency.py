@@ -1,80 +1,60 @@
 import json
+import os
 import sys
-from datetime import datetime
-from collections import Counter
+import time
+
+# 同じディレクトリの subsidy_table.py を読み込むため、このディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from subsidy_table import TIMESTAMP_COLUMNS, format_timestamp, load_table
+
+# 1日の秒数
+SECONDS_PER_DAY = 86400
 
 def analyze_update_frequency(json_file):
     """
     JSONファイルから補助金の更新頻度を分析
+
+    日時は subsidy_table で1回だけ解析したUNIX時刻（UTC）を使う
+    （2回目以降は {json_file}.table のキャッシュから読み込む）
     """
     try:
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        subsidies = data.get("result", [])
-        total_count = len(subsidies)
+        table = load_table(json_file)
+        total_count = len(table)
         
         print("=" * 60)
         print(f"📅 補助金データの更新頻度分析（ファイル: {json_file}）")
         print("=" * 60)
         print(f"総件数: {total_count}件\n")
         
-        # 日付フィールドを確認
-        created_dates = []
-        updated_dates = []
-        acceptance_start_dates = []
-        acceptance_end_dates = []
-        
         # サンプルデータの構造を確認
-        if subsidies:
+        if total_count:
             print("【データ構造サンプル（1件目）】")
-            sample = subsidies[0]
-            for key, value in sample.items():
-                if isinstance(value, str) and len(value) < 100:
+            for key, value in table.row(0).items():
+                if value is None or value == "":
+                    continue
+                if key in TIMESTAMP_COLUMNS:
+                    value = format_timestamp(value, "%Y-%m-%dT%H:%M:%SZ")
+                if not isinstance(value, str) or len(value) < 100:
                     print(f"  {key}: {value}")
             print()
         
-        # 日付データを収集
-        for subsidy in subsidies:
-            # created_date系のフィールドを探す
-            if "created_date" in subsidy and subsidy["created_date"]:
-                try:
-                    dt = datetime.fromisoformat(subsidy["created_date"].replace("Z", "+00:00"))
-                    created_dates.append(dt)
-                except:
-                    pass
-            
-            if "updated_date" in subsidy and subsidy["updated_date"]:
-                try:
-                    dt = datetime.fromisoformat(subsidy["updated_date"].replace("Z", "+00:00"))
-                    updated_dates.append(dt)
-                except:
-                    pass
-            
-            if "acceptance_start_datetime" in subsidy and subsidy["acceptance_start_datetime"]:
-                try:
-                    dt = datetime.fromisoformat(subsidy["acceptance_start_datetime"].replace("Z", "+00:00"))
-                    acceptance_start_dates.append(dt)
-                except:
-                    pass
-            
-            if "acceptance_end_datetime" in subsidy and subsidy["acceptance_end_datetime"]:
-                try:
-                    dt = datetime.fromisoformat(subsidy["acceptance_end_datetime"].replace("Z", "+00:00"))
-                    acceptance_end_dates.append(dt)
-                except:
-                    pass
+        # 日付データ（値があるもののみ、昇順）
+        created_dates = sorted(table.values("created_date"))
+        updated_dates = sorted(table.values("updated_date"))
+        acceptance_start_dates = sorted(table.values("acceptance_start_datetime"))
+        acceptance_end_dates = sorted(table.values("acceptance_end_datetime"))
+        now = time.time()
         
         # 作成日時の分析
         if created_dates:
-            created_dates.sort()
             print(f"【作成日時（created_date）の分析】")
             print(f"  データ件数: {len(created_dates)}件")
-            print(f"  最古: {created_dates[0].strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"  最新: {created_dates[-1].strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"  最古: {format_timestamp(created_dates[0])}")
+            print(f"  最新: {format_timestamp(created_dates[-1])}")
             
             # 月別の作成件数
-            monthly_counts = Counter([dt.strftime('%Y-%m') for dt in created_dates])
+            monthly_counts = table.month_counts("created_date")
             print(f"\n  【月別作成件数（最近6ヶ月）】")
             for month, count in sorted(monthly_counts.items(), reverse=True)[:6]:
                 print(f"    {month}: {count}件")
@@ -82,14 +62,13 @@ def analyze_update_frequency(json_file):
         
         # 更新日時の分析
         if updated_dates:
-            updated_dates.sort()
             print(f"【更新日時（updated_date）の分析】")
             print(f"  データ件数: {len(updated_dates)}件")
-            print(f"  最古: {updated_dates[0].strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"  最新: {updated_dates[-1].strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"  最古: {format_timestamp(updated_dates[0])}")
+            print(f"  最新: {format_timestamp(updated_dates[-1])}")
             
             # 月別の更新件数
-            monthly_counts = Counter([dt.strftime('%Y-%m') for dt in updated_dates])
+            monthly_counts = table.month_counts("updated_date")
             print(f"\n  【月別更新件数（最近6ヶ月）】")
             for month, count in sorted(monthly_counts.items(), reverse=True)[:6]:
                 print(f"    {month}: {count}件")
@@ -97,57 +76,45 @@ def analyze_update_frequency(json_file):
         
         # 募集開始日時の分析
         if acceptance_start_dates:
-            acceptance_start_dates.sort()
             print(f"【募集開始日時の分析】")
             print(f"  データ件数: {len(acceptance_start_dates)}件")
-            print(f"  最古: {acceptance_start_dates[0].strftime('%Y-%m-%d')}")
-            print(f"  最新: {acceptance_start_dates[-1].strftime('%Y-%m-%d')}")
+            print(f"  最古: {format_timestamp(acceptance_start_dates[0], '%Y-%m-%d')}")
+            print(f"  最新: {format_timestamp(acceptance_start_dates[-1], '%Y-%m-%d')}")
             
             # 今後開始予定のもの
-            now = datetime.now(acceptance_start_dates[0].tzinfo)
-            future_starts = [dt for dt in acceptance_start_dates if dt > now]
+            future_starts = [ts for ts in acceptance_start_dates if ts > now]
             print(f"  今後開始予定: {len(future_starts)}件")
             print()
             
             # 新しいもの20件を表示
             print(f"【募集開始日時が新しい順 TOP 20】")
-            # 補助金を募集開始日時でソート
-            subsidies_with_dates = []
-            for subsidy in subsidies:
-                if "acceptance_start_datetime" in subsidy and subsidy["acceptance_start_datetime"]:
-                    try:
-                        dt = datetime.fromisoformat(subsidy["acceptance_start_datetime"].replace("Z", "+00:00"))
-                        subsidies_with_dates.append((dt, subsidy))
-                    except:
-                        pass
-            
-            # 新しい順にソート
-            subsidies_with_dates.sort(key=lambda x: x[0], reverse=True)
+            # 募集開始日時が新しい順に並べた行番号（解析済みの値をそのまま使う）
+            starts = table.numbers["acceptance_start_datetime"]
+            rows = sorted(table.present("acceptance_start_datetime"), key=starts.__getitem__, reverse=True)
             
             # 上位20件を表示
-            for i, (dt, subsidy) in enumerate(subsidies_with_dates[:20], 1):
-                title = subsidy.get("title", "タイトルなし")
+            for i, row in enumerate(rows[:20], 1):
+                title = table.value("title", row) or "タイトルなし"
                 # タイトルが長い場合は省略
                 if len(title) > 60:
                     title = title[:60] + "..."
-                print(f"  {i:2d}. {dt.strftime('%Y-%m-%d %H:%M')} | {title}")
+                print(f"  {i:2d}. {format_timestamp(starts[row], '%Y-%m-%d %H:%M')} | {title}")
             print()
         
         # 募集終了日時の分析
         if acceptance_end_dates:
-            acceptance_end_dates.sort()
             print(f"【募集終了日時の分析】")
             print(f"  データ件数: {len(acceptance_end_dates)}件")
-            print(f"  最古: {acceptance_end_dates[0].strftime('%Y-%m-%d')}")
-            print(f"  最新: {acceptance_end_dates[-1].strftime('%Y-%m-%d')}")
+            print(f"  最古: {format_timestamp(acceptance_end_dates[0], '%Y-%m-%d')}")
+            print(f"  最新: {format_timestamp(acceptance_end_dates[-1], '%Y-%m-%d')}")
             
             # 現在募集中のもの（終了日が未来）
-            now = datetime.now(acceptance_end_dates[0].tzinfo)
-            active_subsidies = [dt for dt in acceptance_end_dates if dt > now]
-            print(f"  現在募集中（終了日が未来）: {len(active_subsidies)}件")
+            ends = table.numbers["acceptance_end_datetime"]
+            active_rows = [row for row in table.present("acceptance_end_datetime") if ends[row] > now]
+            print(f"  現在募集中（終了日が未来）: {len(active_rows)}件")
             
             # 月別の終了予定
-            monthly_ends = Counter([dt.strftime('%Y-%m') for dt in active_subsidies])
+            monthly_ends = table.month_counts("acceptance_end_datetime", active_rows)
             if monthly_ends:
                 print(f"\n  【月別終了予定（募集中のもの）】")
                 for month, count in sorted(monthly_ends.items())[:6]:
@@ -157,13 +124,13 @@ def analyze_update_frequency(json_file):
         print("=" * 60)
         print("【結論】")
         if created_dates:
-            days_span = (created_dates[-1] - created_dates[0]).days
+            days_span = (created_dates[-1] - created_dates[0]) // SECONDS_PER_DAY
             avg_per_day = len(created_dates) / max(days_span, 1)
             print(f"  データ期間: {days_span}日間")
             print(f"  平均作成頻度: 約{avg_per_day:.2f}件/日")
         
         if updated_dates:
-            recent_updates = [dt for dt in updated_dates if (datetime.now(dt.tzinfo) - dt).days <= 30]
+            recent_updates = [ts for ts in updated_dates if (now - ts) // SECONDS_PER_DAY <= 30]
             print(f"  過去30日以内の更新: {len(recent_updates)}件")
         
         print("=" * 60)
@@ -1,8 +1,10 @@
-import requests
 import json
 
-base_url = "https://api.jgrants-portal.go.jp/exp/v1/public/subsidies"
-headers = {"Accept": "application/json"}
+# srcディレクトリをパスに追加し、APIのレスポンスを .cache/jgrants にキャッシュする
+import survey_env  # noqa: F401
+
+from jgrants_client import get_default_client
+
 params = {
     "keyword": "補助金",
     "sort": "created_date",
@@ -12,9 +14,7 @@ params = {
 }
 
 try:
-    res = requests.get(base_url, params=params, headers=headers)
-    res.raise_for_status()
-    data = res.json()
+    data = get_default_client().list_subsidies(params=params)
     items = data.get("result", [])
     
     print(f"Count: {len(items)}")
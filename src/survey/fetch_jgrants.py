@@ -1,5 +1,11 @@
 import requests
 
+# srcディレクトリをパスに追加し、APIのレスポンスを .cache/jgrants にキャッシュする
+import survey_env  # noqa: F401
+
+from jgrants_client import get_default_client
+
+
 def fetch_subsidies_list(params=None):
     """
     J-Grants APIから補助金の一覧を取得する
@@ -11,9 +17,6 @@ def fetch_subsidies_list(params=None):
     Returns:
         dict: APIレスポンス全体（取得失敗時はNone）
     """
-    url = "https://api.jgrants-portal.go.jp/exp/v1/public/subsidies"
-    headers = {"Accept": "application/json"}
-    
     # デフォルトパラメータ
     if params is None:
         params = {
@@ -24,9 +27,7 @@ def fetch_subsidies_list(params=None):
         }
     
     try:
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return get_default_client().list_subsidies(params=params)
     except requests.exceptions.RequestException as e:
         print(f"API取得エラー: {e}")
         return None
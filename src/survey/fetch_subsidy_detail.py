@@ -1,6 +1,12 @@
 import requests
 import json
 
+# srcディレクトリをパスに追加し、APIのレスポンスを .cache/jgrants にキャッシュする
+import survey_env  # noqa: F401
+
+from jgrants_client import get_default_client
+
+
 def fetch_subsidy_detail(subsidy_id):
     """
     J-Grants APIから特定の補助金の詳細情報を取得する
@@ -11,13 +17,9 @@ def fetch_subsidy_detail(subsidy_id):
     Returns:
         dict: 補助金の詳細情報（取得失敗時はNone）
     """
-    url = f"https://api.jgrants-portal.go.jp/exp/v1/public/subsidies/id/{subsidy_id}"
-    headers = {"Accept": "application/json"}
-    
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        with get_default_client().get_subsidy_detail(subsidy_id) as response:
+            return response.json()
     except requests.exceptions.RequestException as e:
         print(f"API取得エラー (ID: {subsidy_id}): {e}")
         return None
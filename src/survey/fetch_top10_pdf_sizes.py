@@ -1,11 +1,42 @@
-import requests
+"""
+補助金詳細の添付ファイル（公募要領などのPDF）のサイズ調査
+
+  python src/survey/fetch_top10_pdf_sizes.py                       上位10件の詳細とPDFを output/top10 に保存
+  python src/survey/fetch_top10_pdf_sizes.py --census              一覧APIの全件のPDFのサイズを調査（output/census）
+  python src/survey/fetch_top10_pdf_sizes.py --census --no-save    PDF・詳細JSONを保存せずにサイズだけ調査
+  python src/survey/fetch_top10_pdf_sizes.py --census --offline    output/top10 のデータを返す代替サーバーで調査
+
+全件調査（--census）では、レスポンスを逐次読み込みながらBase64の長さとパディングから
+デコード後のサイズを計算するため、PDFをデコード・メモリに展開しない。
+同時実行数は環境変数 CENSUS_MAX_WORKERS（省略時は8）で指定する。
+"""
 import base64
 import json
 import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+# srcディレクトリをパスに追加し、APIのレスポンスを .cache/jgrants にキャッシュする
+import survey_env  # noqa: F401
+
+from jgrants_client import get_default_client
+from fetch_jgrants import fetch_catalog
+from detail_stream import DEFAULT_CHUNK_SIZE, parse_detail_stream
+from metrics import ChunkTimer, percentile
+
+# 全件調査の詳細取得の同時実行数（省略時）
+DEFAULT_CENSUS_WORKERS = 8
+
+# サイズの分布として出力する百分位数
+CENSUS_PERCENTILES = (50, 90, 99)
+
+_print_lock = threading.Lock()
+
 def load_subsidy_ids(json_path, limit=10):
-    """JSONファイルから補助金IDを取得"""
+    """JSONファイルから補助金IDを取得（limit=None の場合は全件）"""
     with open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
@@ -14,15 +45,8 @@ def load_subsidy_ids(json_path, limit=10):
 
 def get_subsidy_detail(subsidy_id):
     """補助金詳細を取得"""
-    url = f"https://api.jgrants-portal.go.jp/exp/v1/public/subsidies/id/{subsidy_id}"
-    
-    headers = {
-        "Accept": "application/json"
-    }
-    
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    data = response.json()
+    with get_default_client().get_subsidy_detail(subsidy_id) as response:
+        data = response.json()
     
     return data.get("result", [{}])[0]
 
@@ -179,5 +203,232 @@ def main():
     print(f"\n✅ サマリーを保存しました: {output_file}")
     print(f"✅ PDFファイル保存先: {output_dir}")
 
+def decoded_size(base64_length, padding):
+    """
+    Base64の文字数とパディング（=）の数から、デコード後のバイト数を計算する
+
+    パディングが省略されている場合（文字数が4の倍数でない場合）も正しく計算できる。
+    """
+    return base64_length * 3 // 4 - padding
+
+
+class AttachmentSizeCounter:
+    """
+    application_guidelines の各ファイルのサイズを、Base64をデコードせずに数える
+    （DetailStreamFilter の attachment_handler として使う）
+
+    save_dir を指定した場合は、受け取ったBase64を逐次デコードしてファイルに保存する。
+    同じ補助金に同じ名前のファイルが複数ある場合も上書きしないよう、ファイルは (名前, 添付の順番) で区別する。
+    """
+
+    def __init__(self, save_dir=None, prefix=""):
+        """
+        Args:
+            save_dir (str, optional): PDFの保存先（Noneの場合は保存しない）
+            prefix (str): 保存するファイル名の接頭辞
+        """
+        self.save_dir = save_dir
+        self.prefix = prefix
+        self.files = []
+
+    def begin(self):
+        self._name = None
+        self._length = 0
+        self._tail = b''
+        self._pending = b''
+        self._file = None
+        if self.save_dir:
+            # name が data の後に来る場合もあるため、一時ファイルに書き込んでから名前を付ける
+            self._file = tempfile.NamedTemporaryFile(dir=self.save_dir, suffix=".tmp", delete=False)
+
+    def name(self, value):
+        self._name = value
+
+    def data(self, chunk):
+        self._length += len(chunk)
+        self._tail = (self._tail + chunk)[-2:]
+        if self._file is not None:
+            buf = self._pending + chunk
+            usable = len(buf) - len(buf) % 4
+            self._pending = buf[usable:]
+            self._file.write(base64.b64decode(buf[:usable]))
+
+    def end(self):
+        name = self._name or "名前不明"
+        index = len(self.files) + 1
+        info = {
+            "name": name,
+            "index": index,
+            "size_bytes": decoded_size(self._length, self._tail.count(b'=')) if self._length else 0,
+            "saved_filename": None,
+        }
+        if self._file is not None:
+            if self._pending:
+                self._file.write(base64.b64decode(self._pending + b'=' * (-len(self._pending) % 4)))
+            self._file.close()
+            if self._length:
+                saved_filename = f"{self.prefix}{index:02d}_{os.path.basename(name)}"
+                os.replace(self._file.name, os.path.join(self.save_dir, saved_filename))
+                info["saved_filename"] = saved_filename
+            else:
+                os.remove(self._file.name)
+        self.files.append(info)
+
+
+def census_subsidy(subsidy_id, rank, output_dir, save):
+    """
+    1件の補助金の詳細を逐次読み込み、添付ファイルのサイズを数える
+
+    Args:
+        subsidy_id (str): 補助金ID
+        rank (int): 一覧での順位
+        output_dir (str): 保存先
+        save (bool): PDFと詳細JSON（添付ファイルを除く）を保存するかどうか
+
+    Returns:
+        dict: summary_*.json の1件分（上位10件の調査と同じキーに、pdfs の index・size_bytes と response_size_mb を追加）
+    """
+    prefix = f"{rank:04d}_{subsidy_id}_"
+    counter = AttachmentSizeCounter(output_dir if save else None, prefix)
+    with get_default_client().get_subsidy_detail(subsidy_id, stream=True) as response:
+        chunks = ChunkTimer(response.iter_content(chunk_size=DEFAULT_CHUNK_SIZE))
+        data = parse_detail_stream(chunks, ["application_guidelines"], counter)
+    detail = data.get("result", [{}])[0]
+
+    detail_filename = None
+    if save:
+        detail_filename = f"{prefix}detail.json"
+        with open(os.path.join(output_dir, detail_filename), "w", encoding="utf-8") as f:
+            json.dump(detail, f, ensure_ascii=False, indent=2)
+
+    total_bytes = sum(file["size_bytes"] for file in counter.files)
+    return {
+        "rank": rank,
+        "id": subsidy_id,
+        "title": detail.get("title", "タイトル不明"),
+        "pdf_count": len(counter.files),
+        "total_size_mb": round(total_bytes / (1024 * 1024), 2),
+        "pdfs": [
+            {
+                "name": file["name"],
+                "size_mb": round(file["size_bytes"] / (1024 * 1024), 2),
+                "saved_filename": file["saved_filename"],
+                "index": file["index"],
+                "size_bytes": file["size_bytes"],
+            }
+            for file in counter.files
+        ],
+        "detail_json": detail_filename,
+        "response_size_mb": round(chunks.bytes / (1024 * 1024), 2),
+    }
+
+
+def size_distribution(sizes_bytes):
+    """サイズ（バイト）の分布"""
+    ordered = sorted(sizes_bytes)
+    stats = {"count": len(ordered), "total_mb": round(sum(ordered) / (1024 * 1024), 2)}
+    for p in CENSUS_PERCENTILES:
+        value = percentile(ordered, p)
+        stats[f"p{p}_mb"] = round(value / (1024 * 1024), 2) if value is not None else None
+    stats["max_mb"] = round(ordered[-1] / (1024 * 1024), 2) if ordered else None
+    return stats
+
+
+def census_main(save=True):
+    """
+    一覧の全件について添付ファイルのサイズを調査する
+
+    対象はメイン処理と同じ一覧（fetch_catalog、LIST_PARTITIONS の分割条件を含む）から取得する。
+
+    Args:
+        save (bool): PDFと詳細JSON（添付ファイルを除く）を保存するかどうか
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(script_dir))
+    output_dir = os.path.join(project_root, "output", "census")
+    max_workers = int(os.environ.get("CENSUS_MAX_WORKERS", DEFAULT_CENSUS_WORKERS))
+
+    catalog = fetch_catalog()
+    if not catalog:
+        print("補助金一覧の取得に失敗しました")
+        return
+    subsidy_ids = [s["id"] for s in catalog.get("result", []) if s.get("id")]
+    total = len(subsidy_ids)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("=" * 80)
+    print("補助金の添付ファイルサイズ調査（全件）")
+    print("=" * 80)
+    print(f"取得対象: {total}件（同時実行数: {max_workers}）")
+    print(f"保存先: {output_dir}" + ("" if save else "（サマリーのみ保存）") + "\n")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(census_subsidy, subsidy_id, rank, output_dir, save): (rank, subsidy_id)
+            for rank, subsidy_id in enumerate(subsidy_ids, 1)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            rank, subsidy_id = futures[future]
+            try:
+                result = future.result()
+                line = f"[{done}/{total}] {subsidy_id}: PDF {result['pdf_count']}件 / {result['total_size_mb']:.2f} MB"
+            except Exception as e:
+                result = {"rank": rank, "id": subsidy_id, "title": "取得失敗", "error": str(e)}
+                line = f"[{done}/{total}] {subsidy_id}: エラー: {e}"
+            results.append(result)
+            with _print_lock:
+                print(line)
+    results.sort(key=lambda r: r["rank"])
+
+    succeeded = [r for r in results if "error" not in r]
+    file_sizes = [pdf["size_bytes"] for r in succeeded for pdf in r["pdfs"]]
+    subsidy_sizes = [sum(pdf["size_bytes"] for pdf in r["pdfs"]) for r in succeeded if r["pdfs"]]
+    response_sizes = [int(r["response_size_mb"] * 1024 * 1024) for r in succeeded]
+    stats = {
+        "subsidies": total,
+        "failed": total - len(succeeded),
+        "with_attachments": len(subsidy_sizes),
+        "per_file": size_distribution(file_sizes),
+        "per_subsidy": size_distribution(subsidy_sizes),
+        "response": size_distribution(response_sizes),
+    }
+
+    print("\n" + "=" * 80)
+    print("【サマリー】")
+    print("=" * 80)
+    print(f"\n調査件数: {len(succeeded)}件（失敗: {stats['failed']}件 / 添付ファイルあり: {stats['with_attachments']}件）")
+    print(f"\n{'区分':<18} {'件数':>6} {'合計(MB)':>10} " + " ".join(f"{'p' + str(p) + '(MB)':>9}" for p in CENSUS_PERCENTILES) + f" {'最大(MB)':>9}")
+    for label, key in (("ファイルごと", "per_file"), ("補助金ごとの合計", "per_subsidy"), ("レスポンス全体", "response")):
+        dist = stats[key]
+        percentiles = " ".join(f"{dist[f'p{p}_mb'] or 0:>9.2f}" for p in CENSUS_PERCENTILES)
+        print(f"{label:<18} {dist['count']:>6} {dist['total_mb']:>10.2f} {percentiles} {dist['max_mb'] or 0:>9.2f}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"summary_{timestamp}.json")
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    stats_file = os.path.join(output_dir, f"summary_{timestamp}_stats.json")
+    with open(stats_file, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ サマリーを保存しました: {output_file}")
+    print(f"✅ サイズの分布を保存しました: {stats_file}")
+
+
 if __name__ == "__main__":
-    main()
+    args = sys.argv[1:]
+    if "--census" not in args:
+        main()
+    elif "--offline" in args:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bench'))
+        from fake_jgrants_server import FakeJGrantsServer
+        from fixtures import Catalog
+
+        # 代替サーバーのレスポンスはキャッシュしない
+        os.environ.pop("JGRANTS_CACHE_DIR", None)
+        with FakeJGrantsServer(Catalog()) as server:
+            os.environ["JGRANTS_BASE_URL"] = server.base_url
+            census_main(save="--no-save" not in args)
+    else:
+        census_main(save="--no-save" not in args)
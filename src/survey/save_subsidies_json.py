@@ -1,17 +1,23 @@
 import requests
 import json
+import os
+import sys
 from datetime import datetime
 
-def fetch_and_save_subsidies():
+# srcディレクトリをパスに追加し、APIのレスポンスを .cache/jgrants にキャッシュする
+import survey_env  # noqa: F401
+
+from jgrants_client import get_default_client
+from snapshot_archive import SnapshotArchive
+
+def fetch_and_save_subsidies(archive=None):
     """
     J-Grants APIから補助金データを取得してJSON形式で保存する
+
+    Args:
+        archive (SnapshotArchive, optional): 指定した場合はJSONファイルを作成せず、
+            アーカイブに前回からの差分として追加する
     """
-    base_url = "https://api.jgrants-portal.go.jp/exp/v1/public/subsidies"
-    
-    headers = {
-        "Accept": "application/json"
-    }
-    
     # 全件取得（acceptance=0で全期間）
     params = {
         "keyword": "補助金",
@@ -22,10 +28,7 @@ def fetch_and_save_subsidies():
     
     try:
         print("J-Grants APIから補助金データを取得中...")
-        response = requests.get(base_url, params=params, headers=headers)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = get_default_client().list_subsidies(params=params)
         
         # 取得件数を表示
         count = data.get("metadata", {}).get("resultset", {}).get("count", 0)
@@ -35,6 +38,14 @@ def fetch_and_save_subsidies():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"subsidies_{timestamp}.json"
         
+        if archive is not None:
+            entry = archive.append(data, timestamp)
+            print(f"✅ アーカイブに追加しました: {os.path.join(archive.path, entry['file'])}")
+            if entry["kind"] == "delta":
+                print(f"   - 追加: {entry['added']}件 / 変更: {entry['changed']}件 / 削除: {entry['removed']}件")
+            print(f"   - ファイルサイズ: {entry['size'] / 1000} KB")
+            return entry["file"]
+        
         # JSON形式で保存（日本語を読みやすく、インデント付き）
         with open(filename, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
@@ -54,4 +65,5 @@ def fetch_and_save_subsidies():
 
 
 if __name__ == "__main__":
-    fetch_and_save_subsidies()
+    # --archive: JSONファイルの代わりにアーカイブ（SNAPSHOT_ARCHIVE_DIR、省略時は output/archive）に追加
+    fetch_and_save_subsidies(SnapshotArchive() if "--archive" in sys.argv else None)
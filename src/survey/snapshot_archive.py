@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+補助金一覧のスナップショット（subsidies_*.json）の履歴を差分で保存するアーカイブ
+
+全件を保存した基準のスナップショット（キーフレーム）と、前回からの差分
+（追加・削除・変更された補助金）を gzip 圧縮したJSONとして保存し、index.json に一覧を記録する。
+キーフレームは一定の件数の差分ごとに作成し、任意の日時の一覧は直前のキーフレームから
+その日時までの差分だけを読み込んで復元する。
+
+    archive/
+      index.json                          スナップショットの一覧（日時・種類・ファイル・件数・SHA-256）
+      base_20251216_111354.json.gz        キーフレーム（APIレスポンス全体）
+      delta_20251217_090000.json.gz       前回からの差分
+
+    python src/survey/snapshot_archive.py import output/             subsidies_*.json をアーカイブに追加
+    python src/survey/snapshot_archive.py list                       保存済みのスナップショットの一覧
+    python src/survey/snapshot_archive.py export 20251216 out.json   指定日時（以前で最新）の一覧を復元
+
+アーカイブの場所は環境変数 SNAPSHOT_ARCHIVE_DIR（省略時は output/archive）。
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import glob
+import hashlib
+from bisect import bisect_left, bisect_right
+
+# アーカイブの保存先（省略時）
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'output', 'archive')
+
+# スナップショットの一覧のファイル名
+INDEX_FILENAME = "index.json"
+
+# 差分の件数がこの数に達したらキーフレームを作成する（環境変数 SNAPSHOT_ARCHIVE_KEYFRAME_INTERVAL）
+DEFAULT_KEYFRAME_INTERVAL = 30
+
+# スナップショットの日時の形式（YYYYMMDD_HHMMSS、日本時間）
+STAMP_PATTERN = re.compile(r'(\d{8}_\d{6})')
+
+
+def get_archive_dir():
+    """アーカイブの保存先を決定する"""
+    return os.environ.get("SNAPSHOT_ARCHIVE_DIR") or DEFAULT_ARCHIVE_DIR
+
+
+def file_stamp(path):
+    """ファイル名（subsidies_YYYYMMDD_HHMMSS.json）からスナップショットの日時を取り出す"""
+    m = STAMP_PATTERN.search(os.path.basename(path))
+    if not m:
+        raise ValueError(f"ファイル名に日時（YYYYMMDD_HHMMSS）が含まれていません: {path}")
+    return m.group(1)
+
+
+def dumps_record(record):
+    """補助金1件を比較・ハッシュ計算用の空白なしのJSONに変換する"""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+def result_digest(records):
+    """一覧（result）の内容のSHA-256（復元した内容の検証に使う）"""
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(dumps_record(record).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def diff_snapshots(previous, current):
+    """
+    2つの一覧の差分を計算する
+
+    Args:
+        previous (list): 前回の一覧（result）
+        current (list): 今回の一覧（result）
+
+    Returns:
+        dict: added・changed（補助金の内容）、removed（ID）、order（並び順が
+            「追加した補助金 + 前回の並び順」と異なる場合のみ、今回のIDの並び順）
+    """
+    before = {record["id"]: dumps_record(record) for record in previous}
+    current_ids = [record["id"] for record in current]
+    current_set = set(current_ids)
+
+    added, changed = [], []
+    for record in current:
+        line = before.get(record["id"])
+        if line is None:
+            added.append(record)
+        elif line != dumps_record(record):
+            changed.append(record)
+    removed = [record["id"] for record in previous if record["id"] not in current_set]
+
+    delta = {"added": added, "changed": changed, "removed": removed}
+    if current_ids != expected_order(previous, delta):
+        delta["order"] = current_ids
+    return delta
+
+
+def expected_order(previous, delta):
+    """差分に order がない場合の並び順（追加した補助金を先頭に、残りは前回の順）"""
+    removed = set(delta["removed"])
+    return [record["id"] for record in delta["added"]] + [
+        record["id"] for record in previous if record["id"] not in removed
+    ]
+
+
+def apply_delta(previous, delta):
+    """
+    一覧に差分を適用する
+
+    Args:
+        previous (list): 前回の一覧（result）
+        delta (dict): diff_snapshots() の結果
+
+    Returns:
+        list: 今回の一覧
+    """
+    records = {record["id"]: record for record in previous}
+    for subsidy_id in delta["removed"]:
+        records.pop(subsidy_id, None)
+    for record in delta["added"] + delta["changed"]:
+        records[record["id"]] = record
+    order = delta.get("order") or expected_order(previous, delta)
+    return [records[subsidy_id] for subsidy_id in order]
+
+
+def write_gzip_json(path, data):
+    """JSONを gzip 圧縮して保存する（書き込みが完了してから置き換える）"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_gzip_json(path):
+    """gzip 圧縮したJSONを読み込む"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SnapshotArchive:
+    """
+    補助金一覧の履歴のアーカイブ
+
+    index.json の entries は日時の昇順で、各要素は stamp・kind（base / delta）・file・count・
+    added・changed・removed・sha256 を持つ。
+    """
+
+    def __init__(self, path=None, keyframe_interval=None):
+        """
+        Args:
+            path (str, optional): アーカイブのディレクトリ（Noneの場合は get_archive_dir()）
+            keyframe_interval (int, optional): キーフレームの間隔（差分の件数）
+        """
+        self.path = path or get_archive_dir()
+        if keyframe_interval is None:
+            keyframe_interval = int(os.environ.get("SNAPSHOT_ARCHIVE_KEYFRAME_INTERVAL", DEFAULT_KEYFRAME_INTERVAL))
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.entries = self._load_index()
+
+    @staticmethod
+    def is_archive(path):
+        """ディレクトリがアーカイブかどうか"""
+        return os.path.isfile(os.path.join(path, INDEX_FILENAME))
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.path, INDEX_FILENAME), "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", [])
+        except FileNotFoundError:
+            return []
+
+    def _save_index(self):
+        path = os.path.join(self.path, INDEX_FILENAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def stamps(self):
+        """保存済みのスナップショットの日時（昇順）"""
+        return [entry["stamp"] for entry in self.entries]
+
+    def find(self, stamp):
+        """
+        指定日時以前で最新のスナップショットの位置
+
+        Args:
+            stamp (str): 日時（YYYYMMDD_HHMMSS、YYYYMMDD などの前方一致も可）
+
+        Returns:
+            int: entries の位置（該当しない場合はNone）
+        """
+        # 日付のみの指定はその日の最後として扱う
+        key = stamp + "_999999"[len(stamp) - 8:] if len(stamp) < 15 else stamp
+        position = bisect_right(self.stamps(), key) - 1
+        return position if position >= 0 else None
+
+    def _keyframe_before(self, position):
+        """指定位置以前で最新のキーフレームの位置"""
+        while self.entries[position]["kind"] != "base":
+            position -= 1
+        return position
+
+    def _read(self, position, records):
+        """1件分のファイルを読み込み、直前の一覧に適用した結果を返す"""
+        entry = self.entries[position]
+        data = read_gzip_json(os.path.join(self.path, entry["file"]))
+        if entry["kind"] != "base":
+            data["result"] = apply_delta(records, data)
+        if result_digest(data["result"]) != entry["sha256"]:
+            raise ValueError(f"復元した内容がアーカイブと一致しません: {entry['stamp']}")
+        return {"metadata": data.get("metadata", {}), "result": data["result"]}
+
+    def iter_range(self, start=None, end=None):
+        """
+        日時の範囲のスナップショットを古い順に復元して返す
+
+        開始日時の直前のキーフレームから読み込み、以降は差分を順に適用する。
+
+        Args:
+            start (str, optional): 開始日時（Noneの場合は最初から）
+            end (str, optional): 終了日時（この日時以前まで、Noneの場合は最後まで）
+
+        Yields:
+            tuple: (日時, APIレスポンスと同じ形式の辞書)
+        """
+        if not self.entries:
+            return
+        last = len(self.entries) - 1 if end is None else self.find(end)
+        if last is None:
+            return
+        first = 0 if start is None else bisect_left(self.stamps(), start)
+        if first > last:
+            return
+
+        records = []
+        for position in range(self._keyframe_before(first), last + 1):
+            data = self._read(position, records)
+            records = data["result"]
+            if position >= first:
+                yield self.entries[position]["stamp"], data
+
+    def load(self, stamp=None):
+        """
+        指定日時以前で最新のスナップショットを復元する
+
+        Args:
+            stamp (str, optional): 日時（Noneの場合は最新）
+
+        Returns:
+            dict: APIレスポンスと同じ形式の辞書（該当しない場合はNone）
+        """
+        position = len(self.entries) - 1 if stamp is None else self.find(stamp)
+        if position is None or position < 0:
+            return None
+        entry_stamp = self.entries[position]["stamp"]
+        for _, data in self.iter_range(entry_stamp, entry_stamp):
+            return data
+        return None
+
+    def segments(self):
+        """キーフレームごとに区切った日時のリスト（区間ごとに並列に処理する場合に使う）"""
+        segments = []
+        for entry in self.entries:
+            if entry["kind"] == "base" or not segments:
+                segments.append([])
+            segments[-1].append(entry["stamp"])
+        return segments
+
+    def append(self, data, stamp):
+        """
+        スナップショットをアーカイブに追加する
+
+        最後のキーフレーム以降の差分が keyframe_interval 件に達した場合はキーフレームとして、
+        それ以外は前回からの差分として保存する。
+
+        Args:
+            data (dict): APIレスポンス全体
+            stamp (str): 日時（YYYYMMDD_HHMMSS、保存済みのものより後）
+
+        Returns:
+            dict: 追加した index.json の要素
+        """
+        if self.entries and stamp <= self.entries[-1]["stamp"]:
+            raise ValueError(f"保存済みのスナップショット（{self.entries[-1]['stamp']}）より後の日時を指定してください: {stamp}")
+        os.makedirs(self.path, exist_ok=True)
+
+        result = [record for record in data.get("result", []) if record.get("id") is not None]
+        metadata = data.get("metadata", {})
+        entry = {"stamp": stamp, "count": len(result), "sha256": result_digest(result)}
+
+        since_keyframe = 0
+        for previous in reversed(self.entries):
+            if previous["kind"] == "base":
+                break
+            since_keyframe += 1
+
+        if not self.entries or since_keyframe + 1 >= self.keyframe_interval:
+            entry.update({"kind": "base", "file": f"base_{stamp}.json.gz"})
+            write_gzip_json(os.path.join(self.path, entry["file"]), {"metadata": metadata, "result": result})
+        else:
+            delta = diff_snapshots(self.load()["result"], result)
+            entry.update({
+                "kind": "delta",
+                "file": f"delta_{stamp}.json.gz",
+                "added": len(delta["added"]),
+                "changed": len(delta["changed"]),
+                "removed": len(delta["removed"]),
+            })
+            write_gzip_json(os.path.join(self.path, entry["file"]), dict(delta, metadata=metadata))
+
+        entry["size"] = os.path.getsize(os.path.join(self.path, entry["file"]))
+        # ファイルの保存が完了してから一覧に追加する
+        self.entries.append(entry)
+        self._save_index()
+        return entry
+
+
+def import_files(archive, paths):
+    """subsidies_*.json を日時の順にアーカイブに追加する（保存済みの日時以前のものは読み飛ばす）"""
+    latest = archive.entries[-1]["stamp"] if archive.entries else ""
+    for path in sorted(paths, key=file_stamp):
+        stamp = file_stamp(path)
+        if stamp <= latest:
+            print(f"  保存済みのため読み飛ばします: {path}")
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        entry = archive.append(data, stamp)
+        print(f"✅ {stamp}: {entry['kind']} {entry['count']}件（{entry['size'] / 1000:.1f} KB, 元のファイル {os.path.getsize(path) / 1000:.1f} KB）")
+
+
+def main(argv):
+    if not argv or argv[0] not in ("import", "list", "export"):
+        print(__doc__)
+        return 1
+    archive = SnapshotArchive()
+    command = argv[0]
+
+    if command == "import":
+        paths = []
+        for path in argv[1:] or ["output"]:
+            paths.extend(glob.glob(os.path.join(path, "subsidies_*.json")) if os.path.isdir(path) else [path])
+        import_files(archive, paths)
+    elif command == "list":
+        total = 0
+        for entry in archive.entries:
+            total += entry["size"]
+            changes = "" if entry["kind"] == "base" else \
+                f"  +{entry['added']} -{entry['removed']} ~{entry['changed']}"
+            print(f"  {entry['stamp']}  {entry['kind']:<5}  {entry['count']:>6}件  {entry['size'] / 1000:>8.1f} KB{changes}")
+        print(f"合計: {len(archive.entries)}件 {total / 1000:.1f} KB（{archive.path}）")
+    else:
+        if len(argv) < 2:
+            print("❌ 日時を指定してください（例: export 20251216 out.json）")
+            return 1
+        data = archive.load(argv[1])
+        if data is None:
+            print(f"❌ 指定日時以前のスナップショットがありません: {argv[1]}")
+            return 1
+        output = argv[2] if len(argv) > 2 else f"subsidies_{archive.entries[archive.find(argv[1])]['stamp']}.json"
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"✅ {len(data['result'])}件を復元しました: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,339 @@
+"""
+補助金一覧（subsidies_*.json）を列ごとの配列に変換した表と、そのバイナリキャッシュ
+
+日時は読み込み時に1回だけ解析してUNIX時刻（秒）の整数に、補助金上限額は整数に変換し、
+文字列（対象地域など）は重複を除いた値の一覧と、その番号の配列として保持する。
+変換した表は元のJSONと同じディレクトリの {ファイル名}.table に保存し、
+JSONの更新日時・サイズが変わっていなければ次回からはそこから読み込む。
+
+    from subsidy_table import load_table
+
+    table = load_table("output/subsidies_20251216_111354.json")
+    table.month_counts("acceptance_end_datetime")   # 月別の件数
+    table.value_counts("target_area_search")        # 対象地域ごとの件数
+"""
+import os
+import sys
+import json
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+
+# 日時の列（UNIX時刻の整数、値がない場合は MISSING）
+TIMESTAMP_COLUMNS = (
+    "created_date",
+    "updated_date",
+    "acceptance_start_datetime",
+    "acceptance_end_datetime",
+)
+
+# 数値の列（整数、値がない場合は MISSING）
+NUMBER_COLUMNS = (
+    "subsidy_max_limit",
+)
+
+# 文字列の列（重複を除いた値の一覧と、その番号の配列）
+STRING_COLUMNS = (
+    "id",
+    "name",
+    "title",
+    "target_area_search",
+    "target_number_of_employees",
+)
+
+# row() で返す列の順序（一覧APIのフィールドの順序）
+ROW_COLUMNS = (
+    "id",
+    "name",
+    "title",
+    "target_area_search",
+    "subsidy_max_limit",
+    "acceptance_start_datetime",
+    "acceptance_end_datetime",
+    "target_number_of_employees",
+    "created_date",
+    "updated_date",
+)
+
+# 値がないことを表す値
+MISSING = -(2 ** 63)
+
+# target_area_search の複数地域の区切り
+AREA_SEPARATOR = " / "
+
+# キャッシュファイルの拡張子（元のJSONのファイル名に追加する）
+CACHE_SUFFIX = ".table"
+
+# キャッシュファイルの先頭の識別子（形式を変えた場合は番号を上げる）
+CACHE_MAGIC = b"SUBSIDYTABLE1\n"
+
+
+def parse_timestamp(value):
+    """
+    ISO 8601形式の日時（例: 2025-09-08T07:00Z）をUNIX時刻（秒）に変換する
+
+    Returns:
+        int: UNIX時刻（値がない・不正な場合は MISSING）
+    """
+    if not value:
+        return MISSING
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def format_timestamp(value, fmt="%Y-%m-%d %H:%M:%S"):
+    """UNIX時刻をUTCの日時の文字列に変換する"""
+    return time.strftime(fmt, time.gmtime(value))
+
+
+def cache_path(json_path):
+    """表のキャッシュファイルのパス"""
+    return json_path + CACHE_SUFFIX
+
+
+class SubsidyTable:
+    """
+    補助金一覧を列ごとの配列として保持する表
+
+    1行が補助金1件に対応し、列は TIMESTAMP_COLUMNS・NUMBER_COLUMNS・STRING_COLUMNS の値を持つ。
+    """
+
+    def __init__(self, rows, numbers, strings, codes):
+        """
+        Args:
+            rows (int): 行数
+            numbers (dict): 日時・数値の列名をキーとする array('q')
+            strings (dict): 文字列の列名をキーとする、重複を除いた値のリスト
+            codes (dict): 文字列の列名をキーとする、各行の値の番号の array('I')
+        """
+        self.rows = rows
+        self.numbers = numbers
+        self.strings = strings
+        self.codes = codes
+
+    def __len__(self):
+        return self.rows
+
+    @classmethod
+    def from_subsidies(cls, subsidies):
+        """
+        補助金一覧（APIレスポンスの result）から表を作成する
+
+        Args:
+            subsidies (list): 補助金一覧
+        """
+        numbers = {column: array('q') for column in TIMESTAMP_COLUMNS + NUMBER_COLUMNS}
+        strings = {column: [] for column in STRING_COLUMNS}
+        codes = {column: array('I') for column in STRING_COLUMNS}
+        lookups = {column: {} for column in STRING_COLUMNS}
+
+        for subsidy in subsidies:
+            for column in TIMESTAMP_COLUMNS:
+                numbers[column].append(parse_timestamp(subsidy.get(column)))
+            for column in NUMBER_COLUMNS:
+                value = subsidy.get(column)
+                numbers[column].append(int(value) if isinstance(value, (int, float)) else MISSING)
+            for column in STRING_COLUMNS:
+                value = subsidy.get(column)
+                value = "" if value is None else str(value)
+                code = lookups[column].get(value)
+                if code is None:
+                    code = lookups[column][value] = len(strings[column])
+                    strings[column].append(value)
+                codes[column].append(code)
+
+        return cls(len(subsidies), numbers, strings, codes)
+
+    def column(self, name):
+        """
+        列の値
+
+        Returns:
+            日時・数値の列は array('q')（値がない行は MISSING）、文字列の列は文字列のリスト
+        """
+        if name in self.numbers:
+            return self.numbers[name]
+        values = self.strings[name]
+        return [values[code] for code in self.codes[name]]
+
+    def value(self, name, row):
+        """1行分の値（日時・数値で値がない場合はNone）"""
+        if name in self.numbers:
+            value = self.numbers[name][row]
+            return None if value == MISSING else value
+        return self.strings[name][self.codes[name][row]]
+
+    def row(self, row):
+        """1行分の値の辞書（日時はUNIX時刻、値がない場合はNone）"""
+        return {name: self.value(name, row) for name in ROW_COLUMNS}
+
+    def present(self, name):
+        """日時・数値の列で、値がある行番号のリスト"""
+        return [row for row, value in enumerate(self.numbers[name]) if value != MISSING]
+
+    def values(self, name):
+        """日時・数値の列で、値がある行の値のリスト"""
+        return [value for value in self.numbers[name] if value != MISSING]
+
+    def month_counts(self, name, rows=None):
+        """
+        日時の列の月別（UTC、YYYY-MM）の件数
+
+        Args:
+            name (str): 日時の列名
+            rows (iterable, optional): 対象の行番号（Noneの場合は値があるすべての行）
+        """
+        column = self.numbers[name]
+        values = self.values(name) if rows is None else (column[row] for row in rows)
+        # 同じ日の値は月も同じため、日単位にまとめてから変換する
+        days = Counter(value // 86400 for value in values if value != MISSING)
+        months = Counter()
+        for day, count in days.items():
+            months[time.strftime("%Y-%m", time.gmtime(day * 86400))] += count
+        return months
+
+    def value_counts(self, name):
+        """文字列の列の値ごとの件数"""
+        values = self.strings[name]
+        return Counter({values[code]: count for code, count in Counter(self.codes[name]).items()})
+
+    def area_sets(self):
+        """
+        target_area_search の値の番号ごとの地域（" / " で区切った各地域）のタプル
+
+        Returns:
+            list: target_area_search の値の番号をインデックスとするタプルのリスト
+        """
+        return [
+            tuple(area.strip() for area in value.split(AREA_SEPARATOR) if area.strip())
+            for value in self.strings["target_area_search"]
+        ]
+
+    def save(self, path, source_stat):
+        """
+        表をバイナリファイルに保存する（書き込みが完了してから置き換える）
+
+        Args:
+            path (str): 保存先
+            source_stat (os.stat_result): 元のJSONのファイル情報（キャッシュの有効性の判定に使う）
+        """
+        blobs = []
+        layout = {}
+        offset = 0
+        for name, values in self.numbers.items():
+            data = values.tobytes()
+            layout[name] = {"kind": "number", "offset": offset, "length": len(data)}
+            blobs.append(data)
+            offset += len(data)
+        for name in STRING_COLUMNS:
+            text = "\x00".join(self.strings[name]).encode('utf-8')
+            data = self.codes[name].tobytes()
+            layout[name] = {
+                "kind": "string",
+                "offset": offset,
+                "length": len(data),
+                "strings_offset": offset + len(data),
+                "strings_length": len(text),
+                "strings_count": len(self.strings[name]),
+            }
+            blobs.extend([data, text])
+            offset += len(data) + len(text)
+
+        header = {
+            "rows": self.rows,
+            "byteorder": sys.byteorder,
+            "itemsize": {"q": array('q').itemsize, "I": array('I').itemsize},
+            "source_mtime_ns": source_stat.st_mtime_ns,
+            "source_size": source_stat.st_size,
+            "columns": layout,
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(CACHE_MAGIC)
+            f.write(json.dumps(header, separators=(',', ':')).encode('utf-8'))
+            f.write(b"\n")
+            for data in blobs:
+                f.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source_stat=None):
+        """
+        バイナリファイルから表を読み込む
+
+        Args:
+            path (str): キャッシュファイルのパス
+            source_stat (os.stat_result, optional): 元のJSONのファイル情報
+                （指定した場合、更新日時・サイズが保存時と異なればNoneを返す）
+
+        Returns:
+            SubsidyTable: 読み込んだ表（キャッシュが使えない場合はNone）
+        """
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    return None
+                header = json.loads(f.readline())
+                payload = f.read()
+        except (OSError, ValueError):
+            return None
+
+        if source_stat is not None and (
+            header.get("source_mtime_ns") != source_stat.st_mtime_ns
+            or header.get("source_size") != source_stat.st_size
+        ):
+            return None
+        if header.get("byteorder") != sys.byteorder or header.get("itemsize") != {
+            "q": array('q').itemsize, "I": array('I').itemsize
+        }:
+            return None
+
+        view = memoryview(payload)
+        numbers, strings, codes = {}, {}, {}
+        for name, spec in header["columns"].items():
+            data = view[spec["offset"]:spec["offset"] + spec["length"]]
+            if spec["kind"] == "number":
+                numbers[name] = array('q')
+                numbers[name].frombytes(data)
+                continue
+            codes[name] = array('I')
+            codes[name].frombytes(data)
+            text = bytes(view[spec["strings_offset"]:spec["strings_offset"] + spec["strings_length"]])
+            strings[name] = text.decode('utf-8').split("\x00") if spec["strings_count"] else []
+        return cls(header["rows"], numbers, strings, codes)
+
+
+def load_table(json_path, use_cache=True):
+    """
+    補助金一覧のJSONファイルを表として読み込む
+
+    キャッシュ（{json_path}.table）が有効であればそこから読み込み、
+    ない場合・JSONが更新されている場合はJSONから作成してキャッシュを保存する。
+
+    Args:
+        json_path (str): 補助金一覧のJSONファイル（APIレスポンス全体）
+        use_cache (bool): キャッシュを使うかどうか
+
+    Returns:
+        SubsidyTable: 補助金一覧の表
+    """
+    source_stat = os.stat(json_path)
+    path = cache_path(json_path)
+    if use_cache:
+        table = SubsidyTable.load(path, source_stat)
+        if table is not None:
+            return table
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    table = SubsidyTable.from_subsidies(data.get("result", []))
+
+    if use_cache:
+        try:
+            table.save(path, source_stat)
+        except OSError as e:
+            print(f"⚠️  表のキャッシュを保存できませんでした: {e}")
+    return table
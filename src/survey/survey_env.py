@@ -0,0 +1,16 @@
+"""
+調査スクリプトの共通の準備（各スクリプトの先頭で import する）
+
+共通のAPIクライアント（src/jgrants_client.py）などを利用するため、srcディレクトリをパスに追加し、
+APIのレスポンスをプロジェクト直下の .cache/jgrants にキャッシュする（jgrants_client.use_survey_cache）。
+"""
+import os
+import sys
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from jgrants_client import use_survey_cache
+
+use_survey_cache()
@@ -1,20 +1,28 @@
 #!/usr/bin/env python3
 """
 fetch_subsidy_detail.pyの除外機能をテストするスクリプト
+
+  python src/survey/test_exclusion.py            本番のAPIから取得してテスト
+  python src/survey/test_exclusion.py --offline  output/top10 のデータを返す代替サーバーでテスト
 """
 import sys
 import os
 import json
 
 # srcディレクトリをパスに追加
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bench'))
 
 from fetch_subsidy_detail import fetch_subsidy_detail
 
-def test_fetch_with_exclusion():
+# 本番のAPIでテストする補助金ID（実際のID）
+ONLINE_TEST_ID = "a0W5h00000RcFx6EAF"
+
+# 代替サーバーでテストする補助金ID（output/top10 のPDFを含む詳細）
+OFFLINE_TEST_ID = "a0WJ200000CDWAIMA5"
+
+def test_fetch_with_exclusion(test_id=ONLINE_TEST_ID):
     """不要フィールドが除外されているかテスト"""
-    # テスト用の補助金ID（実際のID）
-    test_id = "a0W5h00000RcFx6EAF"
     
     print(f"補助金ID: {test_id} の詳細を取得中...")
     print("=" * 60)
@@ -71,5 +79,13 @@ def test_fetch_with_exclusion():
         return True
 
 if __name__ == "__main__":
-    success = test_fetch_with_exclusion()
+    if "--offline" in sys.argv[1:]:
+        from fake_jgrants_server import FakeJGrantsServer
+        from fixtures import Catalog
+
+        with FakeJGrantsServer(Catalog()) as server:
+            os.environ["JGRANTS_BASE_URL"] = server.base_url
+            success = test_fetch_with_exclusion(OFFLINE_TEST_ID)
+    else:
+        success = test_fetch_with_exclusion()
     sys.exit(0 if success else 1)
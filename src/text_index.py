@@ -0,0 +1,442 @@
+import os
+import re
+import gzip
+import json
+import math
+import time
+import zlib
+import unicodedata
+from array import array
+from collections import Counter
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+from blob_codec import dumps_compact, load_subsidy_from_blob
+from detail_text import extract_detail_text
+from metrics import get_metrics
+from snapshot import iter_snapshot_lines, line_subsidy_id, load_latest_pointer
+
+# 全文検索の索引のBlob名
+TEXT_INDEX_BLOB_NAME = "_search/text_index.bin"
+
+# 索引ファイルの先頭の識別子（形式を変えた場合は番号を上げる）
+INDEX_MAGIC = b"SUBSIDYTEXT1\n"
+
+# 索引に含めるフィールドと重み（detail は本文のHTMLから抽出したテキスト）
+FIELD_WEIGHTS = (
+    ("title", 3),
+    ("subsidy_catch_phrase", 2),
+    ("detail", 1),
+)
+
+# スコア（BM25）のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 1つの補助金の1語の重みの上限（array('H') に収める）
+MAX_WEIGHT = 0xFFFF
+
+# 保存済みのデータを展開・解析できない場合の例外（gzipの破損・JSONの不正など）
+DECODE_ERRORS = (OSError, EOFError, ValueError, KeyError, zlib.error)
+
+# 1文字の検索語でまとめる語の数の上限（これより多くの語に含まれる文字は絞り込みに使わない）
+MAX_SINGLE_CHAR_TERMS = 200
+
+# 語に分ける文字の並び（記号・空白で区切る）
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def is_text_index_enabled(enabled=None):
+    """
+    全文検索の索引を更新するかどうか
+
+    Args:
+        enabled: 明示的な指定（Noneの場合は環境変数 TEXT_INDEX_ENABLED、未設定なら更新しない）
+    """
+    if enabled is None:
+        return os.environ.get("TEXT_INDEX_ENABLED", "0") == "1"
+    return bool(enabled)
+
+
+def normalize_text(text):
+    """全角英数字・半角カナなどを統一し（NFKC）、英字を小文字にする"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def bigrams(text):
+    """
+    テキストを2文字ずつの語（バイグラム）に分ける
+
+    記号・空白をまたぐ語は作らず、1文字だけの並びはその1文字を語とする。
+
+    Yields:
+        str: 語
+    """
+    for run in _TOKEN_PATTERN.findall(normalize_text(text)):
+        if len(run) == 1:
+            yield run
+            continue
+        for i in range(len(run) - 1):
+            yield run[i:i + 2]
+
+
+def document_fields(detail):
+    """
+    補助金詳細（result[0]）から索引に含めるフィールドの値を取り出す
+
+    Returns:
+        dict: FIELD_WEIGHTS のフィールド名をキーとするテキスト
+    """
+    return {
+        "title": detail.get("title") or "",
+        "subsidy_catch_phrase": detail.get("subsidy_catch_phrase") or "",
+        "detail": extract_detail_text(detail.get("detail"))["text"],
+    }
+
+
+def document_terms(fields):
+    """フィールドの値から、語ごとの重み（フィールドの重み × 出現回数）を計算する"""
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in bigrams(fields.get(field)):
+            weights[term] += weight
+    return weights
+
+
+class TextIndex:
+    """
+    補助金の全文検索用のバイグラムの転置索引
+
+    語ごとに、その語を含む補助金の番号と重みの配列（ポスティングリスト）を語の順に連結して保持する。
+    検索語のバイグラムをすべて含む補助金を、BM25 のスコアの高い順に返す。
+    補助金の追加・変更は update() で反映し、変更のない補助金のテキストは読み直さない。
+    """
+
+    def __init__(self, ids=None, lengths=None, terms=None, counts=None, docs=None, weights=None):
+        """
+        Args:
+            ids (list): 補助金の番号ごとの補助金ID（削除したものはNone）
+            lengths (array): 補助金の番号ごとの語の重みの合計
+            terms (list): 語（昇順）
+            counts (list): 語ごとのポスティングリストの長さ
+            docs (array): 連結したポスティングリストの補助金の番号
+            weights (array('H')): 連結したポスティングリストの重み
+        """
+        self.ids = list(ids or [])
+        self.lengths = lengths if lengths is not None else array('I')
+        self.docs = docs if docs is not None else array('I')
+        self.weights = weights if weights is not None else array('H')
+        self.postings = {}
+        offset = 0
+        for term, count in zip(terms or [], counts or []):
+            self.postings[term] = (offset, count)
+            offset += count
+        self._doc_numbers = {subsidy_id: n for n, subsidy_id in enumerate(self.ids) if subsidy_id is not None}
+        self._terms_by_char = None
+        self._refresh_stats()
+
+    def _refresh_stats(self):
+        live = [length for n, length in enumerate(self.lengths) if self.ids[n] is not None]
+        self.document_count = len(live)
+        self.average_length = (sum(live) / len(live)) if live else 0.0
+
+    def __len__(self):
+        return self.document_count
+
+    def __contains__(self, subsidy_id):
+        return subsidy_id in self._doc_numbers
+
+    def subsidy_ids(self):
+        """索引に含まれる補助金IDのセット"""
+        return set(self._doc_numbers)
+
+    def _posting(self, term):
+        """語のポスティングリスト（補助金の番号と重みの組）"""
+        offset, count = self.postings.get(term, (0, 0))
+        return zip(self.docs[offset:offset + count], self.weights[offset:offset + count])
+
+    def _single_char_posting(self, char):
+        """
+        1文字の検索語: その文字を含むすべての語のポスティングリストをまとめる
+
+        Returns:
+            dict: 補助金の番号をキーとする重み（MAX_SINGLE_CHAR_TERMS より多くの語に含まれる文字の場合はNone）
+        """
+        if self._terms_by_char is None:
+            by_char = {}
+            for term in self.postings:
+                for c in set(term):
+                    by_char.setdefault(c, []).append(term)
+            self._terms_by_char = by_char
+        terms = self._terms_by_char.get(char, ())
+        if len(terms) > MAX_SINGLE_CHAR_TERMS:
+            return None
+        merged = Counter()
+        for term in terms:
+            for doc, weight in self._posting(term):
+                merged[doc] += weight
+        return merged
+
+    def search(self, text):
+        """
+        検索語のバイグラムをすべて含む補助金とスコアを返す
+
+        ありふれた1文字（MAX_SINGLE_CHAR_TERMS より多くの語に含まれる文字）は絞り込みに使わず、
+        検索語がそのような1文字だけの場合は何も返さない。
+
+        Args:
+            text (str): 検索語（空白で区切った複数の語はすべてを含むものに絞り込む）
+
+        Returns:
+            dict: 補助金IDをキーとするスコア
+        """
+        terms = []
+        for run in _TOKEN_PATTERN.findall(normalize_text(text)):
+            terms.extend([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)])
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return {}
+
+        postings = []
+        for term in terms:
+            if len(term) == 1:
+                posting = self._single_char_posting(term)
+                if posting is None:
+                    continue
+            else:
+                posting = dict(self._posting(term))
+            if not posting:
+                return {}
+            postings.append(posting)
+        if not postings:
+            return {}
+        # 短いポスティングリストから順に絞り込む
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return {}
+
+        idfs = [
+            math.log(1 + (self.document_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for posting in postings
+        ]
+        scores = {}
+        average = self.average_length or 1.0
+        for doc in candidates:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / average)
+            score = 0.0
+            for idf, posting in zip(idfs, postings):
+                weight = posting[doc]
+                score += idf * weight * (BM25_K1 + 1) / (weight + norm)
+            scores[self.ids[doc]] = score
+        return scores
+
+    def update(self, documents, removed_ids=()):
+        """
+        補助金の追加・変更・削除を反映する
+
+        ポスティングリストは1つの配列に連結しているため、配列全体を詰め直す（索引の大きさに比例する）。
+        変更のない補助金のテキストは読み直さず、変更・削除した補助金を含まず追加もない語は配列のまま複写する。
+        変更・削除した補助金を含む語と、追加・変更した補助金の語だけを組み直す。
+
+        Args:
+            documents (dict): 補助金IDをキーとする、document_fields() の結果
+            removed_ids (iterable): 索引から削除する補助金ID
+        """
+        stale = set()
+        for subsidy_id in removed_ids:
+            n = self._doc_numbers.pop(subsidy_id, None)
+            if n is not None:
+                self.ids[n] = None
+                self.lengths[n] = 0
+                stale.add(n)
+
+        added = {}
+        for subsidy_id, fields in documents.items():
+            n = self._doc_numbers.get(subsidy_id)
+            if n is None:
+                n = len(self.ids)
+                self.ids.append(subsidy_id)
+                self.lengths.append(0)
+                self._doc_numbers[subsidy_id] = n
+            else:
+                stale.add(n)
+            terms = document_terms(fields)
+            self.lengths[n] = sum(terms.values())
+            added[n] = terms
+
+        additions = {}
+        for n, terms in added.items():
+            for term, weight in terms.items():
+                additions.setdefault(term, []).append((n, min(weight, MAX_WEIGHT)))
+
+        # 補助金の番号が 65535 以下の間は2バイトで保持する
+        docs = array('H' if len(self.ids) <= 0xFFFF else 'I')
+        weights = array('H')
+        if self.docs.typecode != docs.typecode:
+            # 配列のまま複写できるよう、既存の配列を新しい型に揃える
+            self.docs = array(docs.typecode, self.docs)
+        old_postings = self.postings
+        self.postings = {}
+        offset = 0
+        for term in sorted(old_postings.keys() | additions.keys()):
+            start, count = old_postings.get(term, (0, 0))
+            old_docs = self.docs[start:start + count]
+            old_weights = self.weights[start:start + count]
+            if term not in additions and stale.isdisjoint(old_docs):
+                # 変更のない語: 配列のまま複写する
+                posting_docs, posting_weights = old_docs, old_weights
+            else:
+                posting = sorted(
+                    [(doc, weight) for doc, weight in zip(old_docs, old_weights) if doc not in stale]
+                    + additions.get(term, [])
+                )
+                if not posting:
+                    continue
+                posting_docs = [doc for doc, _ in posting]
+                posting_weights = [weight for _, weight in posting]
+            self.postings[term] = (offset, len(posting_docs))
+            offset += len(posting_docs)
+            docs.extend(posting_docs)
+            weights.extend(posting_weights)
+        self.docs = docs
+        self.weights = weights
+        self._terms_by_char = None
+        self._refresh_stats()
+
+    def to_bytes(self):
+        """索引を gzip 圧縮したバイナリにする"""
+        terms = list(self.postings)
+        header = {
+            "ids": self.ids,
+            "terms": terms,
+            "counts": [self.postings[term][1] for term in terms],
+            "typecodes": {"lengths": self.lengths.typecode, "docs": self.docs.typecode, "weights": self.weights.typecode},
+            "sizes": {"lengths": len(self.lengths), "docs": len(self.docs), "weights": len(self.weights)},
+        }
+        raw = b"".join([
+            INDEX_MAGIC,
+            json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+            b"\n",
+            self.lengths.tobytes(),
+            self.docs.tobytes(),
+            self.weights.tobytes(),
+        ])
+        return gzip.compress(raw, compresslevel=6, mtime=0)
+
+    @classmethod
+    def from_bytes(cls, payload):
+        """to_bytes() の結果から索引を読み込む（形式が異なる場合はNone）"""
+        raw = gzip.decompress(payload)
+        if not raw.startswith(INDEX_MAGIC):
+            return None
+        end = raw.index(b"\n", len(INDEX_MAGIC))
+        header = json.loads(raw[len(INDEX_MAGIC):end])
+        view = memoryview(raw)[end + 1:]
+        arrays = {}
+        for name in ("lengths", "docs", "weights"):
+            values = array(header["typecodes"][name])
+            size = header["sizes"][name] * values.itemsize
+            values.frombytes(view[:size])
+            view = view[size:]
+            arrays[name] = values
+        return cls(header["ids"], arrays["lengths"], header["terms"], header["counts"], arrays["docs"], arrays["weights"])
+
+    @classmethod
+    def load(cls, container_client):
+        """全文検索の索引をBlobから読み込む（存在しない・読み込めない場合はNone）"""
+        try:
+            payload = container_client.get_blob_client(TEXT_INDEX_BLOB_NAME).download_blob().readall()
+        except ResourceNotFoundError:
+            return None
+        try:
+            return cls.from_bytes(payload)
+        except DECODE_ERRORS as e:
+            print(f"⚠️  全文検索の索引を読み込めません（作り直します）: {e}")
+            return None
+
+    def save(self, container_client):
+        """全文検索の索引をBlobに書き込む"""
+        payload = self.to_bytes()
+        container_client.get_blob_client(TEXT_INDEX_BLOB_NAME).upload_blob(
+            payload,
+            overwrite=True,
+            content_settings=ContentSettings(content_type="application/octet-stream"),
+        )
+        return len(payload)
+
+
+def _documents_from_lines(lines):
+    """補助金IDをキーとする内容（空白なしのJSON）から、索引に含めるフィールドの値を取り出す"""
+    documents = {}
+    for subsidy_id, line in lines.items():
+        try:
+            result = json.loads(line).get("result") or []
+        except ValueError as e:
+            print(f"  ⚠️  全文検索の索引に登録できません（{subsidy_id}）: {e}")
+            continue
+        if result:
+            documents[subsidy_id] = document_fields(result[0])
+    return documents
+
+
+def update_text_index(container_client, manifest, changed_lines):
+    """
+    この実行で保存した補助金を全文検索の索引に反映する
+
+    索引がない場合は最新のスナップショット（ない場合は個別のBlob）から全件を登録する。
+    マニフェストにあって索引にない補助金（前回の実行で反映できなかったものなど）は個別のBlobから読み込む。
+
+    Args:
+        container_client: ContainerClient
+        manifest: SubsidyManifest
+        changed_lines (dict): 補助金IDをキーとする、この実行で保存した内容（空白なしのJSON）
+
+    Returns:
+        TextIndex: 更新後の索引
+    """
+    started = time.perf_counter()
+    index = TextIndex.load(container_client)
+    lines = dict(changed_lines)
+    ids = manifest.ids()
+
+    if index is None:
+        index = TextIndex()
+        pointer = load_latest_pointer(container_client)
+        if pointer:
+            # 読み込めなかった行・以降の行の補助金は、下の個別のBlobからの読み込みで補う
+            try:
+                for line in iter_snapshot_lines(container_client, pointer["blob"]):
+                    try:
+                        subsidy_id = line_subsidy_id(line)
+                    except ValueError:
+                        continue
+                    if subsidy_id in ids and subsidy_id not in lines:
+                        lines[subsidy_id] = line
+            except ResourceNotFoundError:
+                print(f"全文検索の索引の作成時にスナップショットが見つかりません: {pointer['blob']}")
+            except DECODE_ERRORS as e:
+                print(f"⚠️  全文検索の索引の作成時にスナップショットを読み込めません: {pointer['blob']}（{e}）")
+
+    missing_ids = sorted(ids - index.subsidy_ids() - set(lines))
+    for subsidy_id in missing_ids:
+        blob_client = container_client.get_blob_client(f"{subsidy_id}.json")
+        try:
+            lines[subsidy_id] = dumps_compact(load_subsidy_from_blob(blob_client))
+        except ResourceNotFoundError:
+            print(f"  ⚠️  全文検索の索引の作成時にBlobが見つかりません: {subsidy_id}")
+        except DECODE_ERRORS as e:
+            print(f"  ⚠️  全文検索の索引の作成時にBlobを読み込めません: {subsidy_id}（{e}）")
+
+    removed_ids = index.subsidy_ids() - ids
+    if not lines and not removed_ids:
+        print("全文検索の索引に変更はありません")
+        return index
+
+    index.update(_documents_from_lines({k: v for k, v in lines.items() if k in ids}), removed_ids)
+    size = index.save(container_client)
+    get_metrics().observe("text_index", time.perf_counter() - started, size)
+    print(f"全文検索の索引を更新しました: {len(index)}件（反映: {len(lines)}件 / 語: {len(index.postings)} / "
+          f"{size / 1024:.0f} KB）")
+    return index
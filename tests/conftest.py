@@ -0,0 +1,7 @@
+import os
+import sys
+
+# テストから src・src/survey のモジュールを読み込むため、パスに追加
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "src", "survey"))
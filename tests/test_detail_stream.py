@@ -0,0 +1,98 @@
+import base64
+import json
+
+import pytest
+
+from detail_stream import DetailStreamFilter, parse_detail_stream
+
+EXCLUDE = ["application_guidelines", "outline_of_grant"]
+
+PDF_BYTES = bytes(range(256)) * 3
+
+
+class RecordingHandler:
+    """添付ファイルの name と data を記録する attachment_handler"""
+
+    def __init__(self):
+        self.files = []
+
+    def begin(self):
+        self.files.append({"name": None, "data": b""})
+
+    def name(self, value):
+        self.files[-1]["name"] = value
+
+    def data(self, chunk):
+        self.files[-1]["data"] += chunk
+
+    def end(self):
+        self.files[-1]["data"] = base64.b64decode(self.files[-1]["data"])
+
+
+def make_response():
+    detail = {
+        "id": "a0W000000000001",
+        "title": "補助金「テスト」\"引用\" \\ バックスラッシュ",
+        "detail": "<p>■目的・概要</p>\n<p>改行と\tタブ、絵文字😀</p>",
+        "subsidy_max_limit": 1000000,
+        "application_guidelines": [
+            # name が data より後にある要素と、Base64に \/ を含む要素
+            {"data": base64.b64encode(PDF_BYTES).decode(), "name": "公募要領.pdf"},
+            {"name": "様式\"1\".pdf", "data": base64.b64encode(b"\xff" * 10).decode().replace("/", "\\/")},
+        ],
+        "outline_of_grant": [{"name": "概要.pdf", "data": "QUJD", "nested": {"a": [1, 2, {"b": "]}"}]}}],
+        "target_area_search": "全国 / 東京都",
+    }
+    raw = json.dumps({"metadata": {"type": "detail"}, "result": [detail]}, ensure_ascii=False)
+    # \/ のエスケープは json.dumps では作られないため、文字列として埋め込む
+    return raw.replace("\\\\/", "\\/").encode("utf-8")
+
+
+def expected_detail():
+    data = json.loads(make_response())
+    for field in EXCLUDE:
+        del data["result"][0][field]
+    return data
+
+
+def test_whole_response_matches_json_without_excluded_fields():
+    handler = RecordingHandler()
+    assert parse_detail_stream([make_response()], EXCLUDE, handler) == expected_detail()
+    assert [f["name"] for f in handler.files] == ["公募要領.pdf", "様式\"1\".pdf"]
+    assert handler.files[0]["data"] == PDF_BYTES
+    assert handler.files[1]["data"] == b"\xff" * 10
+
+
+def test_one_byte_chunks():
+    payload = make_response()
+    handler = RecordingHandler()
+    chunks = [payload[i:i + 1] for i in range(len(payload))]
+    assert parse_detail_stream(chunks, EXCLUDE, handler) == expected_detail()
+    assert handler.files[0]["data"] == PDF_BYTES
+    assert handler.files[1]["name"] == "様式\"1\".pdf"
+
+
+def test_every_split_point():
+    # 文字列の途中・エスケープの直後・マルチバイト文字の途中など、すべての位置で2つに分ける
+    payload = make_response()
+    expected = expected_detail()
+    for split in range(1, len(payload)):
+        handler = RecordingHandler()
+        assert parse_detail_stream([payload[:split], payload[split:]], EXCLUDE, handler) == expected, split
+        assert handler.files[0]["data"] == PDF_BYTES, split
+
+
+def test_counts_bytes_read():
+    payload = make_response()
+    stream_filter = DetailStreamFilter(EXCLUDE)
+    for i in range(0, len(payload), 7):
+        stream_filter.feed(payload[i:i + 7])
+    assert stream_filter.bytes_read == len(payload)
+    stream_filter.close()
+
+
+@pytest.mark.parametrize("cut", [10, 100, -1])
+def test_truncated_response_raises(cut):
+    payload = make_response()
+    with pytest.raises(ValueError):
+        parse_detail_stream([payload[:cut]], EXCLUDE)
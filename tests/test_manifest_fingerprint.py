@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from manifest import FINGERPRINT_FIELDS, SubsidyManifest, list_fingerprint
+
+SUBSIDY = {
+    "id": "a0WJ200000CDTLwMAP",
+    "title": "省エネルギー設備導入補助金",
+    "acceptance_start_datetime": "2025-08-01T00:00Z",
+    "acceptance_end_datetime": "2025-09-30T08:00Z",
+    "subsidy_max_limit": 5000000,
+    "target_area_search": "東京都",
+}
+
+
+def test_format():
+    assert re.fullmatch(r"[0-9a-f]{16}", list_fingerprint(SUBSIDY))
+
+
+def test_stable_across_key_order_and_other_fields():
+    reordered = dict(reversed(list(SUBSIDY.items())))
+    assert list_fingerprint(reordered) == list_fingerprint(SUBSIDY)
+    # 変更検知に使わないフィールドは影響しない
+    assert list_fingerprint(dict(SUBSIDY, title="別の名称", target_number_of_employees="300名以下")) \
+        == list_fingerprint(SUBSIDY)
+
+
+def test_ignores_missing_and_none_fields():
+    # 一覧APIが updated_date を返さない場合と None の場合は同じ値
+    assert list_fingerprint(dict(SUBSIDY, updated_date=None)) == list_fingerprint(SUBSIDY)
+
+
+@pytest.mark.parametrize("field", FINGERPRINT_FIELDS)
+def test_changes_with_each_field(field):
+    changed = dict(SUBSIDY, **{field: "changed"})
+    assert list_fingerprint(changed) != list_fingerprint(SUBSIDY)
+
+
+def test_is_changed_and_fill_missing_fingerprints():
+    manifest = SubsidyManifest({SUBSIDY["id"]: {"hash": "hash", "fetched_at": "2025-08-01T00:00:00Z"}})
+    new = {"id": "new", "subsidy_max_limit": 1}
+
+    assert manifest.is_changed(new)
+    # フィンガープリントのないエントリは記録するまで変更ありとして扱う
+    assert manifest.is_changed(SUBSIDY)
+    assert manifest.fill_missing_fingerprints([SUBSIDY, new]) == 1
+    assert manifest.dirty
+    assert not manifest.is_changed(SUBSIDY)
+    assert manifest.fill_missing_fingerprints([SUBSIDY]) == 0
+
+    assert manifest.is_changed(dict(SUBSIDY, acceptance_end_datetime="2025-10-31T08:00Z"))
@@ -0,0 +1,156 @@
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import (
+    AdaptiveRateLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    RetryPolicy,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """rate_limiter の time.monotonic を手動で進める時計"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    assert breaker.is_open
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.before_request()
+    assert not breaker.is_open
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.open_count == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_half_open_allows_one_probe(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    open_breaker(breaker)
+    clock[0] += 59
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    clock[0] += 1
+    breaker.before_request()
+    # 試行中は他のリクエストを送信しない
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    open_breaker(breaker)
+    clock[0] += 60
+    breaker.before_request()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.before_request()
+    breaker.before_request()
+
+
+def test_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    open_breaker(breaker)
+    clock[0] += 60
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.is_open
+    # 開き直した時刻から改めて待つ（開いた回数は増えない）
+    assert breaker.open_count == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    clock[0] += 60
+    breaker.before_request()
+
+
+def test_cancelled_probe_can_be_retried(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    open_breaker(breaker)
+    clock[0] += 60
+    breaker.before_request()
+    breaker.cancel_probe()
+    breaker.before_request()
+
+
+def test_cancel_probe_from_other_thread_is_ignored(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    open_breaker(breaker)
+    clock[0] += 60
+    breaker.before_request()
+    thread = threading.Thread(target=breaker.cancel_probe)
+    thread.start()
+    thread.join()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_deadline_while_waiting_for_token_releases_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    limiter = AdaptiveRateLimiter(rate=0.5)
+    # トークンを使い切り、次の送信まで約2秒待つ状態にする
+    limiter.acquire()
+    policy = RetryPolicy(limiter, breaker)
+    breaker.record_failure()
+    assert breaker.is_open
+
+    with pytest.raises(DeadlineExceededError):
+        policy.before_request(time.monotonic() + 0.5)
+    # 試行が解放されているため、次のリクエストが試行できる
+    breaker.before_request()
+
+
+def test_retry_policy_records_statuses(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    policy = RetryPolicy(AdaptiveRateLimiter(rate=10), breaker)
+    # 429 はAPIが応答しているため障害として数えない
+    assert policy.on_response(429)
+    assert policy.on_response(429)
+    assert not breaker.is_open
+    assert policy.on_response(500)
+    assert policy.on_response(503)
+    assert breaker.is_open
+    assert not RetryPolicy(None, CircuitBreaker(threshold=2)).on_response(404)
+
+
+def test_limiter_decreases_on_overload_and_server_error(clock):
+    limiter = AdaptiveRateLimiter(rate=10)
+    limiter.on_overload()
+    assert limiter.rate == pytest.approx(5)
+    # 減少の間隔内の過負荷では下げない
+    limiter.on_overload()
+    assert limiter.rate == pytest.approx(5)
+    clock[0] += rate_limiter.DECREASE_INTERVAL_SECONDS
+    limiter.on_server_error()
+    assert limiter.rate == pytest.approx(5 * rate_limiter.RATE_SOFT_DECREASE_FACTOR)
+
+
+def test_limiter_slows_down_on_latency(clock):
+    limiter = AdaptiveRateLimiter(rate=10, slow_response=1.0)
+    limiter.on_success(0.1)
+    assert limiter.rate > 10
+    rate = limiter.rate
+    for _ in range(20):
+        limiter.on_success(5.0)
+    assert limiter.latency > 1.0
+    assert limiter.rate < rate
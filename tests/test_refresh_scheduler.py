@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from manifest import SubsidyManifest
+from refresh_scheduler import (
+    DEFAULT_REFRESH_INTERVAL_HOURS,
+    REFRESH_REQUESTED_FIELD,
+    RefreshScheduler,
+    TIER_CLOSED,
+    TIER_CLOSING,
+    TIER_OPEN,
+    TIER_UPCOMING,
+    is_refresh_pending,
+    lifecycle_tier,
+)
+
+NOW = datetime(2025, 9, 1, 0, 0, tzinfo=timezone.utc)
+
+
+def iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def subsidy(subsidy_id, start_days=-30, end_days=None):
+    """基準日時からの日数で受付期間を指定した補助金一覧の1件分のデータ"""
+    data = {"id": subsidy_id, "acceptance_start_datetime": iso(NOW + timedelta(days=start_days))}
+    if end_days is not None:
+        data["acceptance_end_datetime"] = iso(NOW + timedelta(days=end_days))
+    return data
+
+
+def fetched(manifest, subsidy_id, hours_ago):
+    manifest.update(subsidy_id, "hash", fetched_at=iso(NOW - timedelta(hours=hours_ago)))
+
+
+@pytest.mark.parametrize("data, tier", [
+    (subsidy("a", end_days=3), TIER_CLOSING),
+    (subsidy("a", end_days=60), TIER_OPEN),
+    (subsidy("a"), TIER_OPEN),
+    (subsidy("a", start_days=10, end_days=40), TIER_UPCOMING),
+    (subsidy("a", end_days=-1), TIER_CLOSED),
+    ({"id": "a"}, TIER_OPEN),
+])
+def test_lifecycle_tier(data, tier):
+    assert lifecycle_tier(data, NOW) == tier
+
+
+def test_plan_orders_due_by_tier_and_overdue_ratio():
+    subsidies = [
+        subsidy("closed", end_days=-10),
+        subsidy("upcoming", start_days=5),
+        subsidy("open-old"),
+        subsidy("open-recent"),
+        subsidy("closing", end_days=3),
+        subsidy("open-not-due"),
+    ]
+    manifest = SubsidyManifest()
+    fetched(manifest, "closed", DEFAULT_REFRESH_INTERVAL_HOURS[TIER_CLOSED] + 1)
+    fetched(manifest, "upcoming", DEFAULT_REFRESH_INTERVAL_HOURS[TIER_UPCOMING] + 1)
+    fetched(manifest, "open-old", 720)
+    fetched(manifest, "open-recent", 80)
+    fetched(manifest, "closing", 25)
+    fetched(manifest, "open-not-due", 10)
+
+    plan = RefreshScheduler(now=NOW).plan([], subsidies, manifest)
+
+    assert [s["id"] for s in plan["targets"]] == ["closing", "open-old", "open-recent", "upcoming", "closed"]
+    assert all(s[REFRESH_REQUESTED_FIELD] == iso(NOW) for s in plan["targets"])
+    assert plan["refresh"] == plan["due"] == 5
+    assert plan["postponed"] == 0
+    assert plan["tiers"] == {TIER_CLOSING: 1, TIER_OPEN: 2, TIER_UPCOMING: 1, TIER_CLOSED: 1}
+
+
+def test_plan_keeps_required_first_and_respects_max_calls():
+    subsidies = [subsidy("new"), subsidy("closing", end_days=3), subsidy("open")]
+    manifest = SubsidyManifest()
+    fetched(manifest, "closing", 48)
+    fetched(manifest, "open", 200)
+    required = [subsidies[0]]
+
+    plan = RefreshScheduler(now=NOW, max_calls=2).plan(required, subsidies, manifest)
+
+    assert [s["id"] for s in plan["targets"]] == ["new", "closing"]
+    # 必ず取得する補助金には再取得を決めた日時を付けない
+    assert REFRESH_REQUESTED_FIELD not in plan["targets"][0]
+    assert plan["refresh"] == 1
+    assert plan["due"] == 2
+    assert plan["postponed"] == 1
+
+
+def test_plan_skips_unknown_and_disabled_tiers():
+    subsidies = [subsidy("missing"), subsidy("closed", end_days=-10), subsidy("unknown-fetch")]
+    manifest = SubsidyManifest({"unknown-fetch": {"hash": "hash", "fetched_at": None}})
+    fetched(manifest, "closed", 100000)
+
+    plan = RefreshScheduler(intervals={TIER_CLOSED: 0}, now=NOW).plan([], subsidies, manifest)
+
+    assert plan["targets"] == []
+    assert plan["due"] == 0
+
+
+def test_slack_covers_timer_drift():
+    manifest = SubsidyManifest()
+    # 間隔よりわずかに短い経過時間でも、タイマーの実行時刻のずれの範囲内なら対象にする
+    manifest.update("closing", "hash", fetched_at=iso(NOW - timedelta(hours=24) + timedelta(minutes=5)))
+    plan = RefreshScheduler(now=NOW).plan([], [subsidy("closing", end_days=3)], manifest)
+    assert plan["refresh"] == 1
+
+
+def test_is_refresh_pending():
+    requested = {"id": "a", REFRESH_REQUESTED_FIELD: iso(NOW)}
+    assert is_refresh_pending(requested, None)
+    assert is_refresh_pending(requested, {"fetched_at": iso(NOW - timedelta(hours=1))})
+    # 再配信されたメッセージ: 再取得を決めた後に取得済み
+    assert not is_refresh_pending(requested, {"fetched_at": iso(NOW + timedelta(minutes=1))})
+    assert not is_refresh_pending({"id": "a"}, None)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"intervals": {"unknown": 1}},
+    {"intervals": {TIER_OPEN: "x"}},
+    {"max_calls": "many"},
+])
+def test_invalid_settings(kwargs):
+    with pytest.raises(ValueError):
+        RefreshScheduler(now=NOW, **kwargs)
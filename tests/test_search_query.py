@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from search_index import (
+    DEFAULT_LIMIT,
+    DEFAULT_SORT,
+    MAX_LIMIT,
+    RELEVANCE_SORT,
+    parse_datetime,
+    parse_employee_range,
+    parse_query,
+)
+
+
+def test_defaults():
+    assert parse_query({}) == {
+        "q": None,
+        "area": None,
+        "nationwide": True,
+        "open_now": False,
+        "closing_before": None,
+        "min_amount": None,
+        "max_amount": None,
+        "employees": None,
+        "sort": DEFAULT_SORT,
+        "order": "asc",
+        "offset": 0,
+        "limit": DEFAULT_LIMIT,
+    }
+
+
+def test_normalizes_values():
+    query = parse_query({
+        "q": "  省エネ 設備 ",
+        "area": " 東京都 ",
+        "nationwide": "0",
+        "open_now": "true",
+        "closing_before": "2025-09-30",
+        "min_amount": "1000000",
+        "max_amount": "",
+        "employees": "50",
+        "order": "ASC",
+        "offset": "40",
+        "limit": str(MAX_LIMIT),
+    })
+    assert query["q"] == "省エネ 設備"
+    assert query["area"] == "東京都"
+    assert query["nationwide"] is False
+    assert query["open_now"] is True
+    assert query["closing_before"] == datetime(2025, 9, 30, tzinfo=timezone.utc).timestamp()
+    assert query["min_amount"] == 1000000
+    assert query["max_amount"] is None
+    assert query["employees"] == 50
+    assert query["order"] == "asc"
+    assert query["offset"] == 40
+    assert query["limit"] == MAX_LIMIT
+
+
+def test_relevance_sort_only_with_q():
+    # q を指定した場合は関連度の高い順が既定値
+    query = parse_query({"q": "DX"})
+    assert (query["sort"], query["order"]) == (RELEVANCE_SORT, "desc")
+    assert parse_query({"q": "DX", "sort": "updated"})["order"] == "asc"
+    with pytest.raises(ValueError):
+        parse_query({"sort": RELEVANCE_SORT})
+    with pytest.raises(ValueError):
+        parse_query({"q": "   ", "sort": RELEVANCE_SORT})
+
+
+@pytest.mark.parametrize("params", [
+    {"closing_before": "来月"},
+    {"sort": "title"},
+    {"order": "random"},
+    {"min_amount": "百万"},
+    {"max_amount": "-1"},
+    {"employees": "1.5"},
+    {"offset": "-1"},
+    {"limit": "0"},
+    {"limit": str(MAX_LIMIT + 1)},
+])
+def test_invalid_params(params):
+    with pytest.raises(ValueError):
+        parse_query(params)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025-09-08T07:00Z", datetime(2025, 9, 8, 7, 0, tzinfo=timezone.utc)),
+    ("2025-09-08T07:00:00.000Z", datetime(2025, 9, 8, 7, 0, tzinfo=timezone.utc)),
+    ("2025-09-08", datetime(2025, 9, 8, tzinfo=timezone.utc)),
+])
+def test_parse_datetime(value, expected):
+    assert parse_datetime(value) == expected.timestamp()
+
+
+@pytest.mark.parametrize("value", [None, "", "未定"])
+def test_parse_datetime_invalid(value):
+    assert parse_datetime(value) is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("300名以下", (None, 300)),
+    ("20名未満", (None, 19)),
+    ("901名以上", (901, None)),
+    ("5名超", (6, None)),
+    ("従業員数の制約なし", (None, None)),
+    (None, (None, None)),
+])
+def test_parse_employee_range(value, expected):
+    assert parse_employee_range(value) == expected
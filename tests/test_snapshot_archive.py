@@ -0,0 +1,75 @@
+import copy
+
+import pytest
+
+from snapshot_archive import SnapshotArchive, apply_delta, diff_snapshots
+
+
+def record(subsidy_id, title=None, **fields):
+    return dict({"id": subsidy_id, "title": title or f"補助金{subsidy_id}"}, **fields)
+
+
+PREVIOUS = [record("a"), record("b", subsidy_max_limit=100), record("c"), record("d")]
+
+CASES = {
+    "unchanged": PREVIOUS,
+    "added_first": [record("x")] + PREVIOUS,
+    "added_middle": [record("a"), record("x"), record("b", subsidy_max_limit=100), record("c"), record("d")],
+    "changed": [record("a"), record("b", subsidy_max_limit=200), record("c", "新しい名前"), record("d")],
+    "removed": [record("a"), record("c")],
+    "reordered": [record("d"), record("c"), record("b", subsidy_max_limit=100), record("a")],
+    "mixed": [record("y"), record("c", "変更"), record("a"), record("z")],
+    "emptied": [],
+}
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_apply_delta_restores_current(name):
+    current = CASES[name]
+    previous = copy.deepcopy(PREVIOUS)
+    delta = diff_snapshots(previous, current)
+    assert apply_delta(previous, delta) == current
+    # 差分の適用で前回の一覧を書き換えない
+    assert previous == PREVIOUS
+
+
+def test_from_empty():
+    current = [record("a"), record("b")]
+    assert apply_delta([], diff_snapshots([], current)) == current
+
+
+def test_delta_contents():
+    delta = diff_snapshots(PREVIOUS, CASES["mixed"])
+    assert [r["id"] for r in delta["added"]] == ["y", "z"]
+    assert [r["id"] for r in delta["changed"]] == ["c"]
+    assert delta["removed"] == ["b", "d"]
+
+
+def test_order_only_when_needed():
+    # 追加した補助金が先頭で、残りが前回の順であれば並び順は記録しない
+    assert "order" not in diff_snapshots(PREVIOUS, CASES["added_first"])
+    assert "order" not in diff_snapshots(PREVIOUS, CASES["removed"])
+    assert diff_snapshots(PREVIOUS, CASES["reordered"])["order"] == ["d", "c", "b", "a"]
+    assert diff_snapshots(PREVIOUS, PREVIOUS) == {"added": [], "changed": [], "removed": []}
+
+
+def test_archive_round_trip(tmp_path):
+    archive = SnapshotArchive(str(tmp_path), keyframe_interval=3)
+    history = [PREVIOUS] + [CASES[name] for name in ("added_first", "changed", "removed", "mixed", "emptied", "reordered")]
+    stamps = [f"2025121{i}_090000" for i in range(len(history))]
+    for stamp, result in zip(stamps, history):
+        archive.append({"metadata": {"stamp": stamp}, "result": result}, stamp)
+
+    assert [entry["kind"] for entry in archive.entries] == ["base", "delta", "delta", "base", "delta", "delta", "base"]
+    reopened = SnapshotArchive(str(tmp_path))
+    for stamp, result in zip(stamps, history):
+        assert reopened.load(stamp)["result"] == result
+    assert [data["result"] for _, data in reopened.iter_range()] == history
+    assert reopened.segments() == [stamps[0:3], stamps[3:6], stamps[6:]]
+
+
+def test_archive_rejects_older_stamp(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    archive.append({"result": PREVIOUS}, "20251216_111354")
+    with pytest.raises(ValueError):
+        archive.append({"result": PREVIOUS}, "20251216_111354")